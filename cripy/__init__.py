@@ -1,22 +1,51 @@
 from typing import Union
 
+from .batch_call import call_function_on_many
+from .binding_channel import BindingChannel
+from .body_prefetcher import BodyCache, BodyPrefetcher
 from .cdp import CDP, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_URL, connect
 from .cdp_session import CDPSession
 from .client import Client, ClientDynamic
+from .command_coalescer import CommandCoalescer
 from .connection import Connection
+from .context_registry import ExecutionContext, ExecutionContextRegistry
+from .dom_extract import ExtractionTable, extract_table
+from .dom_mirror import DOMMirror, MirrorNode
+from .dom_snapshot import ColumnarDocument, ColumnarSnapshot, capture_snapshot, decode_snapshot
 from .errors import ClientError, NetworkError, ProtocolError
 from .events import ConnectionEvents, SessionEvents
+from .fetch_interceptor import FetchInterceptor, InterceptRule
+from .heap_diff import HeapSnapshotDiff
+from .heap_snapshot import HeapSnapshot, capture_heap_snapshot, load_heap_snapshot
+from .io_stream import IOStream
+from .message_decoder import LoopLagMonitor, MessageDecoder
+from .network_ledger import NetworkLedger, RequestRecord
+from .remote_objects import HandlePool, ObjectGroup, RemoteHandle
+from .response_store import ResponseRecorder, ResponseReplayer, ResponseStore
+from .result_cache import ResultCache
+from .screencast import ScreencastFrame, ScreencastPipeline
+from .script_registry import ScriptRegistry
+from .selector_cache import SelectorCache
+from .session_index import SessionIndex
+from .trace_recorder import TraceRecorder, TraceSummary, iter_trace_events, summarize_trace
+from .warc import WARCArchiver, WARCWriter
 from .target_session import TargetSession, TargetSessionDynamic
 
 ConnectionType = Union[Client, Connection, ClientDynamic]
 SessionType = Union[TargetSession, CDPSession, TargetSessionDynamic]
 
 __all__ = [
+    "BindingChannel",
+    "BodyCache",
+    "BodyPrefetcher",
     "CDP",
     "CDPSession",
     "Client",
+    "ColumnarDocument",
+    "ColumnarSnapshot",
     "ClientDynamic",
     "ClientError",
+    "CommandCoalescer",
     "connect",
     "Connection",
     "ConnectionEvents",
@@ -24,10 +53,48 @@ __all__ = [
     "DEFAULT_HOST",
     "DEFAULT_PORT",
     "DEFAULT_URL",
+    "DOMMirror",
+    "ExecutionContext",
+    "ExecutionContextRegistry",
+    "ExtractionTable",
+    "FetchInterceptor",
+    "HeapSnapshot",
+    "HandlePool",
+    "HeapSnapshotDiff",
+    "InterceptRule",
+    "IOStream",
+    "LoopLagMonitor",
+    "MessageDecoder",
+    "MirrorNode",
     "NetworkError",
+    "NetworkLedger",
+    "ObjectGroup",
     "ProtocolError",
+    "RemoteHandle",
+    "RequestRecord",
+    "ResponseRecorder",
+    "ResponseReplayer",
+    "ResponseStore",
+    "ResultCache",
+    "ScreencastFrame",
+    "ScreencastPipeline",
+    "ScriptRegistry",
+    "SelectorCache",
     "SessionEvents",
+    "SessionIndex",
     "SessionType",
     "TargetSession",
     "TargetSessionDynamic",
+    "TraceRecorder",
+    "TraceSummary",
+    "WARCArchiver",
+    "WARCWriter",
+    "call_function_on_many",
+    "capture_heap_snapshot",
+    "capture_snapshot",
+    "decode_snapshot",
+    "extract_table",
+    "iter_trace_events",
+    "load_heap_snapshot",
+    "summarize_trace",
 ]
@@ -0,0 +1,128 @@
+from itertools import count
+from typing import Any, Dict, List, Optional, Sequence, TYPE_CHECKING, Union
+
+try:
+    from ujson import loads
+except ImportError:
+    from json import loads
+
+from .errors import ClientError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["call_function_on_many"]
+
+_group_ids = count(1)
+
+#: Calls the function on each of the targets passed after the arguments of the function,
+#: returning the JSON of the results, or the errors thrown, in the order of the targets
+_BATCH_CALL = """function (args, ...targets) {
+  const fn = (%s);
+  const out = new Array(targets.length);
+  for (let i = 0; i < targets.length; i++) {
+    try {
+      out[i] = {v: fn.apply(targets[i], args)};
+    } catch (e) {
+      out[i] = {e: String(e)};
+    }
+  }
+  return JSON.stringify(out);
+}"""
+
+#: As _BATCH_CALL but the results of the function are awaited
+_BATCH_CALL_AWAIT = """async function (args, ...targets) {
+  const fn = (%s);
+  const out = await Promise.all(targets.map(async target => {
+    try {
+      return {v: await fn.apply(target, args)};
+    } catch (e) {
+      return {e: String(e)};
+    }
+  }));
+  return JSON.stringify(out);
+}"""
+
+
+async def call_function_on_many(
+    client: Union["ConnectionType", "SessionType"],
+    function_declaration: str,
+    object_ids: Optional[Sequence[str]] = None,
+    backend_node_ids: Optional[Sequence[int]] = None,
+    arguments: Optional[Sequence[Any]] = None,
+    await_promise: bool = False,
+    chunk_size: int = 1000,
+    max_payload: int = 8 << 20,
+) -> List[Any]:
+    """Calls the function on each of the targets using one Runtime.callFunctionOn per chunk of targets
+    rather than one per target. The targets are passed to a page side loop as the arguments of the call
+    and the results come back by value as one JSON payload per chunk.
+
+    The size of the chunks adapts so that the payload of a chunk stays below max_payload.
+    Targets supplied as backend node ids are resolved (DOM.resolveNode) in a temporary object group
+    with the resolutions written back-to-back, the group is released once done.
+
+    :param client: The connection or session of the page
+    :param function_declaration: The declaration of the function called with this being the target
+    :param object_ids: The ids of the remote objects the function is called on
+    :param backend_node_ids: The backend ids of the nodes the function is called on, if object_ids is not supplied
+    :param arguments: The JSON serializable arguments the function is called with
+    :param await_promise: Should the results of the function be awaited
+    :param chunk_size: The initial maximum number of targets per call
+    :param max_payload: The size, in characters, of the JSON payload of a chunk beyond which subsequent
+    chunks are made smaller
+    :return: The result of the function for each target in the order supplied, targets whose call threw
+    or could not be resolved have a ClientError in place of their result
+    """
+    if object_ids is None and backend_node_ids is None:
+        raise ClientError("Either object_ids or backend_node_ids must be supplied")
+    object_group: Optional[str] = None
+    if object_ids is None:
+        object_group = f"cripy-batch-{next(_group_ids)}"
+        resolved = await client.send_many(
+            [
+                ("DOM.resolveNode", {"backendNodeId": node_id, "objectGroup": object_group})
+                for node_id in backend_node_ids
+            ]
+        )
+        targets: List[Optional[str]] = [
+            None if isinstance(resp, Exception) else resp["object"].get("objectId") for resp in resolved
+        ]
+    else:
+        targets = list(object_ids)
+    declaration = (_BATCH_CALL_AWAIT if await_promise else _BATCH_CALL) % function_declaration
+    args = {"value": list(arguments) if arguments is not None else []}
+    results: List[Any] = [ClientError("Could not resolve the node")] * len(targets)
+    callable_indexes = [idx for idx, object_id in enumerate(targets) if object_id is not None]
+    size = max(1, chunk_size)
+    start = 0
+    try:
+        while start < len(callable_indexes):
+            indexes = callable_indexes[start : start + size]
+            call_arguments: List[Dict[str, Any]] = [args]
+            call_arguments.extend({"objectId": targets[idx]} for idx in indexes)
+            params: Dict[str, Any] = {
+                "functionDeclaration": declaration,
+                "objectId": targets[indexes[0]],
+                "arguments": call_arguments,
+                "returnByValue": True,
+            }
+            if await_promise:
+                params["awaitPromise"] = True
+            resp = await client.send("Runtime.callFunctionOn", params)
+            details = resp.get("exceptionDetails")
+            if details is not None:
+                error = ClientError(details.get("exception", {}).get("description") or details.get("text", ""))
+                for idx in indexes:
+                    results[idx] = error
+            else:
+                payload = resp["result"]["value"]
+                for idx, outcome in zip(indexes, loads(payload)):
+                    results[idx] = ClientError(outcome["e"]) if "e" in outcome else outcome.get("v")
+                if len(payload) > max_payload:
+                    size = max(1, int(len(indexes) * max_payload / len(payload)))
+            start += len(indexes)
+    finally:
+        if object_group is not None:
+            await client.send("Runtime.releaseObjectGroup", {"objectGroup": object_group})
+    return results
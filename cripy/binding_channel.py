@@ -0,0 +1,317 @@
+from asyncio import AbstractEventLoop, Future, ensure_future
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set, TYPE_CHECKING, Union
+
+try:
+    from ujson import dumps, loads
+except ImportError:
+    from json import dumps, loads
+
+from .cdp_batch import consume_outcome
+from .errors import ClientError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["BindingChannel", "channel_shim"]
+
+#: Page side of the channel. Messages are buffered as JSON and sent in one binding call per
+#: animation frame, or as soon as the batch is full. While paused messages are kept buffered,
+#: up to maxBuffered after which they are dropped and counted. Once resumed the buffered messages
+#: are drained one batch per animation frame, messages sent meanwhile being queued behind them
+#: and dropped and counted too once maxBuffered messages are buffered
+_SHIM = """(() => {
+  const binding = globalThis[%(binding)s];
+  if (typeof binding !== 'function' || globalThis[%(name)s]) return;
+  const maxBatch = %(max_batch)d, maxBatchBytes = %(max_batch_bytes)d, maxBuffered = %(max_buffered)d;
+  let buffer = [], bytes = 0, seq = 0, dropped = 0, scheduled = false, paused = false, draining = false;
+  const sendBatch = () => {
+    const batch = buffer.splice(0, maxBatch);
+    for (const json of batch) bytes -= json.length;
+    binding('{"s":' + seq++ + ',"d":' + dropped + ',"m":[' + batch.join(',') + ']}');
+  };
+  const flushBatch = () => {
+    if (paused || !buffer.length) return;
+    sendBatch();
+    if (buffer.length) schedule();
+    else draining = false;
+  };
+  const onFrame = () => {
+    scheduled = false;
+    flushBatch();
+  };
+  const schedule = () => {
+    if (scheduled) return;
+    scheduled = true;
+    if (typeof requestAnimationFrame === 'function' && !document.hidden) requestAnimationFrame(onFrame);
+    else setTimeout(onFrame, 16);
+  };
+  globalThis[%(name)s] = Object.freeze({
+    send(message) {
+      if ((paused || draining) && buffer.length >= maxBuffered) {
+        dropped++;
+        return false;
+      }
+      const json = JSON.stringify(message);
+      buffer.push(json === undefined ? 'null' : json);
+      bytes += buffer[buffer.length - 1].length;
+      if (!paused && !draining && (buffer.length >= maxBatch || bytes >= maxBatchBytes)) flushBatch();
+      else if (!paused) schedule();
+      return !paused;
+    },
+    flush() {
+      while (!paused && buffer.length) sendBatch();
+      draining = false;
+    },
+    pause() { paused = true; },
+    resume() {
+      if (!paused) return;
+      paused = false;
+      draining = buffer.length > maxBatch;
+      flushBatch();
+    },
+    get paused() { return paused; },
+    get dropped() { return dropped; },
+  });
+})();"""
+
+
+def channel_shim(
+    name: str, binding: str, max_batch: int = 500, max_batch_bytes: int = 256 << 10, max_buffered: int = 100000
+) -> str:
+    """Returns the source of the page side of a BindingChannel
+
+    :param name: The name of the global the page sends messages through, i.e. name.send(message)
+    :param binding: The name of the binding (Runtime.addBinding)
+    :param max_batch: The maximum number of messages per binding call
+    :param max_batch_bytes: The size, in characters, of the buffered messages from which they are sent immediately
+    rather than on the next animation frame
+    :param max_buffered: The maximum number of messages buffered while the channel is paused or drains the
+    messages buffered while paused
+    :return: The source of the shim
+    """
+    return _SHIM % {
+        "name": dumps(name),
+        "binding": dumps(binding),
+        "max_batch": max_batch,
+        "max_batch_bytes": max_batch_bytes,
+        "max_buffered": max_buffered,
+    }
+
+
+class BindingChannel:
+    """A push channel from the page to Python over Runtime.addBinding.
+
+    The page sends messages with ``globalThis[name].send(message)``. The page side shim batches
+    the messages, making one binding call per animation frame or once a batch is full, rather
+    than one per message. The messages are unbatched into a queue consumed with ``receive``
+    or ``async for``. Once high_water messages are queued the page is told to pause, buffering
+    messages on its side, and once the queue is drained to low_water to resume, the page then
+    sending the buffered messages one batch per animation frame.
+    """
+
+    __slots__ = [
+        "_batches",
+        "_binding",
+        "_client",
+        "_closed",
+        "_contexts",
+        "_dropped",
+        "_dropped_gone",
+        "_high_water",
+        "_loop",
+        "_low_water",
+        "_messages",
+        "_name",
+        "_open",
+        "_paused",
+        "_queue",
+        "_script_id",
+        "_shim",
+        "_waiter",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        name: str = "cripyChannel",
+        max_batch: int = 500,
+        max_batch_bytes: int = 256 << 10,
+        high_water: int = 10000,
+        low_water: Optional[int] = None,
+        max_buffered: int = 100000,
+    ) -> None:
+        """Construct a new instance of BindingChannel
+
+        :param client: The connection or session of the page
+        :param name: The name of the global the page sends messages through
+        :param max_batch: The maximum number of messages per binding call
+        :param max_batch_bytes: The size, in characters, of the messages buffered by the page
+        from which they are sent without waiting for the next animation frame
+        :param high_water: The number of queued messages from which the page is paused
+        :param low_water: The number of queued messages at which the page is resumed, defaults to half of high_water
+        :param max_buffered: The maximum number of messages the page buffers while paused, and while draining
+        them once resumed, further messages are dropped
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._loop: AbstractEventLoop = client.loop
+        self._name: str = name
+        self._binding: str = f"__{name}Binding"
+        self._shim: str = channel_shim(name, self._binding, max_batch, max_batch_bytes, max_buffered)
+        self._high_water: int = high_water
+        self._low_water: int = low_water if low_water is not None else high_water // 2
+        self._queue: Deque[Any] = deque()
+        self._waiter: Optional[Future] = None
+        self._contexts: Set[int] = set()
+        self._dropped: Dict[int, int] = {}
+        self._dropped_gone: int = 0
+        self._paused: bool = False
+        self._open: bool = False
+        self._closed: bool = False
+        self._script_id: Optional[str] = None
+        self._batches: int = 0
+        self._messages: int = 0
+
+    @property
+    def name(self) -> str:
+        """Returns the name of the global the page sends messages through"""
+        return self._name
+
+    @property
+    def paused(self) -> bool:
+        """Returns T/F indicating if the page was told to pause"""
+        return self._paused
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of messages queued"""
+        return len(self._queue)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of batches and messages received and the number of messages the page dropped"""
+        return {
+            "batches": self._batches,
+            "messages": self._messages,
+            "dropped": self._dropped_gone + sum(self._dropped.values()),
+        }
+
+    async def open(self) -> None:
+        """Opens the channel, installing the binding and the page side shim in the current
+        document and the documents created thereafter
+        """
+        if self._open:
+            return
+        self._open = True
+        self._closed = False
+        client = self._client
+        client.on("Runtime.bindingCalled", self._on_binding_called)
+        client.on("Runtime.executionContextDestroyed", self._on_context_destroyed)
+        client.on("Runtime.executionContextsCleared", self._on_contexts_cleared)
+        await client.send("Runtime.enable")
+        await client.send("Runtime.addBinding", {"name": self._binding})
+        resp = await client.send("Page.addScriptToEvaluateOnNewDocument", {"source": self._shim})
+        self._script_id = resp.get("identifier")
+        await client.send("Runtime.evaluate", {"expression": self._shim})
+
+    async def close(self) -> None:
+        """Closes the channel, the messages queued can still be received"""
+        if not self._open:
+            return
+        self._open = False
+        self._closed = True
+        client = self._client
+        client.remove_listener("Runtime.bindingCalled", self._on_binding_called)
+        client.remove_listener("Runtime.executionContextDestroyed", self._on_context_destroyed)
+        client.remove_listener("Runtime.executionContextsCleared", self._on_contexts_cleared)
+        await client.send("Runtime.removeBinding", {"name": self._binding})
+        if self._script_id is not None:
+            await client.send("Page.removeScriptToEvaluateOnNewDocument", {"identifier": self._script_id})
+            self._script_id = None
+        self._contexts.clear()
+        self._wake()
+
+    async def receive(self) -> Any:
+        """Returns the next message, waiting for it if none is queued
+
+        :return: The message
+        """
+        while not self._queue:
+            if self._closed:
+                raise ClientError("The channel is closed")
+            if self._waiter is None:
+                self._waiter = self._loop.create_future()
+            await self._waiter
+        message = self._queue.popleft()
+        if self._paused and len(self._queue) <= self._low_water:
+            self._signal(False)
+        return message
+
+    async def messages(self) -> AsyncIterator[Any]:
+        """Yields the messages as they are received until the channel is closed and drained"""
+        while self._queue or not self._closed:
+            try:
+                yield await self.receive()
+            except ClientError:
+                return
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self.messages()
+
+    def _signal(self, pause: bool) -> None:
+        """Tells the page to pause or resume"""
+        self._paused = pause
+        expression = f"globalThis[{dumps(self._name)}].{'pause' if pause else 'resume'}()"
+        for context_id in self._contexts:
+            self._send_signal(expression, context_id)
+
+    def _send_signal(self, expression: str, context_id: int) -> None:
+        ensure_future(
+            self._client.send("Runtime.evaluate", {"expression": expression, "contextId": context_id})
+        ).add_done_callback(consume_outcome)
+
+    def _wake(self) -> None:
+        waiter = self._waiter
+        if waiter is not None:
+            self._waiter = None
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _on_binding_called(self, event: Dict) -> None:
+        if event.get("name") != self._binding:
+            return
+        batch = loads(event["payload"])
+        context_id = event.get("executionContextId")
+        if context_id is not None:
+            if context_id not in self._contexts:
+                self._contexts.add(context_id)
+                if self._paused:
+                    self._send_signal(f"globalThis[{dumps(self._name)}].pause()", context_id)
+            self._dropped[context_id] = batch.get("d", 0)
+        messages = batch["m"]
+        self._batches += 1
+        self._messages += len(messages)
+        self._queue.extend(messages)
+        if not self._paused and len(self._queue) >= self._high_water:
+            self._signal(True)
+        self._wake()
+
+    def _on_context_destroyed(self, event: Dict) -> None:
+        # keep the count of the messages dropped by the destroyed context
+        context_id = event["executionContextId"]
+        self._contexts.discard(context_id)
+        self._dropped_gone += self._dropped.pop(context_id, 0)
+
+    def _on_contexts_cleared(self, event: Optional[Dict] = None) -> None:
+        self._dropped_gone += sum(self._dropped.values())
+        self._dropped.clear()
+        self._contexts.clear()
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(name={self._name}, pending={len(self._queue)}, paused={self._paused}, "
+            f"batches={self._batches}, messages={self._messages})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
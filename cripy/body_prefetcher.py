@@ -0,0 +1,366 @@
+import heapq
+import logging
+import re
+from asyncio import AbstractEventLoop, CancelledError, Future
+from binascii import a2b_base64
+from collections import OrderedDict
+from concurrent.futures import Executor
+from hashlib import sha256
+from itertools import count
+from typing import Callable, Dict, Iterable, List, Optional, Pattern, Set, TYPE_CHECKING, Tuple, Union
+
+from .errors import NetworkError, ProtocolError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["BodyCache", "BodyPrefetcher"]
+
+logger = logging.getLogger(__name__)
+
+#: Returns the priority, lower is sooner, of fetching the body of a response given
+#: the response and its resource type
+Prioritizer = Callable[[Dict, Optional[str]], int]
+
+
+class BodyCache:
+    """A size bounded LRU cache of response bodies keyed by the sha256 digest of their contents.
+
+    Request ids are mapped to the digest of their body so that identical bodies, e.g. the same
+    script loaded by many tabs, are stored once. The cache can be shared by several prefetchers.
+    """
+
+    __slots__ = ["_bodies", "_by_digest", "_by_request", "_max_bytes", "_size"]
+
+    def __init__(self, max_bytes: int = 64 << 20) -> None:
+        """Construct a new instance of BodyCache
+
+        :param max_bytes: The maximum total size, in bytes, of the bodies cached
+        """
+        self._max_bytes: int = max_bytes
+        self._size: int = 0
+        self._bodies: "OrderedDict[str, bytes]" = OrderedDict()
+        self._by_request: Dict[str, str] = {}
+        self._by_digest: Dict[str, Set[str]] = {}
+
+    @property
+    def max_bytes(self) -> int:
+        """Returns the maximum total size of the bodies cached"""
+        return self._max_bytes
+
+    @property
+    def size(self) -> int:
+        """Returns the total size of the bodies cached"""
+        return self._size
+
+    def put(self, request_id: str, digest: str, body: bytes) -> None:
+        """Caches the body of the request
+
+        :param request_id: The id of the request
+        :param digest: The sha256 hex digest of the body
+        :param body: The body
+        """
+        if len(body) > self._max_bytes:
+            return
+        previous = self._by_request.get(request_id)
+        if previous is not None and previous != digest:
+            self._unlink(request_id, previous)
+        self._by_request[request_id] = digest
+        self._by_digest.setdefault(digest, set()).add(request_id)
+        if digest in self._bodies:
+            self._bodies.move_to_end(digest)
+            return
+        self._bodies[digest] = body
+        self._size += len(body)
+        while self._size > self._max_bytes:
+            evicted, evicted_body = self._bodies.popitem(last=False)
+            self._size -= len(evicted_body)
+            for evicted_request in self._by_digest.pop(evicted, ()):
+                del self._by_request[evicted_request]
+
+    def get(self, request_id: str) -> Optional[bytes]:
+        """Returns the cached body of the request
+
+        :param request_id: The id of the request
+        :return: The body if it is cached
+        """
+        digest = self._by_request.get(request_id)
+        if digest is None:
+            return None
+        return self.get_by_digest(digest)
+
+    def get_by_digest(self, digest: str) -> Optional[bytes]:
+        """Returns the cached body with the supplied digest
+
+        :param digest: The sha256 hex digest of the body
+        :return: The body if it is cached
+        """
+        body = self._bodies.get(digest)
+        if body is not None:
+            self._bodies.move_to_end(digest)
+        return body
+
+    def digest_of(self, request_id: str) -> Optional[str]:
+        """Returns the digest of the cached body of the request
+
+        :param request_id: The id of the request
+        :return: The digest if the body is cached
+        """
+        return self._by_request.get(request_id)
+
+    def clear(self) -> None:
+        """Empties the cache"""
+        self._bodies.clear()
+        self._by_request.clear()
+        self._by_digest.clear()
+        self._size = 0
+
+    def _unlink(self, request_id: str, digest: str) -> None:
+        requests = self._by_digest.get(digest)
+        if requests is not None:
+            requests.discard(request_id)
+
+    def __contains__(self, request_id: str) -> bool:
+        return request_id in self._by_request
+
+    def __len__(self) -> int:
+        return len(self._bodies)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(bodies={len(self._bodies)}, size={self._size}, max_bytes={self._max_bytes})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _decode_body(body: str, base64_encoded: bool) -> Tuple[bytes, str]:
+    """Decodes a body returned by Network.getResponseBody and computes its digest, runs in an executor"""
+    data = a2b_base64(body) if base64_encoded else body.encode("utf-8")
+    return data, sha256(data).hexdigest()
+
+
+class BodyPrefetcher:
+    """Retrieves the bodies of the responses of interest (Network.getResponseBody) as soon
+    as they have finished loading, before Chrome evicts them, without flooding Chrome.
+
+    Responses are selected by MIME type, size and URL. At most max_concurrency bodies are
+    retrieved at a time, the rest wait their turn in priority order. Bodies are decoded, and
+    their digest computed, in an executor and then stored in a BodyCache.
+    """
+
+    __slots__ = [
+        "_active",
+        "_cache",
+        "_client",
+        "_enabled",
+        "_executor",
+        "_failed",
+        "_fetched",
+        "_loop",
+        "_max_concurrency",
+        "_max_size",
+        "_mime_types",
+        "_prioritizer",
+        "_queue",
+        "_responses",
+        "_seq",
+        "_skipped",
+        "_url_regex",
+        "_waiters",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        cache: Optional[BodyCache] = None,
+        max_concurrency: int = 4,
+        mime_types: Optional[Iterable[str]] = None,
+        max_size: Optional[int] = None,
+        url_pattern: Optional[str] = None,
+        prioritizer: Optional[Prioritizer] = None,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Construct a new instance of BodyPrefetcher
+
+        :param client: The connection or session whose response bodies are retrieved
+        :param cache: The cache the bodies are stored in, can be shared by several prefetchers
+        :param max_concurrency: The maximum number of Network.getResponseBody in-flight
+        :param mime_types: The MIME types, or prefixes thereof such as text/, of the responses of interest.
+        Defaults to all
+        :param max_size: The maximum encoded data length of the responses of interest. Defaults to any
+        :param url_pattern: Regular expression searched for in the URLs of the responses of interest.
+        Defaults to all
+        :param prioritizer: Returns the priority, lower is sooner, of a response given it and its resource type
+        :param executor: The executor bodies are decoded in, defaults to the event loop's default executor
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._loop: AbstractEventLoop = client.loop
+        self._cache: BodyCache = cache if cache is not None else BodyCache()
+        self._max_concurrency: int = max(1, max_concurrency)
+        self._mime_types: Optional[Tuple[str, ...]] = tuple(mime_types) if mime_types is not None else None
+        self._max_size: Optional[int] = max_size
+        self._url_regex: Optional[Pattern] = re.compile(url_pattern) if url_pattern is not None else None
+        self._prioritizer: Optional[Prioritizer] = prioritizer
+        self._executor: Optional[Executor] = executor
+        self._responses: Dict[str, Tuple[Dict, Optional[str]]] = {}
+        self._queue: List[Tuple[int, int, str]] = []
+        self._seq = count()
+        self._waiters: Dict[str, Future] = {}
+        self._active: int = 0
+        self._enabled: bool = False
+        self._fetched: int = 0
+        self._failed: int = 0
+        self._skipped: int = 0
+
+    @property
+    def cache(self) -> BodyCache:
+        """Returns the cache the bodies are stored in"""
+        return self._cache
+
+    @property
+    def fetched(self) -> int:
+        """Returns the number of bodies retrieved"""
+        return self._fetched
+
+    @property
+    def failed(self) -> int:
+        """Returns the number of bodies that could not be retrieved"""
+        return self._failed
+
+    @property
+    def skipped(self) -> int:
+        """Returns the number of finished responses not of interest"""
+        return self._skipped
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of bodies queued or being retrieved"""
+        return len(self._waiters)
+
+    async def enable(self) -> None:
+        """Starts prefetching response bodies (Network.enable)"""
+        if self._enabled:
+            return
+        self._enabled = True
+        self._client.on("Network.responseReceived", self._on_response_received)
+        self._client.on("Network.loadingFinished", self._on_loading_finished)
+        self._client.on("Network.loadingFailed", self._on_loading_failed)
+        await self._client.send("Network.enable")
+
+    async def disable(self) -> None:
+        """Stops prefetching response bodies, the bodies already queued are still retrieved"""
+        if not self._enabled:
+            return
+        self._enabled = False
+        self._client.remove_listener("Network.responseReceived", self._on_response_received)
+        self._client.remove_listener("Network.loadingFinished", self._on_loading_finished)
+        self._client.remove_listener("Network.loadingFailed", self._on_loading_failed)
+        self._responses.clear()
+
+    async def body(self, request_id: str) -> Optional[bytes]:
+        """Returns the body of the request, waiting for it if it is queued or being retrieved
+
+        :param request_id: The id of the request
+        :return: The body if it was prefetched and is still cached
+        """
+        waiter = self._waiters.get(request_id)
+        if waiter is not None:
+            await waiter
+        return self._cache.get(request_id)
+
+    async def wait(self) -> None:
+        """Waits for the bodies queued or being retrieved"""
+        while self._waiters:
+            await next(iter(self._waiters.values()))
+
+    def prefetch(self, request_id: str, priority: int = 0) -> None:
+        """Queues the retrieval of the body of the request regardless of the filters
+
+        :param request_id: The id of the request
+        :param priority: The priority, lower is sooner
+        """
+        if request_id in self._waiters or request_id in self._cache:
+            return
+        self._waiters[request_id] = self._loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), request_id))
+        while self._active < self._max_concurrency and self._queue:
+            self._active += 1
+            self._loop.create_task(self._worker())
+
+    def wants(self, response: Dict, encoded_data_length: float) -> bool:
+        """Returns T/F indicating if the body of the response is of interest
+
+        :param response: The response
+        :param encoded_data_length: The total number of bytes received for the response
+        :return: T/F indicating if the body should be retrieved
+        """
+        if self._max_size is not None and encoded_data_length > self._max_size:
+            return False
+        if self._mime_types is not None and not response.get("mimeType", "").startswith(self._mime_types):
+            return False
+        if self._url_regex is not None and self._url_regex.search(response.get("url", "")) is None:
+            return False
+        return True
+
+    async def _worker(self) -> None:
+        """Retrieves bodies, highest priority first, until the queue is empty"""
+        try:
+            while self._queue:
+                _, _, request_id = heapq.heappop(self._queue)
+                try:
+                    await self._fetch(request_id)
+                finally:
+                    waiter = self._waiters.pop(request_id, None)
+                    if waiter is not None and not waiter.done():
+                        waiter.set_result(None)
+        finally:
+            self._active -= 1
+
+    async def _fetch(self, request_id: str) -> None:
+        """Retrieves, decodes and caches the body of the request. Failures are counted and,
+        unless the body was merely gone, logged rather than raised so that the worker keeps
+        draining the queue
+        """
+        try:
+            resp = await self._client.send("Network.getResponseBody", {"requestId": request_id})
+            body, digest = await self._loop.run_in_executor(
+                self._executor, _decode_body, resp.get("body", ""), resp.get("base64Encoded", False)
+            )
+            self._cache.put(request_id, digest, body)
+        except (NetworkError, ProtocolError):
+            self._failed += 1
+            return
+        except CancelledError:
+            raise
+        except Exception:
+            self._failed += 1
+            logger.exception("prefetching the body of request %s failed", request_id)
+            return
+        self._fetched += 1
+
+    def _on_response_received(self, event: Dict) -> None:
+        self._responses[event["requestId"]] = (event["response"], event.get("type"))
+
+    def _on_loading_finished(self, event: Dict) -> None:
+        request_id = event["requestId"]
+        entry = self._responses.pop(request_id, None)
+        if entry is None:
+            return
+        response, resource_type = entry
+        if not self.wants(response, event.get("encodedDataLength", 0)):
+            self._skipped += 1
+            return
+        priority = self._prioritizer(response, resource_type) if self._prioritizer is not None else 0
+        self.prefetch(request_id, priority)
+
+    def _on_loading_failed(self, event: Dict) -> None:
+        self._responses.pop(event["requestId"], None)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(fetched={self._fetched}, pending={len(self._waiters)}, "
+            f"failed={self._failed}, skipped={self._skipped})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
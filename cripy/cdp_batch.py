@@ -0,0 +1,125 @@
+from asyncio import AbstractEventLoop, CancelledError, Future, gather, shield
+from collections import deque
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Sequence, Tuple
+
+__all__ = ["BatchCommand", "consume_outcome", "gather_results", "iter_results", "share_inflight"]
+
+#: A command of a batch, the method name and its optional params
+BatchCommand = Tuple[str, Optional[Dict]]
+
+
+def _outcome(future: Future) -> Any:
+    """Returns the result of the completed future or, if it did not
+    complete successfully, the exception it completed with
+
+    :param future: The completed future
+    :return: The result or exception of the future
+    """
+    if future.cancelled():
+        return CancelledError()
+    exception = future.exception()
+    if exception is not None:
+        return exception
+    return future.result()
+
+
+def consume_outcome(future: Future) -> None:
+    """Retrieves the outcome of the completed future of a command that is not awaited
+    so that its failure is not reported as never retrieved.
+    Intended to be used as a done callback.
+
+    :param future: The completed future
+    """
+    if not future.cancelled():
+        future.exception()
+
+
+async def share_inflight(
+    inflight: Dict[Hashable, Future], key: Hashable, factory: Callable[[], Awaitable[Any]], loop: AbstractEventLoop
+) -> Any:
+    """Runs the awaitable returned by factory once for all the concurrent callers using the same key.
+
+    The awaitable runs in its own task which each caller awaits shielded, so that a cancelled caller,
+    the first one included, neither cancels the task nor leaves the other callers waiting forever.
+
+    :param inflight: The tasks in-flight by key, the task is removed once it completes
+    :param key: The key identifying the work
+    :param factory: Returns the awaitable doing the work, called only if no task is in-flight for the key
+    :param loop: The event loop the task runs in
+    :return: The result of the awaitable
+    """
+    task = inflight.get(key)
+    if task is None:
+        task = inflight[key] = loop.create_task(factory())
+        task.add_done_callback(partial(_forget_inflight, inflight, key))
+        task.add_done_callback(consume_outcome)
+    return await shield(task)
+
+
+def _forget_inflight(inflight: Dict[Hashable, Future], key: Hashable, task: Future) -> None:
+    """Removes the completed task from the in-flight tasks
+
+    :param inflight: The tasks in-flight by key
+    :param key: The key of the task
+    :param task: The completed task
+    """
+    if inflight.get(key) is task:
+        del inflight[key]
+
+
+async def gather_results(futures: Sequence[Future]) -> List[Any]:
+    """Waits for all the futures of a batch to complete returning their results
+    in the same order as the supplied futures.
+
+    Futures that did not complete successfully have the exception they completed
+    with placed in the results rather than raising it.
+
+    :param futures: The futures of the batch
+    :return: The results of the futures
+    """
+    if not futures:
+        return []
+    return await gather(*futures, return_exceptions=True)
+
+
+async def iter_results(
+    futures: Sequence[Future], loop: AbstractEventLoop
+) -> AsyncIterator[Tuple[int, Any]]:
+    """Yields the results of the futures of a batch as they complete.
+
+    Each item yielded is a tuple of the index of the future in the supplied sequence
+    and its result or the exception it completed with.
+    If iteration is stopped early the futures that have not completed are cancelled.
+
+    :param futures: The futures of the batch
+    :param loop: The event loop the futures belong to
+    :return: An async iterator of (index, result or exception) tuples
+    """
+    ready: Deque[Tuple[int, Future]] = deque()
+    waiter: Optional[Future] = None
+
+    def on_done(idx: int, future: Future) -> None:
+        ready.append((idx, future))
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    for idx, future in enumerate(futures):
+        future.add_done_callback(partial(on_done, idx))
+
+    remaining = len(futures)
+    try:
+        while remaining:
+            if not ready:
+                waiter = loop.create_future()
+                await waiter
+                waiter = None
+            while ready:
+                idx, future = ready.popleft()
+                remaining -= 1
+                yield idx, _outcome(future)
+    finally:
+        if remaining:
+            for future in futures:
+                if not future.done():
+                    future.cancel()
@@ -1,5 +1,5 @@
 from asyncio import AbstractEventLoop, Future
-from typing import Optional
+from typing import Any, Dict, Optional
 
 __all__ = ["CDPResultFuture"]
 
@@ -10,3 +10,27 @@ class CDPResultFuture(Future):
     def __init__(self, method: str, loop: Optional[AbstractEventLoop] = None) -> None:
         super().__init__(loop=loop)
         self.method: str = method
+        self._callback_table: Optional[Dict[int, "CDPResultFuture"]] = None
+        self._callback_id: int = 0
+
+    def register(self, callbacks: Dict[int, "CDPResultFuture"], callback_id: int) -> None:
+        """Adds this future to the supplied callback table under the supplied id.
+        If this future is cancelled it is removed from the callback table immediately.
+
+        :param callbacks: The callback table of the connection or session
+        :param callback_id: The id of the command this future is for
+        """
+        self._callback_table = callbacks
+        self._callback_id = callback_id
+        callbacks[callback_id] = self
+
+    def cancel(self, *args: Any) -> bool:
+        """Cancel the future removing it from the callback table it was registered with
+
+        :return: T/F indicating if the future was cancelled
+        """
+        cancelled = super().cancel(*args)
+        if cancelled and self._callback_table is not None:
+            self._callback_table.pop(self._callback_id, None)
+            self._callback_table = None
+        return cancelled
@@ -1,5 +1,18 @@
 from asyncio import AbstractEventLoop, get_event_loop
-from typing import ClassVar, Dict, Optional, TYPE_CHECKING, Type, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    TYPE_CHECKING,
+    Tuple,
+    Type,
+    Union,
+)
 
 try:
     from ujson import dumps, loads
@@ -7,7 +20,10 @@ except ImportError:
     from json import dumps, loads
 from pyee2 import EventEmitterS
 
+from .cdp_batch import BatchCommand, gather_results, iter_results
 from .cdp_result_future import CDPResultFuture
+from .command_coalescer import CommandCoalescer
+from .result_cache import ResultCache
 from .errors import NetworkError, create_protocol_error
 from .events import SessionEvents
 
@@ -19,11 +35,13 @@ class CDPSession(EventEmitterS):
     __slots__ = [
         "_lastId",
         "_connection",
+        "_root",
         "_target_type",
         "_session_id",
         "_flat_session",
         "_callbacks",
-        "_sessions",
+        "_orphaned_responses",
+        "__weakref__",
     ]
 
     Events: ClassVar[Type[SessionEvents]] = SessionEvents
@@ -49,11 +67,12 @@ class CDPSession(EventEmitterS):
         super().__init__(loop=_loop)
         self._lastId: int = 0
         self._connection: Union["ConnectionType", "SessionType"] = connection
+        self._root: "ConnectionType" = connection._root if isinstance(connection, CDPSession) else connection
         self._target_type: str = target_type
         self._session_id: str = session_id
         self._flat_session: bool = flat_session
         self._callbacks: Dict[int, CDPResultFuture] = {}
-        self._sessions: Dict[str, SessionType] = {}
+        self._orphaned_responses: int = 0
 
     @property
     def loop(self) -> AbstractEventLoop:
@@ -75,6 +94,31 @@ class CDPSession(EventEmitterS):
         """Returns the type of the target"""
         return self._target_type
 
+    @property
+    def orphaned_responses(self) -> int:
+        """Returns the number of responses received for commands that
+        were no longer awaited, e.g. their future was cancelled
+        """
+        return self._orphaned_responses
+
+    @property
+    def coalescer(self) -> Optional[CommandCoalescer]:
+        """Returns the coalescer of idempotent commands of the underlying connection
+        if coalescing was enabled
+        """
+        if not self._root:
+            return None
+        return self._root.coalescer
+
+    @property
+    def result_cache(self) -> Optional[ResultCache]:
+        """Returns the cache of command results of the underlying connection
+        if result caching was enabled
+        """
+        if not self._root:
+            return None
+        return self._root.result_cache
+
     def send(self, method: str, params: Optional[Dict] = None) -> CDPResultFuture:
         """Send message to the connected session.
 
@@ -89,22 +133,68 @@ class CDPSession(EventEmitterS):
             )
         if params is None:
             params = {}
+        result_cache = self.result_cache
+        if result_cache is not None and method in result_cache.ttls:
+            return result_cache.send(self._send_coalesced, self._session_id, method, params)
+        return self._send_coalesced(method, params)
+
+    def _send_coalesced(self, method: str, params: Dict) -> CDPResultFuture:
+        """Sends the command, sharing the response of an identical in-flight
+        command if the method is coalesced
+
+        :param method: The method to be used
+        :param params: The parameters (arguments) for the command
+        :return: The future for the command
+        """
+        coalescer = self.coalescer
+        if coalescer is not None and method in coalescer.methods:
+            return coalescer.send(self._send_command, self._session_id, method, params)
+        return self._send_command(method, params)
+
+    def _send_command(self, method: str, params: Dict) -> CDPResultFuture:
+        """Sends the command returning the future that resolves once
+        the commands response is received
+
+        :param method: The method to be used
+        :param params: The parameters (arguments) for the command
+        :return: The future for the command
+        """
         if self._flat_session:
             _id = self._connection._raw_send({"method": method, "params": params, "sessionId": self.session_id})
             callback = CDPResultFuture(method, self._loop)
-            self._callbacks[_id] = callback
+            callback.register(self._callbacks, _id)
             return callback
         self._lastId += 1
         _id = self._lastId
         msg = dumps({"id": _id, "method": method, "params": params})
         callback = CDPResultFuture(method, self._loop)
-        self._callbacks[_id] = callback
+        callback.register(self._callbacks, _id)
         self._connection.send(
             "Target.sendMessageToTarget",
             {"sessionId": self._session_id, "message": msg},
         )
         return callback
 
+    def send_many(self, commands: Iterable[BatchCommand]) -> Awaitable[List[Any]]:
+        """Send a batch of commands to the connected session.
+
+        The commands are encoded in one pass and written back-to-back.
+
+        :param commands: The (method, params) pairs of the commands to be sent
+        :return: An awaitable that resolves with the results of the commands in the order
+        they were supplied. Commands that were unsuccessful have their exception in place of their result
+        """
+        return gather_results(self._send_batch(commands))
+
+    def send_many_unordered(self, commands: Iterable[BatchCommand]) -> AsyncIterator[Tuple[int, Any]]:
+        """Send a batch of commands to the connected session yielding
+        the results of the commands as they are received.
+
+        :param commands: The (method, params) pairs of the commands to be sent
+        :return: An async iterator of (index of the command, result or exception) tuples
+        """
+        return iter_results(self._send_batch(commands), self._loop)
+
     async def detach(self) -> None:
         """Detach session from target. Once detached, session won't emit any events and
         can't be used to send messages.
@@ -123,12 +213,45 @@ class CDPSession(EventEmitterS):
         """
         connection = self._connection if self._flat_session else self
         session = CDPSession(connection, target_type, session_id, flat_session=self._flat_session)
-        if self._flat_session:
-            self._connection.add_session(session)
-        else:
-            self._sessions[session_id] = session
+        self._root.add_session(session, self)
         return session
 
+    def _send_batch(self, commands: Iterable[BatchCommand]) -> List[CDPResultFuture]:
+        """Sends the commands of a batch returning the futures that
+        resolve once the responses of the commands are received
+
+        :param commands: The (method, params) pairs of the commands to be sent
+        :return: The futures for the commands in the order supplied
+        """
+        if not self._connection:  # pragma: no cover
+            raise NetworkError(
+                f"Protocol Error: Session closed. Most likely the "
+                f"target {self._target_type} has been closed."
+            )
+        msgs = [{"method": method, "params": params if params is not None else {}} for method, params in commands]
+        if not msgs:
+            return []
+        loop = self._loop
+        callbacks = [CDPResultFuture(msg["method"], loop) for msg in msgs]
+        if self._flat_session:
+            session_id = self._session_id
+            for msg in msgs:
+                msg["sessionId"] = session_id
+            ids = self._connection._raw_send_many(msgs)
+            self_callbacks = self._callbacks
+            for _id, callback in zip(ids, callbacks):
+                callback.register(self_callbacks, _id)
+            return callbacks
+        session_id = self._session_id
+        forwarded = []
+        for msg, callback in zip(msgs, callbacks):
+            self._lastId += 1
+            msg["id"] = self._lastId
+            callback.register(self._callbacks, self._lastId)
+            forwarded.append(("Target.sendMessageToTarget", {"sessionId": session_id, "message": dumps(msg)}))
+        self._connection._send_batch(forwarded)
+        return callbacks
+
     def on_message(self, maybe_str_or_dict: Union[str, Dict]) -> None:
         """Handles the recite of a message. Depending on if flat session
         mode is enabled the message supplied to this method will be either
@@ -141,46 +264,58 @@ class CDPSession(EventEmitterS):
         else:
             obj = maybe_str_or_dict
         _id = obj.get("id")
-        if _id and _id in self._callbacks:
-            callback = self._callbacks.pop(_id)
+        if _id:
+            callback = self._callbacks.pop(_id, None)
+            if callback is None:
+                # the future was cancelled, discard the response
+                self._orphaned_responses += 1
+                return
             if "error" in obj:
                 # Checking state of the future object.
                 # It can be canceled.
-                if callback and not callback.done():
+                if not callback.done():
                     callback.set_exception(create_protocol_error(callback.method, obj))
             else:
                 result = obj.get("result")
-                if callback and not callback.done():
+                if not callback.done():
                     callback.set_result(result)
             return
         method = obj.get("method")
         params = obj.get("params")
         if not self._flat_session:
             if method == "Target.receivedMessageFromTarget":
-                session = self._sessions.get(params.get("sessionId"))
+                session = self._root.sessions.get(params.get("sessionId"))
                 if session is not None:
                     session.on_message(params.get("message"))
                 return
             if method == "Target.detachedFromTarget":
-                session_id = params.get("sessionId")
-                session = self._sessions.get(session_id)
+                session = self._root.sessions.remove(params.get("sessionId"))
                 if session is not None:
                     session.on_closed()
-                    del self._sessions[session_id]
             return
         self.emit(method, params)
 
     def on_closed(self) -> None:
-        """Close this session"""
+        """Close this session and the sessions created from it"""
+        if self._connection is None:
+            return
+        result_cache = self.result_cache
+        if result_cache is not None:
+            result_cache.invalidate(session_id=self._session_id)
         for cb in self._callbacks.values():
             if not cb.done():
                 cb.set_exception(NetworkError(f"Network error {cb.method}: {self._target_type} closed."))
         self._callbacks.clear()
-        for session in self._sessions.values():
-            session.on_closed()
-        self._sessions.clear()
+        sessions = self._root.sessions
+        for session_id in sessions.children(self._session_id):
+            session = sessions.remove(session_id)
+            if session is not None:
+                session.on_closed()
         self._connection = None
+        self._root = None
         self.emit(SessionEvents.Disconnected)
+        # drop the listeners so that their closures no longer keep this session alive
+        self.remove_all_listeners()
 
     def __str__(self) -> str:
         return f"{self.__class__.__name__}(target={self._target_type}, sessionId={self._session_id})"
@@ -184,7 +184,7 @@ class Client(Connection):
             if session:
                 return session
         session = self._new_session(resp.get("type", "unknown"), session_id)
-        self._sessions[session_id] = session
+        self._sessions.add(session)
         return session
 
     def _new_session(self, target_type: str, session_id: str) -> "TargetSession":
@@ -247,7 +247,7 @@ class ClientDynamic(Connection):
             if session:
                 return session
         session = self._new_session(resp.get("type", "unknown"), session_id)
-        self._sessions[session_id] = session
+        self._sessions.add(session)
         return session
 
     def _new_session(self, target_type: str, session_id: str) -> "TargetSessionDynamic":
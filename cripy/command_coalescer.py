@@ -0,0 +1,157 @@
+from asyncio import AbstractEventLoop
+from functools import partial
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+try:
+    from ujson import dumps
+except ImportError:
+    from json import dumps
+
+from .cdp_result_future import CDPResultFuture
+
+__all__ = ["CommandCoalescer", "CommandKey", "CommandSender", "command_key"]
+
+#: The function used by the coalescer to actually send a command
+CommandSender = Callable[[str, Dict], CDPResultFuture]
+
+#: Identifies a command by its session id, method and serialized params
+CommandKey = Tuple[Optional[str], str, str]
+
+
+def command_key(session_id: Optional[str], method: str, params: Dict) -> CommandKey:
+    """Returns the key identifying the command
+
+    :param session_id: The id of the session the command is for, None for the connection
+    :param method: The method of the command
+    :param params: The parameters (arguments) of the command
+    :return: The key for the command
+    """
+    return session_id, method, dumps(params, sort_keys=True)
+
+
+class CommandCoalescer:
+    """Shares the in-flight response of identical idempotent commands.
+
+    While a command whose method was marked as idempotent is awaiting its response,
+    sending the same command (same method, params and session) again does not
+    send it to the remote instance but waits for the response of the in-flight command.
+    """
+
+    __slots__ = ["_hits", "_inflight", "_loop", "_methods", "_misses"]
+
+    def __init__(self, loop: AbstractEventLoop, methods: Iterable[str] = ()) -> None:
+        """Construct a new instance of CommandCoalescer
+
+        :param loop: The event loop the futures of the commands belong to
+        :param methods: The names of the methods to be considered idempotent
+        """
+        self._loop: AbstractEventLoop = loop
+        self._methods: Set[str] = set(methods)
+        self._inflight: Dict[CommandKey, CDPResultFuture] = {}
+        self._hits: int = 0
+        self._misses: int = 0
+
+    @property
+    def methods(self) -> Set[str]:
+        """Returns the names of the methods considered idempotent"""
+        return self._methods
+
+    @property
+    def hits(self) -> int:
+        """Returns the number of commands that shared an in-flight command's response"""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """Returns the number of idempotent commands that were actually sent"""
+        return self._misses
+
+    @property
+    def inflight(self) -> int:
+        """Returns the number of idempotent commands awaiting their response"""
+        return len(self._inflight)
+
+    def add_methods(self, *methods: str) -> None:
+        """Marks the supplied methods as idempotent
+
+        :param methods: The names of the methods
+        """
+        self._methods.update(methods)
+
+    def remove_methods(self, *methods: str) -> None:
+        """Marks the supplied methods as no longer idempotent
+
+        :param methods: The names of the methods
+        """
+        self._methods.difference_update(methods)
+
+    def reset_stats(self) -> None:
+        """Resets the hit and miss counters"""
+        self._hits = 0
+        self._misses = 0
+
+    def send(
+        self, sender: CommandSender, session_id: Optional[str], method: str, params: Dict
+    ) -> CDPResultFuture:
+        """Send the command using the supplied sender unless an identical command
+        is in-flight.
+
+        Each caller receives its own future so that cancelling it does not affect
+        the other callers waiting on the same response. The result itself is shared
+        between the callers and should not be mutated.
+
+        :param sender: The function used to send the command if it is not in-flight
+        :param session_id: The id of the session the command is for, None for the connection
+        :param method: The method to be used
+        :param params: The parameters (arguments) for the command
+        :return: A future that resolves once the commands response is received
+        """
+        key = command_key(session_id, method, params)
+        leader = self._inflight.get(key)
+        if leader is None:
+            self._misses += 1
+            leader = sender(method, params)
+            self._inflight[key] = leader
+            leader.add_done_callback(partial(self._on_leader_done, key))
+        else:
+            self._hits += 1
+        follower = CDPResultFuture(method, loop=self._loop)
+        leader.add_done_callback(partial(_copy_outcome, follower))
+        return follower
+
+    def clear(self) -> None:
+        """Forget all in-flight commands"""
+        self._inflight.clear()
+
+    def _on_leader_done(self, key: CommandKey, leader: CDPResultFuture) -> None:
+        """Removes the completed command from the in-flight commands
+
+        :param key: The key of the command
+        :param leader: The future of the command
+        """
+        if self._inflight.get(key) is leader:
+            del self._inflight[key]
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(methods={len(self._methods)}, hits={self._hits}, misses={self._misses})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _copy_outcome(follower: CDPResultFuture, leader: CDPResultFuture) -> None:
+    """Resolves the follower future with the outcome of the leader future
+
+    :param follower: The future to be resolved
+    :param leader: The completed future
+    """
+    if follower.done():
+        return
+    if leader.cancelled():
+        follower.cancel()
+        return
+    exception = leader.exception()
+    if exception is not None:
+        follower.set_exception(exception)
+    else:
+        follower.set_result(leader.result())
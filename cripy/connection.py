@@ -1,7 +1,22 @@
 import logging
 from asyncio import AbstractEventLoop, Event, Task, get_event_loop, sleep
+from concurrent.futures import Executor
 from inspect import isawaitable
-from typing import Any, Callable, ClassVar, Dict, Optional, TYPE_CHECKING, Type, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    TYPE_CHECKING,
+    Tuple,
+    Type,
+    Union,
+)
 import sys
 
 from async_timeout import timeout
@@ -13,7 +28,12 @@ except:
     from json import dumps, loads
 from websockets import ConnectionClosed, WebSocketClientProtocol, connect
 
+from .cdp_batch import BatchCommand, gather_results, iter_results
 from .cdp_result_future import CDPResultFuture
+from .command_coalescer import CommandCoalescer
+from .message_decoder import SLICE_SIZE, MessageDecoder
+from .result_cache import ResultCache
+from .session_index import SessionIndex
 from .cdp_session import CDPSession
 from .errors import NetworkError, create_protocol_error
 from .events import ConnectionEvents
@@ -36,10 +56,14 @@ class Connection(EventEmitterS):
         "_callbacks",
         "_closeCallback",
         "_closed",
+        "_coalescer",
         "_connected",
         "_flatten_sessions",
+        "_decoder",
         "_lastId",
+        "_orphaned_responses",
         "_recv_task",
+        "_result_cache",
         "_sessions",
         "_ws",
         "_ws_url",
@@ -69,11 +93,15 @@ class Connection(EventEmitterS):
         self._flatten_sessions: bool = flatten_sessions
         self._ws_url: str = ws_url
         self._lastId: int = 0
+        self._orphaned_responses: int = 0
         self._callbacks: Dict[int, CDPResultFuture] = {}
-        self._sessions: Dict[str, "SessionType"] = {}
+        self._sessions: SessionIndex = SessionIndex()
         self._ws: Optional[WebSocketClientProtocol] = None
         self._recv_task: Optional[Task] = None
         self._closeCallback: Optional[Callable[[], Any]] = None
+        self._coalescer: Optional[CommandCoalescer] = None
+        self._result_cache: Optional[ResultCache] = None
+        self._decoder: Optional[MessageDecoder] = None
 
     @staticmethod
     def from_session(session: "SessionType") -> "ConnectionType":
@@ -82,12 +110,7 @@ class Connection(EventEmitterS):
         :param session: The session to retrieve the underlying connection
         :return: The underlying connection
         """
-        if session.flat_session:
-            return session._connection
-        conn = session._connection
-        while not isinstance(conn, Connection):
-            conn = conn._connection
-        return conn
+        return session._root
 
     @property
     def loop(self) -> AbstractEventLoop:
@@ -104,12 +127,100 @@ class Connection(EventEmitterS):
         """Returns T/F indicating if the connection is closed"""
         return self._closed
 
-    def add_session(self, session: "SessionType") -> None:
+    @property
+    def orphaned_responses(self) -> int:
+        """Returns the number of responses received for commands that
+        were no longer awaited, e.g. their future was cancelled
+        """
+        return self._orphaned_responses
+
+    @property
+    def coalescer(self) -> Optional[CommandCoalescer]:
+        """Returns the coalescer of idempotent commands if coalescing was enabled"""
+        return self._coalescer
+
+    def enable_coalescing(self, *methods: str) -> CommandCoalescer:
+        """Enables the coalescing of the supplied idempotent methods for this connection
+        and all its sessions.
+
+        While an identical command (same method, params and session) of a coalesced method
+        is awaiting its response, sending it again shares the in-flight response rather than
+        sending the command to the remote instance.
+
+        :param methods: The names of the methods that are idempotent, e.g. DOM.getDocument
+        :return: The coalescer, which exposes the hit and miss counters
+        """
+        if self._coalescer is None:
+            self._coalescer = CommandCoalescer(self._loop, methods)
+        else:
+            self._coalescer.add_methods(*methods)
+        return self._coalescer
+
+    @property
+    def result_cache(self) -> Optional[ResultCache]:
+        """Returns the cache of command results if result caching was enabled"""
+        return self._result_cache
+
+    def enable_result_cache(self, ttls: Optional[Dict[str, float]] = None, maxsize: int = 256) -> ResultCache:
+        """Enables caching the results of the commands of the supplied methods for this
+        connection and all its sessions. The cache is invalidated once the connection is closed.
+
+        :param ttls: Mapping of method names to the number of seconds their results are cached for.
+        Defaults to the methods returning static browser information, e.g. Browser.getVersion
+        :param maxsize: The maximum number of results cached, least recently used results are evicted first
+        :return: The result cache
+        """
+        if self._result_cache is None:
+            self._result_cache = ResultCache(self._loop, ttls, maxsize)
+        elif ttls is not None:
+            for method, ttl in ttls.items():
+                self._result_cache.set_ttl(method, ttl)
+        return self._result_cache
+
+    @property
+    def decoder(self) -> Optional[MessageDecoder]:
+        """Returns the policy for decoding large messages off the event loop if it was enabled"""
+        return self._decoder
+
+    def enable_offloaded_decoding(
+        self, threshold: int = 1 << 20, executor: Optional[Executor] = None, slice_size: int = SLICE_SIZE
+    ) -> MessageDecoder:
+        """Enables decoding the messages received whose size is at least threshold off the event loop,
+        in slices in a thread so that the event loop keeps running while they are decoded.
+        The messages are still handled in the order they were received.
+
+        :param threshold: The size, in characters, from which messages are decoded off the event loop
+        :param executor: The thread executor messages are decoded in, defaults to the event loop's
+        default executor
+        :param slice_size: The maximum number of characters decoded at once by the thread holding the GIL
+        :return: The decoder, which exposes the counts of messages decoded inline and off the event loop
+        """
+        self._decoder = MessageDecoder(threshold, executor, slice_size)
+        return self._decoder
+
+    def disable_offloaded_decoding(self) -> None:
+        """Disables decoding messages off the event loop, all messages are decoded inline"""
+        self._decoder = None
+
+    @property
+    def sessions(self) -> SessionIndex:
+        """Returns the index of all the sessions of the connection, including the sessions of sessions"""
+        return self._sessions
+
+    def add_session(self, session: "SessionType", parent: Optional["SessionType"] = None) -> None:
         """Adds the supplied session to the tracked sessions
 
         :param session: The session to be tracked
+        :param parent: The session the supplied session was created from if any
+        """
+        self._sessions.add(session, parent.session_id if parent is not None else None)
+
+    def leaked_sessions(self) -> List[str]:
+        """Returns the ids of the sessions that are closed but are still referenced
+
+        :return: The ids of the leaked sessions
         """
-        self._sessions[session.session_id] = session
+        return self._sessions.leaked()
 
     def set_close_callback(self, callback: Callable[[], Any]) -> None:
         """Set closed callback."""
@@ -135,10 +246,30 @@ class Connection(EventEmitterS):
             raise NetworkError("Connection is closed")
         if params is None:
             params = {}
-        _id = self._raw_send({"method": method, "params": params})
-        callback = CDPResultFuture(method, loop=self._loop)
-        self._callbacks[_id] = callback
-        return callback
+        result_cache = self._result_cache
+        if result_cache is not None and method in result_cache.ttls:
+            return result_cache.send(self._send_coalesced, None, method, params)
+        return self._send_coalesced(method, params)
+
+    def send_many(self, commands: Iterable[BatchCommand]) -> Awaitable[List[Any]]:
+        """Send a batch of commands to the remote chrome instance.
+
+        The commands are encoded in one pass and written back-to-back.
+
+        :param commands: The (method, params) pairs of the commands to be sent
+        :return: An awaitable that resolves with the results of the commands in the order
+        they were supplied. Commands that were unsuccessful have their exception in place of their result
+        """
+        return gather_results(self._send_batch(commands))
+
+    def send_many_unordered(self, commands: Iterable[BatchCommand]) -> AsyncIterator[Tuple[int, Any]]:
+        """Send a batch of commands to the remote chrome instance yielding
+        the results of the commands as they are received.
+
+        :param commands: The (method, params) pairs of the commands to be sent
+        :return: An async iterator of (index of the command, result or exception) tuples
+        """
+        return iter_results(self._send_batch(commands), self._loop)
 
     async def connect(self, ws_url: Optional[str] = None, flatten_sessions: Optional[bool] = None) -> None:
         """Connect to the remote websocket endpoint
@@ -187,7 +318,7 @@ class Connection(EventEmitterS):
             if session:
                 return session
         session = self._new_session(resp.get("type", "unknown"), session_id)
-        self._sessions[session_id] = session
+        self._sessions.add(session)
         return session
 
     async def dispose(self) -> None:
@@ -199,11 +330,15 @@ class Connection(EventEmitterS):
         """Loop that listens for messages from the remote chrome instance and handles them.
 
         When a msg is received, the _on_message method is called with the raw msg contents.
+        If decoding large messages off the event loop is enabled, large messages are decoded
+        in an executor and the _on_decoded_message method is called with the decoded msg.
         """
         self._connected = True
         self.emit(ConnectionEvents.Ready)
         self_ws_recv = self._ws.recv
         self_on_message = self._on_message
+        self_on_decoded_message = self._on_decoded_message
+        loop = self._loop
         logger_info = logger.info
         connected = self.__connected
 
@@ -211,7 +346,11 @@ class Connection(EventEmitterS):
             try:
                 resp = await self_ws_recv()
                 if resp:
-                    self_on_message(resp)
+                    decoder = self._decoder
+                    if decoder is not None and decoder.offloads(resp):
+                        self_on_decoded_message(await decoder.decode(resp, loop))
+                    else:
+                        self_on_message(resp)
             except (ConnectionClosed, ConnectionResetError):
                 logger_info("connection closed")
                 break
@@ -245,6 +384,27 @@ class Connection(EventEmitterS):
                 callback.set_result(None)
                 await self.dispose()
 
+    async def _send_many_async(self, msgs: List[str], callback_ids: List[int]) -> None:
+        """Actually send the msgs of a batch to remote instance.
+
+        :param msgs: The msgs to send
+        :param callback_ids: The ids identifying the callbacks associated with the msgs
+        """
+        while not self._connected:
+            await sleep(0)  # pragma: no cover
+
+        ws_send = self._ws.send
+        try:
+            for msg in msgs:
+                await ws_send(msg)
+        except ConnectionClosed:
+            logger.error("connection unexpectedly closed")
+            for callback_id in callback_ids:
+                callback = self._callbacks.get(callback_id, None)
+                if callback and not callback.done():
+                    callback.set_result(None)
+            await self.dispose()
+
     async def _on_close(self) -> None:
         """Closes the websocket connection and cleans up internals.
 
@@ -260,10 +420,13 @@ class Connection(EventEmitterS):
             if not cb.done():  # pragma: no cover
                 cb.set_exception(NetworkError(f"{cb.method}: Target closed."))
         self._callbacks.clear()
+        if self._coalescer is not None:
+            self._coalescer.clear()
+        if self._result_cache is not None:
+            self._result_cache.clear()
 
-        for session in self._sessions.values():
+        for session in self._sessions.remove_all():
             session.on_closed()
-        self._sessions.clear()
 
         # close connection
         if self._ws and not self._ws.closed:
@@ -305,6 +468,69 @@ class Connection(EventEmitterS):
         self._loop.create_task(self._send_async(dumps(msg), _id))
         return _id
 
+    def _raw_send_many(self, msgs: List[Dict]) -> List[int]:
+        """Sends the messages of a batch to the remote browser returning
+        the ids of the messages
+
+        :param msgs: The messages to be sent
+        :return: The ids of the messages sent
+        """
+        first_id = self._lastId + 1
+        self._lastId += len(msgs)
+        ids = list(range(first_id, self._lastId + 1))
+        encoded = []
+        for _id, msg in zip(ids, msgs):
+            msg["id"] = _id
+            encoded.append(dumps(msg))
+        self._loop.create_task(self._send_many_async(encoded, ids))
+        return ids
+
+    def _send_coalesced(self, method: str, params: Dict) -> CDPResultFuture:
+        """Sends the command, sharing the response of an identical in-flight
+        command if the method is coalesced
+
+        :param method: The method to be used
+        :param params: The parameters (arguments) for the command
+        :return: The future for the command
+        """
+        coalescer = self._coalescer
+        if coalescer is not None and method in coalescer.methods:
+            return coalescer.send(self._send_command, None, method, params)
+        return self._send_command(method, params)
+
+    def _send_command(self, method: str, params: Dict) -> CDPResultFuture:
+        """Sends the command returning the future that resolves once
+        the commands response is received
+
+        :param method: The method to be used
+        :param params: The parameters (arguments) for the command
+        :return: The future for the command
+        """
+        _id = self._raw_send({"method": method, "params": params})
+        callback = CDPResultFuture(method, loop=self._loop)
+        callback.register(self._callbacks, _id)
+        return callback
+
+    def _send_batch(self, commands: Iterable[BatchCommand]) -> List[CDPResultFuture]:
+        """Sends the commands of a batch returning the futures that
+        resolve once the responses of the commands are received
+
+        :param commands: The (method, params) pairs of the commands to be sent
+        :return: The futures for the commands in the order supplied
+        """
+        if self._lastId and not self._connected:
+            raise NetworkError("Connection is closed")
+        msgs = [{"method": method, "params": params if params is not None else {}} for method, params in commands]
+        if not msgs:
+            return []
+        ids = self._raw_send_many(msgs)
+        loop = self._loop
+        callbacks = [CDPResultFuture(msg["method"], loop=loop) for msg in msgs]
+        self_callbacks = self._callbacks
+        for _id, callback in zip(ids, callbacks):
+            callback.register(self_callbacks, _id)
+        return callbacks
+
     def _on_message(self, message: str) -> None:
         """Handles a message received from the remote browser instance.
 
@@ -315,7 +541,13 @@ class Connection(EventEmitterS):
 
         :param message: The JSON message string.
         """
-        msg = loads(message)
+        self._on_decoded_message(loads(message))
+
+    def _on_decoded_message(self, msg: Dict) -> None:
+        """Handles a decoded message received from the remote browser instance.
+
+        :param msg: The decoded message
+        """
         self._log_msg(msg)
         if not self._flatten_sessions:
             return self._on_message_non_flat(msg)
@@ -324,15 +556,15 @@ class Connection(EventEmitterS):
         method = msg.get("method", "")
         if method == "Target.attachedToTarget":
             session_id = params.get("sessionId")
-            self._sessions[session_id] = self._new_session(
-                params.get("targetInfo", {}).get("type", "unknown"), session_id
-            )
+            if session_id not in self._sessions:
+                self._sessions.add(
+                    self._new_session(params.get("targetInfo", {}).get("type", "unknown"), session_id),
+                    msg.get("sessionId"),
+                )
         elif method == "Target.detachedFromTarget":
-            session_id = params.get("sessionId", None)
-            session = self._sessions.get(session_id)
+            session = self._sessions.remove(params.get("sessionId", None))
             if session:
                 session.on_closed()
-                del self._sessions[session_id]
 
         session_id = msg.get("sessionId", None)
         if session_id:
@@ -340,13 +572,8 @@ class Connection(EventEmitterS):
             if session:
                 session.on_message(msg)
             return
-        if _id and _id in self._callbacks:
-            callback = self._callbacks.pop(_id)
-            if not callback.done():
-                if "error" in msg:
-                    callback.set_exception(create_protocol_error(callback.method, msg))
-                else:
-                    callback.set_result(msg.get("result"))
+        if _id:
+            self._resolve_callback(_id, msg)
             return
         self.emit(method, params)
 
@@ -362,13 +589,8 @@ class Connection(EventEmitterS):
         :param msg: The JSON message string.
         """
         _id = msg.get("id")
-        if _id and _id in self._callbacks:
-            callback = self._callbacks.pop(_id)
-            if callback and not callback.done():
-                if "error" in msg:
-                    callback.set_exception(create_protocol_error(callback.method, msg))
-                else:
-                    callback.set_result(msg.get("result"))
+        if _id:
+            self._resolve_callback(_id, msg)
             return
         params = msg.get("params", {})
         method = msg.get("method", "")
@@ -379,13 +601,29 @@ class Connection(EventEmitterS):
                 session.on_message(params.get("message"))
             return
         if method == "Target.detachedFromTarget":
-            session = self._sessions.get(session_id)
+            session = self._sessions.remove(session_id)
             if session:
                 session.on_closed()
-                del self._sessions[session_id]
             return
         self.emit(method, params)
 
+    def _resolve_callback(self, _id: int, msg: Dict) -> None:
+        """Resolves the future awaiting the response of the command.
+        If no future is awaiting the response, e.g. it was cancelled, the response is discarded.
+
+        :param _id: The id of the command
+        :param msg: The response message of the command
+        """
+        callback = self._callbacks.pop(_id, None)
+        if callback is None:
+            self._orphaned_responses += 1
+            return
+        if not callback.done():
+            if "error" in msg:
+                callback.set_exception(create_protocol_error(callback.method, msg))
+            else:
+                callback.set_result(msg.get("result"))
+
     def _new_session(self, target_type: str, session_id: str) -> CDPSession:
         """Creates a new session connected to the target
 
@@ -0,0 +1,269 @@
+from asyncio import AbstractEventLoop, Future, wait_for
+from functools import partial
+from typing import Any, Dict, List, Optional, Set, TYPE_CHECKING, Tuple, Union
+
+from .cdp_batch import share_inflight
+from .errors import NetworkError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["ExecutionContext", "ExecutionContextRegistry"]
+
+#: frameId, world name (None for the main world)
+WorldKey = Tuple[str, Optional[str]]
+
+
+class ExecutionContext:
+    """A Runtime.ExecutionContextDescription"""
+
+    __slots__ = ["aux_data", "frame_id", "id", "is_default", "name", "origin", "type", "unique_id"]
+
+    def __init__(self, description: Dict[str, Any]) -> None:
+        """Construct a new instance of ExecutionContext
+
+        :param description: The Runtime.ExecutionContextDescription
+        """
+        aux_data = description.get("auxData") or {}
+        self.id: int = description["id"]
+        self.unique_id: Optional[str] = description.get("uniqueId")
+        self.origin: str = description.get("origin", "")
+        self.name: str = description.get("name", "")
+        self.aux_data: Dict[str, Any] = aux_data
+        self.frame_id: Optional[str] = aux_data.get("frameId")
+        self.is_default: bool = aux_data.get("isDefault", False)
+        #: default, isolated or worker
+        self.type: Optional[str] = aux_data.get("type")
+
+    @property
+    def world_key(self) -> Optional[WorldKey]:
+        """Returns the key of the world of the context, None if it does not belong to a frame"""
+        if self.frame_id is None:
+            return None
+        return self.frame_id, None if self.is_default else self.name
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(id={self.id}, frame_id={self.frame_id}, name={self.name!r}, "
+            f"origin={self.origin}, is_default={self.is_default})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ExecutionContextRegistry:
+    """Follows the execution contexts of a connection or session (Runtime.executionContextCreated,
+    executionContextDestroyed and executionContextsCleared) indexing them by frame, world name and origin.
+
+    Resolving the main world or a named isolated world of a frame is a dict lookup, the contexts
+    not yet created can be waited for. Isolated worlds are created once per frame
+    (Page.createIsolatedWorld) and reused until they are destroyed, e.g. the frame navigates.
+    """
+
+    __slots__ = ["_by_origin", "_client", "_contexts", "_creating", "_enabled", "_loop", "_waiters", "_worlds"]
+
+    def __init__(self, client: Union["ConnectionType", "SessionType"]) -> None:
+        """Construct a new instance of ExecutionContextRegistry
+
+        :param client: The connection or session whose execution contexts are followed
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._loop: AbstractEventLoop = client.loop
+        self._contexts: Dict[int, ExecutionContext] = {}
+        self._worlds: Dict[WorldKey, int] = {}
+        self._by_origin: Dict[str, Set[int]] = {}
+        self._waiters: Dict[WorldKey, List[Future]] = {}
+        self._creating: Dict[WorldKey, Future] = {}
+        self._enabled: bool = False
+
+    async def enable(self) -> None:
+        """Starts following the execution contexts (Runtime.enable), the existing contexts are reported on enable"""
+        if self._enabled:
+            return
+        self._enabled = True
+        client = self._client
+        client.on("Runtime.executionContextCreated", self._on_context_created)
+        client.on("Runtime.executionContextDestroyed", self._on_context_destroyed)
+        client.on("Runtime.executionContextsCleared", self._on_contexts_cleared)
+        await client.send("Runtime.enable")
+
+    def disable(self) -> None:
+        """Stops following the execution contexts, forgetting them and failing the pending waits"""
+        if self._enabled:
+            self._enabled = False
+            client = self._client
+            client.remove_listener("Runtime.executionContextCreated", self._on_context_created)
+            client.remove_listener("Runtime.executionContextDestroyed", self._on_context_destroyed)
+            client.remove_listener("Runtime.executionContextsCleared", self._on_contexts_cleared)
+        self._on_contexts_cleared()
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(NetworkError("The execution context registry was disabled"))
+        self._waiters.clear()
+
+    def get(self, context_id: int) -> Optional[ExecutionContext]:
+        """Returns the execution context with the supplied id
+
+        :param context_id: The id of the execution context
+        :return: The execution context if it exists
+        """
+        return self._contexts.get(context_id)
+
+    def main_world(self, frame_id: str) -> Optional[ExecutionContext]:
+        """Returns the execution context of the main world of the frame
+
+        :param frame_id: The id of the frame
+        :return: The execution context if it exists
+        """
+        return self.world(frame_id, None)
+
+    def world(self, frame_id: str, name: Optional[str]) -> Optional[ExecutionContext]:
+        """Returns the execution context of the named world of the frame
+
+        :param frame_id: The id of the frame
+        :param name: The name of the isolated world, None for the main world
+        :return: The execution context if it exists
+        """
+        context_id = self._worlds.get((frame_id, name))
+        return self._contexts.get(context_id) if context_id is not None else None
+
+    def frame_contexts(self, frame_id: str) -> List[ExecutionContext]:
+        """Returns the execution contexts of the frame, main world first
+
+        :param frame_id: The id of the frame
+        :return: The execution contexts of the frame
+        """
+        contexts = [context for context in self._contexts.values() if context.frame_id == frame_id]
+        contexts.sort(key=lambda context: not context.is_default)
+        return contexts
+
+    def by_origin(self, origin: str) -> List[ExecutionContext]:
+        """Returns the execution contexts with the supplied origin
+
+        :param origin: The origin, e.g. https://example.com
+        :return: The execution contexts with the origin
+        """
+        return [self._contexts[context_id] for context_id in self._by_origin.get(origin, ())]
+
+    async def wait_for_main_world(self, frame_id: str, timeout: Optional[float] = None) -> ExecutionContext:
+        """Returns the execution context of the main world of the frame, waiting for it to be created
+
+        :param frame_id: The id of the frame
+        :param timeout: The maximum number of seconds to wait, defaults to forever
+        :return: The execution context
+        """
+        return await self.wait_for_world(frame_id, None, timeout)
+
+    async def wait_for_world(
+        self, frame_id: str, name: Optional[str], timeout: Optional[float] = None
+    ) -> ExecutionContext:
+        """Returns the execution context of the named world of the frame, waiting for it to be created
+
+        :param frame_id: The id of the frame
+        :param name: The name of the isolated world, None for the main world
+        :param timeout: The maximum number of seconds to wait, defaults to forever
+        :return: The execution context
+        """
+        context = self.world(frame_id, name)
+        if context is not None:
+            return context
+        waiter = self._loop.create_future()
+        key = (frame_id, name)
+        self._waiters.setdefault(key, []).append(waiter)
+        try:
+            return await wait_for(waiter, timeout)
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters is not None and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._waiters[key]
+
+    async def isolated_world(
+        self, frame_id: str, name: str = "__cripy_utility_world__", grant_universal_access: bool = False
+    ) -> ExecutionContext:
+        """Returns the execution context of the named isolated world of the frame,
+        creating the isolated world (Page.createIsolatedWorld) if it does not exist.
+        Concurrent callers share one creation which cancelling a caller does not cancel
+
+        :param frame_id: The id of the frame
+        :param name: The name of the isolated world
+        :param grant_universal_access: Should the isolated world be granted universal access
+        :return: The execution context of the isolated world
+        """
+        key = (frame_id, name)
+        context = self.world(frame_id, name)
+        if context is not None:
+            return context
+        create = partial(self._create_isolated_world, frame_id, name, grant_universal_access)
+        return await share_inflight(self._creating, key, create, self._loop)
+
+    async def _create_isolated_world(
+        self, frame_id: str, name: str, grant_universal_access: bool
+    ) -> ExecutionContext:
+        """Creates the named isolated world of the frame (Page.createIsolatedWorld)
+
+        :param frame_id: The id of the frame
+        :param name: The name of the isolated world
+        :param grant_universal_access: Should the isolated world be granted universal access
+        :return: The execution context of the isolated world
+        """
+        resp = await self._client.send(
+            "Page.createIsolatedWorld",
+            {"frameId": frame_id, "worldName": name, "grantUniveralAccess": grant_universal_access},
+        )
+        context_id = resp["executionContextId"]
+        context = self._contexts.get(context_id)
+        if context is None:
+            # Runtime.executionContextCreated has not been received (yet)
+            aux_data = {"frameId": frame_id, "isDefault": False, "type": "isolated"}
+            context = ExecutionContext({"id": context_id, "name": name, "auxData": aux_data})
+            self._add(context)
+        return context
+
+    def _add(self, context: ExecutionContext) -> None:
+        self._contexts[context.id] = context
+        if context.origin:
+            self._by_origin.setdefault(context.origin, set()).add(context.id)
+        key = context.world_key
+        if key is None:
+            return
+        self._worlds[key] = context.id
+        for waiter in self._waiters.pop(key, ()):
+            if not waiter.done():
+                waiter.set_result(context)
+
+    def _on_context_created(self, event: Dict) -> None:
+        self._add(ExecutionContext(event["context"]))
+
+    def _on_context_destroyed(self, event: Dict) -> None:
+        context = self._contexts.pop(event["executionContextId"], None)
+        if context is None:
+            return
+        origin_contexts = self._by_origin.get(context.origin)
+        if origin_contexts is not None:
+            origin_contexts.discard(context.id)
+            if not origin_contexts:
+                del self._by_origin[context.origin]
+        key = context.world_key
+        if key is not None and self._worlds.get(key) == context.id:
+            del self._worlds[key]
+
+    def _on_contexts_cleared(self, event: Optional[Dict] = None) -> None:
+        self._contexts.clear()
+        self._worlds.clear()
+        self._by_origin.clear()
+
+    def __contains__(self, context_id: int) -> bool:
+        return context_id in self._contexts
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(contexts={len(self._contexts)}, worlds={len(self._worlds)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,192 @@
+from itertools import count
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, TYPE_CHECKING, Union
+
+try:
+    from ujson import dumps, loads
+except ImportError:
+    from json import dumps, loads
+
+from .dom_snapshot import ColumnarSnapshot
+from .errors import ClientError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["ExtractionTable", "extract_table"]
+
+_marker_ids = count(1)
+
+#: Field specs that take no argument
+SIMPLE_FIELDS = frozenset(["tag", "text", "inner_text", "html", "box", "visible"])
+#: Prefixes of the field specs that take the name of an attribute, property or computed style
+PREFIXED_FIELDS = ("attr:", "prop:", "style:")
+
+#: Computes one column per field spec for the elements matching the selector, marking the
+#: matches with their row index when a marker attribute is supplied
+_EXTRACT = """((selector, specs, marker) => {
+  const elements = Array.from(document.querySelectorAll(selector));
+  const needsStyle = specs.some(spec => spec.startsWith('style:') || spec === 'visible');
+  const styles = needsStyle ? elements.map(element => getComputedStyle(element)) : null;
+  const columns = specs.map(spec => {
+    const colon = spec.indexOf(':');
+    const kind = colon === -1 ? spec : spec.slice(0, colon);
+    const arg = colon === -1 ? '' : spec.slice(colon + 1);
+    return elements.map((element, i) => {
+      switch (kind) {
+        case 'tag': return element.localName;
+        case 'text': return element.textContent;
+        case 'inner_text': return element.innerText;
+        case 'html': return element.outerHTML;
+        case 'attr': return element.getAttribute(arg);
+        case 'prop': {
+          const value = element[arg];
+          return value === undefined || typeof value === 'function' ? null : value;
+        }
+        case 'style': return styles[i].getPropertyValue(arg);
+        case 'box': {
+          const rect = element.getBoundingClientRect();
+          return [rect.x, rect.y, rect.width, rect.height];
+        }
+        case 'visible': {
+          const rect = element.getBoundingClientRect();
+          return rect.width > 0 && rect.height > 0 && styles[i].visibility === 'visible';
+        }
+      }
+      return null;
+    });
+  });
+  if (marker) elements.forEach((element, i) => element.setAttribute(marker, String(i)));
+  return JSON.stringify({rows: elements.length, columns});
+})(%s, %s, %s)"""
+
+_UNMARK = "document.querySelectorAll(%(selector)s).forEach(element => element.removeAttribute(%(marker)s))"
+
+
+class ExtractionTable:
+    """The result of a bulk extraction: one list per field plus the backend node ids of the rows,
+    None for the rows whose element was not found in the snapshot"""
+
+    __slots__ = ["backend_node_ids", "columns", "rows"]
+
+    def __init__(
+        self, columns: Dict[str, List[Any]], rows: int, backend_node_ids: Optional[List[Optional[int]]] = None
+    ) -> None:
+        """Construct a new instance of ExtractionTable
+
+        :param columns: Mapping of field names to their values, one per row
+        :param rows: The number of rows
+        :param backend_node_ids: The backend node ids of the rows if they were extracted
+        """
+        self.columns: Dict[str, List[Any]] = columns
+        self.rows: int = rows
+        self.backend_node_ids: Optional[List[Optional[int]]] = backend_node_ids
+
+    @property
+    def fields(self) -> List[str]:
+        """Returns the names of the fields"""
+        return list(self.columns)
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """Returns the values of the fields of a row
+
+        :param index: The index of the row
+        :return: Mapping of field names to values
+        """
+        row = {name: values[index] for name, values in self.columns.items()}
+        if self.backend_node_ids is not None:
+            row["backendNodeId"] = self.backend_node_ids[index]
+        return row
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """Yields the rows as mappings of field names to values"""
+        for index in range(self.rows):
+            yield self.row(index)
+
+    def __getitem__(self, field: str) -> List[Any]:
+        return self.columns[field]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(rows={self.rows}, fields={list(self.columns)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _field_specs(fields: Union[Mapping[str, str], Sequence[str]]) -> Dict[str, str]:
+    specs = dict(fields) if isinstance(fields, Mapping) else {spec: spec for spec in fields}
+    for spec in specs.values():
+        if spec not in SIMPLE_FIELDS and not (spec.startswith(PREFIXED_FIELDS) and spec.index(":") < len(spec) - 1):
+            raise ClientError(f"Unknown field spec {spec}")
+    return specs
+
+
+async def extract_table(
+    client: Union["ConnectionType", "SessionType"],
+    selector: str,
+    fields: Union[Mapping[str, str], Sequence[str]],
+    backend_node_ids: bool = False,
+    context_id: Optional[int] = None,
+) -> ExtractionTable:
+    """Extracts the fields of every element matching the selector in a single Runtime.evaluate
+    rather than a DOM/CSS command per element and field.
+
+    Field specs are tag, text (textContent), inner_text, html (outerHTML), box ([x, y, width, height]
+    of the bounding client rect), visible, attr:<name>, prop:<name> and style:<computed style name>.
+
+    The backend node ids of the elements are not available to page scripts and are only retrieved
+    on request (backend_node_ids=True). The elements are then marked with their row index and
+    DOMSnapshot.captureSnapshot and the removal of the marks are written back-to-back, costing one
+    more round-trip, with side effects and a cost beyond that round-trip:
+
+    - the snapshot is of every document of the page, all its frames included, and its size
+      grows with the whole page rather than with the number of matching elements
+    - setting and removing the marker attribute are DOM mutations, they are seen by the
+      MutationObservers of the page and, if the DOM domain is enabled, emitted as
+      DOM.attributeModified and DOM.attributeRemoved events, e.g. handled by a DOMMirror
+      or SelectorCache listening to the same client
+
+    The matching elements are looked up in every document of the snapshot. Elements that are
+    not found, e.g. removed before the snapshot was captured, have None as their backend node id.
+
+    :param client: The connection or session of the page
+    :param selector: The selector the elements are matched with
+    :param fields: Mapping of field names to field specs, or a list of field specs used as their own names
+    :param backend_node_ids: Should the backend node ids of the elements be retrieved, defaults to False
+    :param context_id: The id of the execution context of the main world, defaults to that of the inspected page
+    :return: The table of the values of the fields of the matching elements, one row per element in document order
+    """
+    specs = _field_specs(fields)
+    marker = f"data-cripy-extract-{next(_marker_ids)}" if backend_node_ids else None
+    params: Dict[str, Any] = {
+        "expression": _EXTRACT % (dumps(selector), dumps(list(specs.values())), dumps(marker)),
+        "returnByValue": True,
+    }
+    if context_id is not None:
+        params["contextId"] = context_id
+    resp = await client.send("Runtime.evaluate", params)
+    details = resp.get("exceptionDetails")
+    if details is not None:
+        raise ClientError(details.get("exception", {}).get("description") or details.get("text", ""))
+    extracted = loads(resp["result"]["value"])
+    rows = extracted["rows"]
+    table = ExtractionTable(dict(zip(specs, extracted["columns"])), rows)
+    if marker is None or not rows:
+        return table
+    unmark: Dict[str, Any] = {"expression": _UNMARK % {"selector": dumps(f"[{marker}]"), "marker": dumps(marker)}}
+    if context_id is not None:
+        unmark["contextId"] = context_id
+    snapshot_resp, _ = await client.send_many(
+        [("DOMSnapshot.captureSnapshot", {"computedStyles": []}), ("Runtime.evaluate", unmark)]
+    )
+    if isinstance(snapshot_resp, Exception):
+        raise snapshot_resp
+    ids: List[Optional[int]] = [None] * rows
+    for document in ColumnarSnapshot(snapshot_resp).documents:
+        backend_node_id = document.backend_node_id
+        for node, row in document.nodes_with_attribute(marker):
+            ids[int(row)] = backend_node_id[node]
+    table.backend_node_ids = ids
+    return table
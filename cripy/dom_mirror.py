@@ -0,0 +1,406 @@
+import logging
+from asyncio import CancelledError
+from typing import Any, Callable, Dict, Iterator, List, Optional, TYPE_CHECKING, Tuple, Union
+
+from .errors import ClientError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["DOMMirror", "MirrorNode"]
+
+logger = logging.getLogger(__name__)
+
+ELEMENT_NODE: int = 1
+TEXT_NODE: int = 3
+DOCUMENT_NODE: int = 9
+
+
+class MirrorNode:
+    """The mirrored copy of a DOM.Node, children are None until they are known"""
+
+    __slots__ = [
+        "attributes",
+        "backend_node_id",
+        "child_count",
+        "children",
+        "content_document",
+        "frame_id",
+        "local_name",
+        "node_id",
+        "node_name",
+        "node_type",
+        "node_value",
+        "parent",
+        "pseudo_elements",
+        "pseudo_type",
+        "shadow_roots",
+        "template_content",
+    ]
+
+    def __init__(self, node: Dict, parent: Optional["MirrorNode"]) -> None:
+        self.node_id: int = node["nodeId"]
+        self.backend_node_id: int = node.get("backendNodeId", 0)
+        self.node_type: int = node.get("nodeType", 0)
+        self.node_name: str = node.get("nodeName", "")
+        self.local_name: str = node.get("localName", "")
+        self.node_value: str = node.get("nodeValue", "")
+        self.parent: Optional[MirrorNode] = parent
+        self.child_count: int = node.get("childNodeCount", 0)
+        self.children: Optional[List[MirrorNode]] = None
+        self.frame_id: Optional[str] = node.get("frameId")
+        self.pseudo_type: Optional[str] = node.get("pseudoType")
+        self.shadow_roots: List[MirrorNode] = []
+        self.pseudo_elements: List[MirrorNode] = []
+        self.content_document: Optional[MirrorNode] = None
+        self.template_content: Optional[MirrorNode] = None
+        self.attributes: Dict[str, str] = {}
+        attributes = node.get("attributes")
+        if attributes:
+            it = iter(attributes)
+            self.attributes = dict(zip(it, it))
+
+    def get_attribute(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Returns the value of the attribute
+
+        :param name: The name of the attribute
+        :param default: The value returned if the node does not have the attribute
+        :return: The value of the attribute
+        """
+        return self.attributes.get(name, default)
+
+    def descendants(self, pierce: bool = False) -> Iterator["MirrorNode"]:
+        """Yields the known descendants of the node in document order
+
+        :param pierce: Should shadow roots, template contents and frame documents be traversed
+        :return: An iterator of the descendants
+        """
+        stack: List[MirrorNode] = list(reversed(self._child_nodes(pierce)))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node._child_nodes(pierce)))
+
+    def text_content(self) -> str:
+        """Returns the concatenated values of the known text node descendants of the node"""
+        if self.node_type == TEXT_NODE:
+            return self.node_value
+        return "".join(node.node_value for node in self.descendants() if node.node_type == TEXT_NODE)
+
+    def _child_nodes(self, pierce: bool) -> List["MirrorNode"]:
+        if not pierce:
+            return self.children or []
+        nodes: List[MirrorNode] = []
+        if self.template_content is not None:
+            nodes.append(self.template_content)
+        nodes.extend(self.shadow_roots)
+        if self.content_document is not None:
+            nodes.append(self.content_document)
+        nodes.extend(self.children or ())
+        return nodes
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(node_id={self.node_id}, node_name={self.node_name}, "
+            f"child_count={self.child_count})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class DOMMirror:
+    """Mirrors the DOM of a page locally, loading it once (DOM.getDocument) and then applying
+    the DOM domain's mutation events to it so that reading the DOM never requires a round-trip.
+
+    Nodes are indexed by both their nodeId and backendNodeId. Chrome only reports mutations of
+    the nodes it has sent to the client, children that have not been sent yet are None and can be
+    requested using request_child_nodes. When the document is updated (DOM.documentUpdated) the
+    mirror is reloaded, if reloading fails the error is logged and the mirror is left empty,
+    not loaded, until load is called again. Every change increments version.
+    """
+
+    __slots__ = ["_by_backend_id", "_client", "_depth", "_document", "_listening", "_nodes", "_pierce", "_version"]
+
+    def __init__(
+        self, client: Union["ConnectionType", "SessionType"], depth: int = -1, pierce: bool = True
+    ) -> None:
+        """Construct a new instance of DOMMirror
+
+        :param client: The connection or session of the page whose DOM is mirrored
+        :param depth: The depth of the subtree initially loaded, -1 for the entire subtree
+        :param pierce: Should iframes and shadow roots be traversed
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._depth: int = depth
+        self._pierce: bool = pierce
+        self._document: Optional[MirrorNode] = None
+        self._nodes: Dict[int, MirrorNode] = {}
+        self._by_backend_id: Dict[int, MirrorNode] = {}
+        self._version: int = 0
+        self._listening: bool = False
+
+    @property
+    def client(self) -> Union["ConnectionType", "SessionType"]:
+        """Returns the connection or session of the page whose DOM is mirrored"""
+        return self._client
+
+    @property
+    def document(self) -> Optional[MirrorNode]:
+        """Returns the mirrored document node"""
+        return self._document
+
+    @property
+    def loaded(self) -> bool:
+        """Returns T/F indicating if the document is mirrored"""
+        return self._document is not None
+
+    @property
+    def version(self) -> int:
+        """Returns the number of changes applied to the mirror"""
+        return self._version
+
+    def get(self, node_id: int) -> Optional[MirrorNode]:
+        """Returns the node with the supplied nodeId
+
+        :param node_id: The id of the node
+        :return: The node if it is mirrored
+        """
+        return self._nodes.get(node_id)
+
+    def get_by_backend_id(self, backend_node_id: int) -> Optional[MirrorNode]:
+        """Returns the node with the supplied backendNodeId
+
+        :param backend_node_id: The backend id of the node
+        :return: The node if it is mirrored
+        """
+        return self._by_backend_id.get(backend_node_id)
+
+    async def load(self) -> MirrorNode:
+        """Loads the document (DOM.getDocument) and starts applying the mutation events
+
+        :return: The document node
+        """
+        client = self._client
+        if not self._listening:
+            self._listening = True
+            for event, handler in self._handlers():
+                client.on(event, handler)
+            await client.send("DOM.enable")
+        result = await client.send("DOM.getDocument", {"depth": self._depth, "pierce": self._pierce})
+        self._reset()
+        self._document = self._build(result["root"], None)
+        self._version += 1
+        return self._document
+
+    async def request_child_nodes(self, node_id: int, depth: int = -1) -> None:
+        """Requests the children of the node that are not yet known (DOM.requestChildNodes).
+        They are added to the mirror once the corresponding DOM.setChildNodes event is received
+
+        :param node_id: The id of the node
+        :param depth: The depth of the subtree requested, -1 for the entire subtree
+        """
+        if node_id not in self._nodes:
+            raise ClientError(f"Node {node_id} is not mirrored")
+        await self._client.send("DOM.requestChildNodes", {"nodeId": node_id, "depth": depth, "pierce": self._pierce})
+
+    def close(self) -> None:
+        """Stops applying the mutation events and empties the mirror"""
+        if self._listening:
+            self._listening = False
+            for event, handler in self._handlers():
+                self._client.remove_listener(event, handler)
+        self._reset()
+
+    def _handlers(self) -> List[Tuple[str, Callable]]:
+        """Returns the DOM events applied to the mirror and their handlers"""
+        return [
+            ("DOM.setChildNodes", self._on_set_child_nodes),
+            ("DOM.childNodeInserted", self._on_child_node_inserted),
+            ("DOM.childNodeRemoved", self._on_child_node_removed),
+            ("DOM.attributeModified", self._on_attribute_modified),
+            ("DOM.attributeRemoved", self._on_attribute_removed),
+            ("DOM.characterDataModified", self._on_character_data_modified),
+            ("DOM.childNodeCountUpdated", self._on_child_node_count_updated),
+            ("DOM.shadowRootPushed", self._on_shadow_root_pushed),
+            ("DOM.shadowRootPopped", self._on_shadow_root_popped),
+            ("DOM.pseudoElementAdded", self._on_pseudo_element_added),
+            ("DOM.pseudoElementRemoved", self._on_pseudo_element_removed),
+            ("DOM.documentUpdated", self._on_document_updated),
+        ]
+
+    def _reset(self) -> None:
+        self._document = None
+        self._nodes.clear()
+        self._by_backend_id.clear()
+
+    def _build(self, root: Dict, parent: Optional[MirrorNode]) -> MirrorNode:
+        """Builds, and indexes, the mirrored subtree of the supplied DOM.Node without recursion
+
+        :param root: The DOM.Node
+        :param parent: The parent of the node
+        :return: The mirrored node
+        """
+        mirrored = MirrorNode(root, parent)
+        self._index(mirrored)
+        stack: List[Tuple[Dict, MirrorNode]] = [(root, mirrored)]
+        while stack:
+            node, mirror = stack.pop()
+            children = node.get("children")
+            if children is not None:
+                mirror.children = []
+                for child in children:
+                    mirror.children.append(self._build_one(child, mirror, stack))
+                mirror.child_count = len(children)
+            for root_node in node.get("shadowRoots", ()):
+                mirror.shadow_roots.append(self._build_one(root_node, mirror, stack))
+            for pseudo_node in node.get("pseudoElements", ()):
+                mirror.pseudo_elements.append(self._build_one(pseudo_node, mirror, stack))
+            if "contentDocument" in node:
+                mirror.content_document = self._build_one(node["contentDocument"], mirror, stack)
+            if "templateContent" in node:
+                mirror.template_content = self._build_one(node["templateContent"], mirror, stack)
+        return mirrored
+
+    def _build_one(self, node: Dict, parent: MirrorNode, stack: List[Tuple[Dict, MirrorNode]]) -> MirrorNode:
+        mirrored = MirrorNode(node, parent)
+        self._index(mirrored)
+        stack.append((node, mirrored))
+        return mirrored
+
+    def _index(self, node: MirrorNode) -> None:
+        self._nodes[node.node_id] = node
+        if node.backend_node_id:
+            self._by_backend_id[node.backend_node_id] = node
+
+    def _unindex(self, root: MirrorNode) -> None:
+        """Removes the node and its descendants from the indexes"""
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            stack.extend(node._child_nodes(True))
+            stack.extend(node.pseudo_elements)
+            self._nodes.pop(node.node_id, None)
+            if self._by_backend_id.get(node.backend_node_id) is node:
+                del self._by_backend_id[node.backend_node_id]
+
+    def _on_set_child_nodes(self, event: Dict) -> None:
+        parent = self._nodes.get(event["parentId"])
+        if parent is None:
+            return
+        for child in parent.children or ():
+            self._unindex(child)
+        parent.children = [self._build(child, parent) for child in event["nodes"]]
+        parent.child_count = len(parent.children)
+        self._version += 1
+
+    def _on_child_node_inserted(self, event: Dict) -> None:
+        parent = self._nodes.get(event["parentNodeId"])
+        if parent is None:
+            return
+        parent.child_count += 1
+        self._version += 1
+        if parent.children is None:
+            # the other children are not known, only the count can be maintained
+            return
+        node = self._build(event["node"], parent)
+        previous_id = event.get("previousNodeId", 0)
+        position = 0
+        if previous_id:
+            for idx, child in enumerate(parent.children):
+                if child.node_id == previous_id:
+                    position = idx + 1
+                    break
+        parent.children.insert(position, node)
+
+    def _on_child_node_removed(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        parent = self._nodes.get(event["parentNodeId"])
+        if parent is not None:
+            parent.child_count = max(0, parent.child_count - 1)
+            if parent.children is not None and node is not None and node in parent.children:
+                parent.children.remove(node)
+        if node is not None:
+            self._unindex(node)
+            node.parent = None
+        self._version += 1
+
+    def _on_attribute_modified(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        if node is not None:
+            node.attributes[event["name"]] = event["value"]
+            self._version += 1
+
+    def _on_attribute_removed(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        if node is not None:
+            node.attributes.pop(event["name"], None)
+            self._version += 1
+
+    def _on_character_data_modified(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        if node is not None:
+            node.node_value = event["characterData"]
+            self._version += 1
+
+    def _on_child_node_count_updated(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        if node is not None:
+            node.child_count = event["childNodeCount"]
+            self._version += 1
+
+    def _on_shadow_root_pushed(self, event: Dict) -> None:
+        host = self._nodes.get(event["hostId"])
+        if host is not None:
+            host.shadow_roots.append(self._build(event["root"], host))
+            self._version += 1
+
+    def _on_shadow_root_popped(self, event: Dict) -> None:
+        self._remove_from(event["hostId"], event["rootId"], "shadow_roots")
+
+    def _on_pseudo_element_added(self, event: Dict) -> None:
+        parent = self._nodes.get(event["parentId"])
+        if parent is not None:
+            parent.pseudo_elements.append(self._build(event["pseudoElement"], parent))
+            self._version += 1
+
+    def _on_pseudo_element_removed(self, event: Dict) -> None:
+        self._remove_from(event["parentId"], event["pseudoElementId"], "pseudo_elements")
+
+    def _remove_from(self, parent_id: int, node_id: int, collection: str) -> None:
+        """Removes the node from the shadow roots or pseudo elements of its parent"""
+        parent = self._nodes.get(parent_id)
+        node = self._nodes.get(node_id)
+        if parent is None or node is None:
+            return
+        nodes: List[MirrorNode] = getattr(parent, collection)
+        if node in nodes:
+            nodes.remove(node)
+        self._unindex(node)
+        node.parent = None
+        self._version += 1
+
+    async def _on_document_updated(self, event: Any = None) -> None:
+        self._reset()
+        self._version += 1
+        try:
+            await self.load()
+        except CancelledError:
+            raise
+        except Exception:
+            # nothing awaits the reload, the mirror stays empty until it is loaded again
+            self._reset()
+            logger.exception("reloading the DOM mirror failed")
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(nodes={len(self._nodes)}, version={self._version})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
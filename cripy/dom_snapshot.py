@@ -0,0 +1,405 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, TYPE_CHECKING, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .errors import ClientError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["ColumnarDocument", "ColumnarSnapshot", "capture_snapshot", "decode_snapshot"]
+
+#: Array type code of the integer columns, signed as -1 marks absent values
+INDEX_TYPECODE: str = "i"
+#: Array type code of the rectangle columns, x, y, width and height of each rectangle
+RECT_TYPECODE: str = "d"
+
+Rect = Tuple[float, float, float, float]
+
+
+def _ints(values: Iterable[int]) -> array:
+    return array(INDEX_TYPECODE, values)
+
+
+def _rects(rects: Iterable[Sequence[float]]) -> array:
+    flat = array(RECT_TYPECODE)
+    for rect in rects:
+        flat.extend(rect[:4] if len(rect) >= 4 else (0.0, 0.0, 0.0, 0.0))
+    return flat
+
+
+def _rare_strings(data: Optional[Dict]) -> Dict[int, int]:
+    if not data:
+        return {}
+    return dict(zip(data["index"], data["value"]))
+
+
+def _rare_booleans(data: Optional[Dict]) -> Set[int]:
+    if not data:
+        return set()
+    return set(data["index"])
+
+
+def _flatten(rows: List[List[int]]) -> Tuple[array, array]:
+    """Flattens rows of string indexes into an offsets column and a values column"""
+    offsets = array(INDEX_TYPECODE, [0])
+    values = array(INDEX_TYPECODE)
+    for row in rows:
+        values.extend(row)
+        offsets.append(len(values))
+    return offsets, values
+
+
+class ColumnarDocument:
+    """A document of a DOMSnapshot.captureSnapshot result kept in columns.
+
+    Node columns are indexed by node index, layout columns by layout index and text box columns
+    by text box index. Strings are indexes into the string table shared by the snapshot's documents.
+    """
+
+    __slots__ = [
+        "attribute_offsets",
+        "attribute_values",
+        "backend_node_id",
+        "clickable",
+        "content_document_index",
+        "document_url",
+        "frame_id",
+        "input_value",
+        "layout_bounds",
+        "layout_node_index",
+        "layout_text",
+        "node_layout_index",
+        "node_name",
+        "node_type",
+        "node_value",
+        "paint_order",
+        "parent_index",
+        "scroll_offset",
+        "snapshot",
+        "style_count",
+        "styles",
+        "text_box_bounds",
+        "text_box_layout_index",
+        "text_box_length",
+        "text_box_start",
+        "text_value",
+    ]
+
+    def __init__(self, snapshot: "ColumnarSnapshot", document: Dict[str, Any], style_count: int) -> None:
+        """Construct a new instance of ColumnarDocument
+
+        :param snapshot: The snapshot the document belongs to
+        :param document: The DOMSnapshot.DocumentSnapshot
+        :param style_count: The number of computed styles captured for each layout node
+        """
+        self.snapshot: ColumnarSnapshot = snapshot
+        self.document_url: int = document.get("documentURL", -1)
+        self.frame_id: int = document.get("frameId", -1)
+        self.scroll_offset: Tuple[float, float] = (
+            document.get("scrollOffsetX", 0.0),
+            document.get("scrollOffsetY", 0.0),
+        )
+        nodes = document["nodes"]
+        self.parent_index: array = _ints(nodes.get("parentIndex", ()))
+        self.node_type: array = _ints(nodes.get("nodeType", ()))
+        self.node_name: array = _ints(nodes.get("nodeName", ()))
+        self.node_value: array = _ints(nodes.get("nodeValue", ()))
+        self.backend_node_id: array = _ints(nodes.get("backendNodeId", ()))
+        self.attribute_offsets, self.attribute_values = _flatten(nodes.get("attributes", ()))
+        self.text_value: Dict[int, int] = _rare_strings(nodes.get("textValue"))
+        self.input_value: Dict[int, int] = _rare_strings(nodes.get("inputValue"))
+        self.clickable: Set[int] = _rare_booleans(nodes.get("isClickable"))
+        self.content_document_index: Dict[int, int] = _rare_strings(nodes.get("contentDocumentIndex"))
+
+        layout = document["layout"]
+        self.layout_node_index: array = _ints(layout.get("nodeIndex", ()))
+        self.layout_bounds: array = _rects(layout.get("bounds", ()))
+        self.layout_text: array = _ints(layout.get("text", ()))
+        self.paint_order: array = _ints(layout.get("paintOrders", ()))
+        self.style_count: int = style_count
+        self.styles: array = array(INDEX_TYPECODE)
+        for values in layout.get("styles", ()):
+            if len(values) != style_count:
+                raise ClientError(f"Expected {style_count} computed styles per layout node got {len(values)}")
+            self.styles.extend(values)
+        self.node_layout_index: array = array(INDEX_TYPECODE, [-1]) * len(self.parent_index)
+        for layout_index, node_index in enumerate(self.layout_node_index):
+            if self.node_layout_index[node_index] == -1:
+                self.node_layout_index[node_index] = layout_index
+
+        text_boxes = document["textBoxes"]
+        self.text_box_layout_index: array = _ints(text_boxes.get("layoutIndex", ()))
+        self.text_box_bounds: array = _rects(text_boxes.get("bounds", ()))
+        self.text_box_start: array = _ints(text_boxes.get("start", ()))
+        self.text_box_length: array = _ints(text_boxes.get("length", ()))
+
+    @property
+    def node_count(self) -> int:
+        """Returns the number of nodes of the document"""
+        return len(self.parent_index)
+
+    @property
+    def layout_count(self) -> int:
+        """Returns the number of layout nodes of the document"""
+        return len(self.layout_node_index)
+
+    @property
+    def url(self) -> str:
+        """Returns the URL of the document"""
+        return self.snapshot.string(self.document_url)
+
+    def name(self, node: int) -> str:
+        """Returns the node name of the node"""
+        return self.snapshot.string(self.node_name[node])
+
+    def value(self, node: int) -> str:
+        """Returns the node value of the node"""
+        return self.snapshot.string(self.node_value[node])
+
+    def attributes(self, node: int) -> Dict[str, str]:
+        """Returns the attributes of the node"""
+        string = self.snapshot.string
+        values = self.attribute_values[self.attribute_offsets[node] : self.attribute_offsets[node + 1]]
+        return {string(values[i]): string(values[i + 1]) for i in range(0, len(values) - 1, 2)}
+
+    def nodes_with_attribute(self, name: str) -> List[Tuple[int, str]]:
+        """Returns the nodes having the attribute along with its value
+
+        :param name: The name of the attribute
+        :return: List of (node index, attribute value) tuples in document order
+        """
+        name_index = self.snapshot.string_index(name)
+        if name_index is None:
+            return []
+        string = self.snapshot.string
+        offsets = self.attribute_offsets
+        values = self.attribute_values
+        result = []
+        for node in range(len(offsets) - 1):
+            for position in range(offsets[node], offsets[node + 1] - 1, 2):
+                if values[position] == name_index:
+                    result.append((node, string(values[position + 1])))
+                    break
+        return result
+
+    def bounds(self, node: int) -> Optional[Rect]:
+        """Returns the bounding box of the layout node of the node
+
+        :param node: The index of the node
+        :return: The x, y, width and height of the node if it has a layout node
+        """
+        layout_index = self.node_layout_index[node]
+        if layout_index == -1:
+            return None
+        offset = layout_index * 4
+        return tuple(self.layout_bounds[offset : offset + 4])
+
+    def style(self, node: int, name: str) -> Optional[str]:
+        """Returns the value of the computed style of the node
+
+        :param node: The index of the node
+        :param name: The name of the computed style, one of the computed styles captured
+        :return: The value if the node has a layout node
+        """
+        layout_index = self.node_layout_index[node]
+        if layout_index == -1:
+            return None
+        return self.snapshot.string(self.styles[layout_index * self.style_count + self.snapshot.style_index(name)])
+
+    def nodes_in_rect(self, x: float, y: float, width: float, height: float, visible: bool = True) -> List[int]:
+        """Returns the indexes of the nodes whose layout bounds intersect the rectangle
+
+        :param x: The x coordinate of the rectangle
+        :param y: The y coordinate of the rectangle
+        :param width: The width of the rectangle
+        :param height: The height of the rectangle
+        :param visible: Should nodes with an empty bounding box, or a visibility other than visible
+        when visibility was captured, be excluded
+        :return: The indexes of the nodes in layout order
+        """
+        right, bottom = x + width, y + height
+        hidden = self._hidden_layouts() if visible else None
+        if np is not None:
+            bounds = np.frombuffer(self.layout_bounds, dtype=np.float64).reshape(-1, 4)
+            lx, ly, lw, lh = bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]
+            mask = (lx < right) & (lx + lw > x) & (ly < bottom) & (ly + lh > y)
+            if visible:
+                mask &= (lw > 0) & (lh > 0)
+                if hidden is not None:
+                    mask &= ~hidden
+            nodes = np.frombuffer(self.layout_node_index, dtype=np.int32)[mask]
+            return _unique_in_order(nodes.tolist())
+        bounds = self.layout_bounds
+        result = []
+        for layout_index, node in enumerate(self.layout_node_index):
+            offset = layout_index * 4
+            lx, ly, lw, lh = bounds[offset], bounds[offset + 1], bounds[offset + 2], bounds[offset + 3]
+            if lx >= right or lx + lw <= x or ly >= bottom or ly + lh <= y:
+                continue
+            if visible and (lw <= 0 or lh <= 0 or (hidden is not None and hidden[layout_index])):
+                continue
+            result.append(node)
+        return _unique_in_order(result)
+
+    def nodes_with_style(self, name: str, value: str) -> List[int]:
+        """Returns the indexes of the nodes whose computed style has the supplied value
+
+        :param name: The name of the computed style, one of the computed styles captured
+        :param value: The value of the computed style
+        :return: The indexes of the nodes in layout order
+        """
+        string_index = self.snapshot.string_index(value)
+        if string_index is None or not self.style_count:
+            return []
+        column = self.snapshot.style_index(name)
+        if np is not None:
+            styles = np.frombuffer(self.styles, dtype=np.int32).reshape(-1, self.style_count)
+            nodes = np.frombuffer(self.layout_node_index, dtype=np.int32)[styles[:, column] == string_index]
+            return _unique_in_order(nodes.tolist())
+        styles = self.styles
+        stride = self.style_count
+        return _unique_in_order(
+            [
+                node
+                for layout_index, node in enumerate(self.layout_node_index)
+                if styles[layout_index * stride + column] == string_index
+            ]
+        )
+
+    def text_by_paint_order(self) -> List[Tuple[int, str]]:
+        """Returns the text of the text boxes, and the index of their node, in the order they are painted.
+        Requires the snapshot to have been captured with paint orders
+
+        :return: List of (node index, text) tuples
+        """
+        if not self.paint_order:
+            raise ClientError("The snapshot was not captured with paint orders")
+        string = self.snapshot.string
+        paint_order = self.paint_order
+        layout_index = self.text_box_layout_index
+        order = sorted(range(len(layout_index)), key=lambda box: (paint_order[layout_index[box]], box))
+        result = []
+        for box in order:
+            layout = layout_index[box]
+            start = self.text_box_start[box]
+            text = string(self.layout_text[layout])[start : start + self.text_box_length[box]]
+            result.append((self.layout_node_index[layout], text))
+        return result
+
+    def _hidden_layouts(self) -> Optional[Any]:
+        """Returns a per layout node flag indicating if its visibility, when captured, is not visible"""
+        if "visibility" not in self.snapshot.computed_styles or not self.style_count:
+            return None
+        visible = self.snapshot.string_index("visible")
+        column = self.snapshot.style_index("visibility")
+        if np is not None:
+            styles = np.frombuffer(self.styles, dtype=np.int32).reshape(-1, self.style_count)
+            return styles[:, column] != visible
+        stride = self.style_count
+        return [self.styles[i * stride + column] != visible for i in range(self.layout_count)]
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(url={self.url}, nodes={self.node_count}, layouts={self.layout_count})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ColumnarSnapshot:
+    """The columnar form of a DOMSnapshot.captureSnapshot result.
+
+    The string table is shared by all documents, the remaining data is kept in typed arrays.
+    When numpy is installed the queries are vectorized over zero-copy numpy views of the arrays.
+    """
+
+    __slots__ = ["_string_indexes", "_style_indexes", "computed_styles", "documents", "strings"]
+
+    def __init__(self, result: Dict[str, Any], computed_styles: Sequence[str] = ()) -> None:
+        """Construct a new instance of ColumnarSnapshot
+
+        :param result: The result of DOMSnapshot.captureSnapshot
+        :param computed_styles: The computed styles captured, in the order they were requested
+        """
+        self.strings: List[str] = result["strings"]
+        self.computed_styles: List[str] = list(computed_styles)
+        self._style_indexes: Dict[str, int] = {name: idx for idx, name in enumerate(self.computed_styles)}
+        self._string_indexes: Optional[Dict[str, int]] = None
+        self.documents: List[ColumnarDocument] = [
+            ColumnarDocument(self, document, len(self.computed_styles)) for document in result["documents"]
+        ]
+
+    def string(self, index: int) -> str:
+        """Returns the string of the string table at the supplied index, the empty string for -1"""
+        return self.strings[index] if index >= 0 else ""
+
+    def string_index(self, value: str) -> Optional[int]:
+        """Returns the index of the string in the string table
+
+        :param value: The string
+        :return: The index of the string if it is in the string table
+        """
+        if self._string_indexes is None:
+            self._string_indexes = {string: idx for idx, string in enumerate(self.strings)}
+        return self._string_indexes.get(value)
+
+    def style_index(self, name: str) -> int:
+        """Returns the position of the computed style among the computed styles captured
+
+        :param name: The name of the computed style
+        :return: The position of the computed style
+        """
+        idx = self._style_indexes.get(name)
+        if idx is None:
+            raise ClientError(f"The computed style {name} was not captured")
+        return idx
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(documents={len(self.documents)}, strings={len(self.strings)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def decode_snapshot(result: Dict[str, Any], computed_styles: Sequence[str] = ()) -> ColumnarSnapshot:
+    """Decodes the result of DOMSnapshot.captureSnapshot into its columnar form
+
+    :param result: The result of DOMSnapshot.captureSnapshot
+    :param computed_styles: The computed styles captured, in the order they were requested
+    :return: The columnar snapshot
+    """
+    return ColumnarSnapshot(result, computed_styles)
+
+
+async def capture_snapshot(
+    client: Union["ConnectionType", "SessionType"],
+    computed_styles: Sequence[str] = ("display", "visibility"),
+    include_paint_order: bool = True,
+    include_dom_rects: bool = False,
+) -> ColumnarSnapshot:
+    """Captures a snapshot of the page (DOMSnapshot.captureSnapshot) decoding it into its columnar form
+
+    :param client: The connection or session of the page
+    :param computed_styles: The computed styles captured for each layout node
+    :param include_paint_order: Should the paint order of the layout nodes be captured
+    :param include_dom_rects: Should the offset, scroll and client rects be captured
+    :return: The columnar snapshot
+    """
+    result = await client.send(
+        "DOMSnapshot.captureSnapshot",
+        {
+            "computedStyles": list(computed_styles),
+            "includePaintOrder": include_paint_order,
+            "includeDOMRects": include_dom_rects,
+        },
+    )
+    return ColumnarSnapshot(result, computed_styles)
+
+
+def _unique_in_order(nodes: List[int]) -> List[int]:
+    """Removes the duplicates, a node may have several layout nodes, keeping the first occurrence"""
+    return list(dict.fromkeys(nodes))
@@ -0,0 +1,479 @@
+import re
+from binascii import b2a_base64
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Set, TYPE_CHECKING, Tuple, Union
+
+from .cdp_batch import consume_outcome
+from .errors import ClientError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = [
+    "BLOCK",
+    "CONTINUE",
+    "FULFILL",
+    "MODIFY_HEADERS",
+    "FetchInterceptor",
+    "InterceptRule",
+    "glob_to_regex",
+]
+
+BLOCK: str = "block"
+CONTINUE: str = "continue"
+FULFILL: str = "fulfill"
+MODIFY_HEADERS: str = "modify_headers"
+
+_ACTIONS = frozenset([BLOCK, CONTINUE, FULFILL, MODIFY_HEADERS])
+_WILDCARDS: str = "*?"
+
+
+def glob_to_regex(glob: str) -> str:
+    """Translates a Fetch.RequestPattern URL pattern into a regular expression matching the entire URL.
+
+    Wildcards ('*' -> zero or more, '?' -> exactly one) are allowed, escape character is backslash.
+
+    :param glob: The URL pattern
+    :return: The equivalent regular expression
+    """
+    parts: List[str] = []
+    escaped = False
+    for char in glob:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "*":
+            parts.append(".*")
+        elif char == "?":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    if escaped:
+        parts.append(re.escape("\\"))
+    return "".join(parts)
+
+
+def _literal_prefix(glob: str) -> str:
+    """Returns the literal characters of the URL pattern preceding its first wildcard
+
+    :param glob: The URL pattern
+    :return: The literal prefix of the pattern
+    """
+    prefix: List[str] = []
+    escaped = False
+    for char in glob:
+        if escaped:
+            prefix.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in _WILDCARDS:
+            break
+        else:
+            prefix.append(char)
+    return "".join(prefix)
+
+
+class InterceptRule:
+    """Describes the requests a rule applies to and the action taken for them.
+
+    The URL is either a Fetch.RequestPattern style glob matching the entire URL
+    or, when regex is True, a regular expression searched for in the URL.
+    """
+
+    __slots__ = [
+        "_params",
+        "action",
+        "headers",
+        "hits",
+        "methods",
+        "regex",
+        "resource_types",
+        "url",
+        "url_regex",
+    ]
+
+    def __init__(
+        self,
+        url: str = "*",
+        action: str = CONTINUE,
+        regex: bool = False,
+        resource_types: Optional[Iterable[str]] = None,
+        methods: Optional[Iterable[str]] = None,
+        status: int = 200,
+        headers: Optional[Dict[str, Optional[str]]] = None,
+        body: Union[bytes, str, None] = None,
+        error_reason: str = "BlockedByClient",
+    ) -> None:
+        """Construct a new instance of InterceptRule
+
+        :param url: The URL glob or regular expression
+        :param action: One of block, continue, fulfill or modify_headers
+        :param regex: Is the URL a regular expression
+        :param resource_types: The resource types, e.g. Image, the rule applies to. Defaults to all
+        :param methods: The HTTP methods the rule applies to. Defaults to all
+        :param status: The response code used by the fulfill action
+        :param headers: The response headers used by the fulfill action or the request headers
+        set by the modify_headers action, a value of None removes the header
+        :param body: The response body used by the fulfill action
+        :param error_reason: The network error reason used by the block action
+        """
+        if action not in _ACTIONS:
+            raise ClientError(f"Unknown intercept rule action: {action}")
+        self.url: str = url
+        self.action: str = action
+        self.regex: bool = regex
+        self.resource_types: Optional[Set[str]] = set(resource_types) if resource_types is not None else None
+        self.methods: Optional[Set[str]] = {m.upper() for m in methods} if methods is not None else None
+        self.headers: Dict[str, Optional[str]] = dict(headers or {})
+        self.url_regex: Pattern = re.compile(url if regex else glob_to_regex(url) + r"\Z")
+        #: The number of requests the rule was applied to
+        self.hits: int = 0
+        self._params: Dict[str, Any] = {}
+        if action == BLOCK:
+            self._params["errorReason"] = error_reason
+        elif action == FULFILL:
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            self._params["responseCode"] = status
+            self._params["responseHeaders"] = [
+                {"name": name, "value": value} for name, value in self.headers.items() if value is not None
+            ]
+            self._params["body"] = b2a_base64(body or b"", newline=False).decode("ascii")
+
+    def applies_to(self, url: str, resource_type: Optional[str], method: Optional[str]) -> bool:
+        """Returns T/F indicating if the rule applies to the request
+
+        :param url: The URL of the request
+        :param resource_type: The resource type of the request
+        :param method: The HTTP method of the request
+        :return: T/F indicating if the rule applies
+        """
+        if self.resource_types is not None and resource_type not in self.resource_types:
+            return False
+        if self.methods is not None and method not in self.methods:
+            return False
+        if self.regex:
+            return self.url_regex.search(url) is not None
+        return self.url_regex.match(url) is not None
+
+    def command(self, event: Dict) -> Tuple[str, Dict[str, Any]]:
+        """Returns the Fetch command, and its params, that applies the rule to the paused request
+
+        :param event: The Fetch.requestPaused event
+        :return: The method name and params of the command
+        """
+        params = dict(self._params, requestId=event["requestId"])
+        if self.action == BLOCK:
+            return "Fetch.failRequest", params
+        if self.action == FULFILL:
+            return "Fetch.fulfillRequest", params
+        if self.action == MODIFY_HEADERS:
+            replaced = {name.lower() for name in self.headers}
+            headers = {
+                name: value
+                for name, value in event["request"].get("headers", {}).items()
+                if name.lower() not in replaced
+            }
+            headers.update((name, value) for name, value in self.headers.items() if value is not None)
+            params["headers"] = [{"name": name, "value": value} for name, value in headers.items()]
+        return "Fetch.continueRequest", params
+
+    def request_patterns(self) -> List[Dict[str, str]]:
+        """Returns the Fetch.RequestPatterns matching, at least, the requests the rule applies to
+
+        :return: The request patterns
+        """
+        url_pattern = "*" if self.regex else self.url
+        if self.resource_types is None:
+            return [{"urlPattern": url_pattern}]
+        return [
+            {"urlPattern": url_pattern, "resourceType": resource_type} for resource_type in sorted(self.resource_types)
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(url={self.url}, action={self.action}, regex={self.regex}, hits={self.hits})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class _TrieNode:
+    __slots__ = ["children", "rules"]
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.rules: List[int] = []
+
+
+class _RuleIndex:
+    """Index of the rules of an interceptor used to find the first rule applying to a request
+    without testing every rule.
+
+    Globs with a literal prefix are placed in a prefix trie, walking the trie with the URL
+    yields the only such rules that can apply. The remaining rules are combined into a single
+    regular expression whose alternatives are tried in rule order, except the regular expressions
+    defining groups, which are renumbered once combined breaking their backreferences, that are
+    tried one by one.
+    """
+
+    __slots__ = ["_combined", "_combined_rules", "_rest", "_rules", "_trie"]
+
+    def __init__(self, rules: List[InterceptRule]) -> None:
+        self._rules: List[InterceptRule] = rules
+        self._trie: _TrieNode = _TrieNode()
+        self._rest: List[int] = []
+        for idx, rule in enumerate(rules):
+            prefix = "" if rule.regex else _literal_prefix(rule.url)
+            if not prefix:
+                self._rest.append(idx)
+                continue
+            node = self._trie
+            for char in prefix:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _TrieNode()
+                node = child
+            node.rules.append(idx)
+        self._combined: Optional[Pattern] = None
+        self._combined_rules: Set[int] = set()
+        alternatives = []
+        for idx in self._rest:
+            rule = rules[idx]
+            if rule.regex and rule.url_regex.groups:
+                continue
+            pattern = f".*?(?:{rule.url})" if rule.regex else f"(?:{glob_to_regex(rule.url)})\\Z"
+            alternatives.append(f"(?P<r{idx}>{pattern})")
+            self._combined_rules.add(idx)
+        if alternatives:
+            try:
+                self._combined = re.compile("|".join(alternatives))
+            except re.error:
+                # e.g. a regular expression sets global flags, which must start the pattern
+                self._combined_rules.clear()
+
+    def first(self, url: str, resource_type: Optional[str], method: Optional[str]) -> Optional[int]:
+        """Returns the index of the first rule applying to the request
+
+        :param url: The URL of the request
+        :param resource_type: The resource type of the request
+        :param method: The HTTP method of the request
+        :return: The index of the rule if any applies
+        """
+        rules = self._rules
+        best: Optional[int] = None
+        node = self._trie
+        for char in url:
+            node = node.children.get(char)
+            if node is None:
+                break
+            for idx in node.rules:
+                if (best is None or idx < best) and rules[idx].applies_to(url, resource_type, method):
+                    best = idx
+        if not self._rest or (best is not None and best < self._rest[0]):
+            return best
+        # the combined rules before the first whose URL matches do not apply
+        skip_below = len(rules)
+        if self._combined is not None:
+            match = self._combined.match(url)
+            if match is not None:
+                skip_below = int(match.lastgroup[1:])
+        combined_rules = self._combined_rules
+        for idx in self._rest:
+            if best is not None and idx > best:
+                break
+            if idx < skip_below and idx in combined_rules:
+                continue
+            if rules[idx].applies_to(url, resource_type, method):
+                return idx
+        return best
+
+
+class FetchInterceptor:
+    """Applies declarative rules to the requests paused by the Fetch domain.
+
+    The first rule, in the order added, that applies to a paused request determines the action
+    taken, requests no rule applies to are continued unmodified. When enabled the request patterns
+    of the rules are passed to Fetch.enable so that, as far as possible, only the requests
+    some rule may apply to are paused.
+    """
+
+    __slots__ = ["_client", "_enabled", "_index", "_rules", "_unmatched"]
+
+    def __init__(
+        self, client: Union["ConnectionType", "SessionType"], rules: Optional[Iterable[InterceptRule]] = None
+    ) -> None:
+        """Construct a new instance of FetchInterceptor
+
+        :param client: The connection or session whose requests are intercepted
+        :param rules: Optional initial rules
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._rules: List[InterceptRule] = list(rules or ())
+        self._index: Optional[_RuleIndex] = None
+        self._enabled: bool = False
+        self._unmatched: int = 0
+
+    @property
+    def rules(self) -> List[InterceptRule]:
+        """Returns a copy of the rules in the order they are applied"""
+        return list(self._rules)
+
+    @property
+    def enabled(self) -> bool:
+        """Returns T/F indicating if requests are being intercepted"""
+        return self._enabled
+
+    @property
+    def unmatched(self) -> int:
+        """Returns the number of paused requests no rule applied to"""
+        return self._unmatched
+
+    def add_rule(self, rule: InterceptRule) -> InterceptRule:
+        """Adds the rule after the existing rules.
+        If interception is enabled call update for the request patterns to reflect the rule
+
+        :param rule: The rule to be added
+        :return: The added rule
+        """
+        self._rules.append(rule)
+        self._index = None
+        return rule
+
+    def remove_rule(self, rule: InterceptRule) -> None:
+        """Removes the rule.
+        If interception is enabled call update for the request patterns to reflect the removal
+
+        :param rule: The rule to be removed
+        """
+        self._rules.remove(rule)
+        self._index = None
+
+    def clear(self) -> None:
+        """Removes all rules"""
+        self._rules.clear()
+        self._index = None
+
+    def block(self, url: str, **kwargs: Any) -> InterceptRule:
+        """Adds a rule failing the matching requests, see InterceptRule for the supported keyword arguments
+
+        :param url: The URL glob or regular expression
+        :return: The added rule
+        """
+        return self.add_rule(InterceptRule(url, BLOCK, **kwargs))
+
+    def fulfill(self, url: str, body: Union[bytes, str], status: int = 200, **kwargs: Any) -> InterceptRule:
+        """Adds a rule fulfilling the matching requests with the supplied response,
+        see InterceptRule for the supported keyword arguments
+
+        :param url: The URL glob or regular expression
+        :param body: The response body
+        :param status: The response code
+        :return: The added rule
+        """
+        return self.add_rule(InterceptRule(url, FULFILL, body=body, status=status, **kwargs))
+
+    def modify_headers(self, url: str, headers: Dict[str, Optional[str]], **kwargs: Any) -> InterceptRule:
+        """Adds a rule continuing the matching requests with modified request headers,
+        see InterceptRule for the supported keyword arguments
+
+        :param url: The URL glob or regular expression
+        :param headers: The headers to set, a value of None removes the header
+        :return: The added rule
+        """
+        return self.add_rule(InterceptRule(url, MODIFY_HEADERS, headers=headers, **kwargs))
+
+    def allow(self, url: str, **kwargs: Any) -> InterceptRule:
+        """Adds a rule continuing the matching requests unmodified, taking precedence over the rules
+        added after it. See InterceptRule for the supported keyword arguments
+
+        :param url: The URL glob or regular expression
+        :return: The added rule
+        """
+        return self.add_rule(InterceptRule(url, CONTINUE, **kwargs))
+
+    def match(
+        self, url: str, resource_type: Optional[str] = None, method: Optional[str] = None
+    ) -> Optional[InterceptRule]:
+        """Returns the first rule applying to the request
+
+        :param url: The URL of the request
+        :param resource_type: The resource type of the request
+        :param method: The HTTP method of the request
+        :return: The rule if any applies
+        """
+        if self._index is None:
+            self._index = _RuleIndex(self._rules)
+        idx = self._index.first(url, resource_type, method)
+        return self._rules[idx] if idx is not None else None
+
+    def request_patterns(self) -> List[Dict[str, str]]:
+        """Returns the request patterns passed to Fetch.enable, the union of the request patterns of the rules.
+
+        Rules using regular expressions can not be expressed as URL patterns and
+        require every request, of their resource types, to be paused.
+
+        :return: The request patterns
+        """
+        patterns: List[Dict[str, str]] = []
+        seen: Set[Tuple[str, Optional[str]]] = set()
+        for rule in self._rules:
+            for pattern in rule.request_patterns():
+                key = (pattern["urlPattern"], pattern.get("resourceType"))
+                if key not in seen:
+                    seen.add(key)
+                    patterns.append(pattern)
+        if any(key == ("*", None) for key in seen):
+            return [{"urlPattern": "*"}]
+        return patterns
+
+    async def enable(self) -> None:
+        """Starts intercepting the requests matching the request patterns of the rules"""
+        if not self._enabled:
+            self._client.on("Fetch.requestPaused", self._on_request_paused)
+            self._enabled = True
+        await self.update()
+
+    async def update(self) -> None:
+        """Updates the request patterns of Fetch.enable to reflect the current rules"""
+        if not self._enabled:
+            return
+        patterns = self.request_patterns()
+        if not patterns:
+            # an empty patterns list would pause every request
+            await self._client.send("Fetch.disable")
+            return
+        await self._client.send("Fetch.enable", {"patterns": patterns})
+
+    async def disable(self) -> None:
+        """Stops intercepting requests"""
+        if not self._enabled:
+            return
+        self._enabled = False
+        self._client.remove_listener("Fetch.requestPaused", self._on_request_paused)
+        await self._client.send("Fetch.disable")
+
+    def _on_request_paused(self, event: Dict) -> None:
+        """Applies the first rule applying to the paused request or continues it
+
+        :param event: The Fetch.requestPaused event
+        """
+        if "responseStatusCode" in event or "responseErrorReason" in event:
+            # paused at the response stage by patterns not owned by the interceptor
+            return
+        request = event["request"]
+        rule = self.match(request["url"], event.get("resourceType"), request.get("method"))
+        if rule is None:
+            self._unmatched += 1
+            method, params = "Fetch.continueRequest", {"requestId": event["requestId"]}
+        else:
+            rule.hits += 1
+            method, params = rule.command(event)
+        self._client.send(method, params).add_done_callback(consume_outcome)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(rules={len(self._rules)}, enabled={self._enabled})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
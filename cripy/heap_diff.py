@@ -0,0 +1,228 @@
+from array import array
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .heap_snapshot import NO_DOMINATOR, TABLE_TYPECODE, HeapSnapshot
+
+__all__ = ["ClassDelta", "HeapSnapshotDiff", "RetainedGroup"]
+
+
+class ClassDelta:
+    """The nodes of a class that were added and removed between two heap snapshots"""
+
+    __slots__ = ["added_count", "added_size", "name", "removed_count", "removed_size"]
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.added_count: int = 0
+        self.added_size: int = 0
+        self.removed_count: int = 0
+        self.removed_size: int = 0
+
+    @property
+    def count_delta(self) -> int:
+        """Returns the change in the number of nodes of the class"""
+        return self.added_count - self.removed_count
+
+    @property
+    def size_delta(self) -> int:
+        """Returns the change in the total self size of the nodes of the class"""
+        return self.added_size - self.removed_size
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(name={self.name}, count_delta={self.count_delta}, "
+            f"size_delta={self.size_delta})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class RetainedGroup:
+    """New nodes of the same class retained through the same retaining path"""
+
+    __slots__ = ["class_name", "count", "nodes", "path", "retained_size"]
+
+    def __init__(self, class_name: str, path: Tuple[str, ...]) -> None:
+        self.class_name: str = class_name
+        self.path: Tuple[str, ...] = path
+        self.count: int = 0
+        self.retained_size: int = 0
+        self.nodes: array = array(TABLE_TYPECODE)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(class_name={self.class_name}, path={' <- '.join(self.path)}, "
+            f"count={self.count}, retained_size={self.retained_size})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class HeapSnapshotDiff:
+    """Compares two heap snapshots of the same page by node id.
+
+    Nodes whose ids only appear in the after snapshot were allocated between the snapshots,
+    those of them that are reachable from the root were also retained. Nodes whose ids only
+    appear in the before snapshot were freed.
+    """
+
+    __slots__ = ["added", "after", "before", "removed"]
+
+    def __init__(self, before: HeapSnapshot, after: HeapSnapshot) -> None:
+        """Construct a new instance of HeapSnapshotDiff
+
+        :param before: The snapshot taken first
+        :param after: The snapshot taken last
+        """
+        self.before: HeapSnapshot = before
+        self.after: HeapSnapshot = after
+        before_ids = before.column("id")
+        after_ids = after.column("id")
+        if np is not None:
+            before_np = np.frombuffer(before_ids, dtype=np.uint32)
+            after_np = np.frombuffer(after_ids, dtype=np.uint32)
+            added = array(TABLE_TYPECODE, np.flatnonzero(~np.isin(after_np, before_np)).astype(np.uint32).tobytes())
+            removed = array(TABLE_TYPECODE, np.flatnonzero(~np.isin(before_np, after_np)).astype(np.uint32).tobytes())
+        else:
+            before_set = set(before_ids)
+            after_set = set(after_ids)
+            added = array(TABLE_TYPECODE, [n for n, node_id in enumerate(after_ids) if node_id not in before_set])
+            removed = array(TABLE_TYPECODE, [n for n, node_id in enumerate(before_ids) if node_id not in after_set])
+        #: The indexes, in the after snapshot, of the nodes allocated between the snapshots
+        self.added: array = added
+        #: The indexes, in the before snapshot, of the nodes freed between the snapshots
+        self.removed: array = removed
+
+    def by_class(self) -> Dict[str, ClassDelta]:
+        """Returns the added and removed nodes grouped by class name
+
+        :return: Mapping of class names to their deltas
+        """
+        deltas: Dict[str, ClassDelta] = {}
+        for snapshot, nodes, added in ((self.after, self.added, True), (self.before, self.removed, False)):
+            types = snapshot.column("type")
+            names = snapshot.column("name")
+            sizes = snapshot.column("self_size")
+            class_names: Dict[Tuple[int, int], str] = {}
+            for node in nodes:
+                key = (types[node], names[node])
+                name = class_names.get(key)
+                if name is None:
+                    name = class_names[key] = snapshot._class_name(*key)
+                delta = deltas.get(name)
+                if delta is None:
+                    delta = deltas[name] = ClassDelta(name)
+                if added:
+                    delta.added_count += 1
+                    delta.added_size += sizes[node]
+                else:
+                    delta.removed_count += 1
+                    delta.removed_size += sizes[node]
+        return deltas
+
+    def retained_growth(self, path_depth: int = 4, min_count: int = 1) -> List[RetainedGroup]:
+        """Returns the new nodes that are retained in the after snapshot grouped by class name
+        and retaining path, largest retained size first.
+
+        Only the new nodes that are not dominated by another new node, immediately or through
+        nodes that already existed, are grouped, the nodes they dominate are accounted for by
+        their retained size.
+
+        :param path_depth: The number of retainers of the retaining path used for grouping
+        :param min_count: The minimum number of nodes of a group for it to be reported
+        :return: The groups of retained new nodes
+        """
+        after = self.after
+        dominators = after.dominators()
+        retained = after.retained_sizes()
+        types = after.column("type")
+        names = after.column("name")
+        class_names: Dict[Tuple[int, int], str] = {}
+        accessors: Dict[int, str] = {}
+
+        def class_name_of(node: int) -> str:
+            key = (types[node], names[node])
+            name = class_names.get(key)
+            if name is None:
+                name = class_names[key] = after._class_name(*key)
+            return name
+
+        def segment(retainer: int, edge: int) -> str:
+            accessor = accessors.get(edge)
+            if accessor is None:
+                accessor = accessors[edge] = _edge_accessor(after.edge_name(edge))
+            return class_name_of(retainer) + accessor
+
+        # per node: _ADDED, _COVERED (a new node is among its dominators) or _CLEAR
+        state = bytearray(after.node_count)
+        for node in self.added:
+            state[node] = _ADDED
+        groups: Dict[Tuple[str, Tuple[str, ...]], RetainedGroup] = {}
+        for node in self.added:
+            if dominators[node] == NO_DOMINATOR or _dominated_by_added(node, dominators, state):
+                continue
+            class_name = class_name_of(node)
+            path = tuple(segment(retainer, edge) for retainer, edge in after.retaining_path(node, path_depth))
+            key = (class_name, path)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = RetainedGroup(class_name, path)
+            group.count += 1
+            group.retained_size += int(retained[node])
+            group.nodes.append(node)
+        return sorted(
+            (group for group in groups.values() if group.count >= min_count),
+            key=lambda group: group.retained_size,
+            reverse=True,
+        )
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(added={len(self.added)}, removed={len(self.removed)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+_CLEAR: int = 1
+_COVERED: int = 2
+_ADDED: int = 3
+
+
+def _dominated_by_added(node: int, dominators: array, state: bytearray) -> bool:
+    """Returns T/F indicating if a new node is among the dominators of the node, walking up the
+    dominator tree until a node of known state is reached and recording the state of the nodes walked
+
+    :param node: The index of the node
+    :param dominators: The immediate dominator of every node
+    :param state: The state of every node, 0 if unknown
+    :return: T/F indicating if the node is dominated by a new node
+    """
+    walked: List[int] = []
+    current = dominators[node]
+    while True:
+        known = state[current]
+        if known:
+            covered = known != _CLEAR
+            break
+        dominator = dominators[current]
+        if dominator == current or dominator == NO_DOMINATOR:
+            covered = False
+            break
+        walked.append(current)
+        current = dominator
+    mark = _COVERED if covered else _CLEAR
+    for walked_node in walked:
+        state[walked_node] = mark
+    return covered
+
+
+def _edge_accessor(edge_name: str) -> str:
+    """Returns the edge name as a property accessor"""
+    return edge_name if edge_name.startswith("[") else f".{edge_name}"
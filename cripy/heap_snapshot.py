@@ -0,0 +1,827 @@
+import codecs
+import gzip
+import re
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from heapq import nlargest
+from json import JSONDecoder
+from typing import IO, Any, Dict, Iterator, List, Optional, TYPE_CHECKING, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .errors import ClientError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = [
+    "ClassStats",
+    "HeapSnapshot",
+    "capture_heap_snapshot",
+    "load_heap_snapshot",
+]
+
+_GZIP_MAGIC: bytes = b"\x1f\x8b"
+_WHITESPACE: str = " \t\r\n"
+_BRACKETS = re.compile(r"[\[\]]")
+_STRING_TYPES = frozenset(["string", "concatenated string", "sliced string"])
+_NAMED_TYPES = frozenset(["object", "native"])
+#: Arrays of numbers, possibly nested (trace_tree), of the snapshot that are not needed by the model
+#: and are skipped while loading
+_SKIPPED_ARRAYS = frozenset(["trace_function_infos", "trace_tree", "samples", "locations"])
+#: Array type code of the node and edge tables, unsigned 32 bit integers
+TABLE_TYPECODE: str = "I"
+NO_DOMINATOR: int = 0xFFFFFFFF
+
+
+async def capture_heap_snapshot(
+    client: Union["ConnectionType", "SessionType"],
+    path: str,
+    collect_garbage: bool = False,
+    compress: bool = False,
+    report_progress: bool = False,
+) -> str:
+    """Takes a heap snapshot streaming the HeapProfiler.addHeapSnapshotChunk chunks
+    straight to the file at the supplied path. The chunks are written, and compressed,
+    in a writer thread so that large heap snapshots do not block the event loop
+
+    :param client: The connection or session to take the heap snapshot of
+    :param path: The path to the file the heap snapshot is written to
+    :param collect_garbage: Should garbage be collected (HeapProfiler.collectGarbage) before
+    the heap snapshot is taken
+    :param compress: Should the heap snapshot be gzip compressed
+    :param report_progress: Should HeapProfiler.reportHeapSnapshotProgress events be emitted
+    :return: The path to the file the heap snapshot was written to
+    """
+    if collect_garbage:
+        await client.send("HeapProfiler.collectGarbage")
+    loop = client.loop
+    # the chunks are encoded, compressed and written in order in a writer thread, off the event loop
+    writer = ThreadPoolExecutor(1)
+    try:
+        out: IO[bytes] = await loop.run_in_executor(writer, _open_snapshot_file, path, compress)
+    except Exception:
+        writer.shutdown(wait=False)
+        raise
+    errors: List[Exception] = []
+
+    def on_chunk(event: Dict) -> None:
+        loop.run_in_executor(writer, _write_chunk, out, event["chunk"], errors)
+
+    client.on("HeapProfiler.addHeapSnapshotChunk", on_chunk)
+    try:
+        await client.send("HeapProfiler.takeHeapSnapshot", {"reportProgress": report_progress})
+    finally:
+        client.remove_listener("HeapProfiler.addHeapSnapshotChunk", on_chunk)
+        try:
+            await loop.run_in_executor(writer, out.close)
+        finally:
+            writer.shutdown(wait=False)
+    if errors:
+        raise errors[0]
+    return path
+
+
+def _open_snapshot_file(path: str, compress: bool) -> IO[bytes]:
+    """Opens the file a heap snapshot is written to, runs in the writer thread
+
+    :param path: The path to the file
+    :param compress: Should the heap snapshot be gzip compressed
+    :return: The file
+    """
+    return gzip.open(path, "wb", compresslevel=1) if compress else open(path, "wb")
+
+
+def _write_chunk(out: IO[bytes], chunk: str, errors: List[Exception]) -> None:
+    """Appends the heap snapshot chunk to the file, runs in the writer thread.
+    Once writing failed the remaining chunks are dropped
+
+    :param out: The file
+    :param chunk: The chunk of the heap snapshot
+    :param errors: The errors writing the heap snapshot, raised once it is taken
+    """
+    if errors:
+        return
+    try:
+        out.write(chunk.encode("utf-8"))
+    except Exception as e:
+        errors.append(e)
+
+
+class ClassStats:
+    """The number of nodes of a class and their total self size"""
+
+    __slots__ = ["count", "self_size"]
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.self_size: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(count={self.count}, self_size={self.self_size})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class HeapSnapshot:
+    """Compact in-memory model of a .heapsnapshot file.
+
+    Nodes and edges are kept in the flat array backed tables of the snapshot format,
+    one row of node_field_count (edge_field_count) values per node (edge), rather than
+    as Python objects. Nodes are identified by their index, i.e. their row number.
+
+    When numpy is installed the column scans, i.e. the edge index, the retainer index, the class
+    histogram, the retained sizes, the breadth first search of the retaining paths (one frontier
+    at a time) and the largest nodes, are vectorized over zero-copy numpy views of the tables.
+    The depth first search and the dominator fixpoint iteration cannot be vectorized, each step
+    depends on the previous one, and run in Python either way.
+    """
+
+    __slots__ = [
+        "_dominators",
+        "_path_edges",
+        "_path_parents",
+        "_first_edge",
+        "_id_index",
+        "_postorder",
+        "_retained_sizes",
+        "_retainer_edges",
+        "_retainer_first",
+        "edge_field_count",
+        "edge_fields",
+        "edge_types",
+        "edges",
+        "meta",
+        "node_field_count",
+        "node_fields",
+        "node_types",
+        "nodes",
+        "strings",
+    ]
+
+    def __init__(self, meta: Dict[str, Any], nodes: array, edges: array, strings: List[str]) -> None:
+        """Construct a new instance of HeapSnapshot
+
+        :param meta: The meta information of the snapshot, i.e. snapshot.meta
+        :param nodes: The node table
+        :param edges: The edge table
+        :param strings: The string table
+        """
+        self.meta: Dict[str, Any] = meta
+        self.nodes: array = nodes
+        self.edges: array = edges
+        self.strings: List[str] = strings
+        self.node_fields: List[str] = meta["node_fields"]
+        self.edge_fields: List[str] = meta["edge_fields"]
+        self.node_field_count: int = len(self.node_fields)
+        self.edge_field_count: int = len(self.edge_fields)
+        self.node_types: List[str] = meta["node_types"][0]
+        self.edge_types: List[str] = meta["edge_types"][0]
+        self._first_edge: array = self._build_first_edge()
+        self._id_index: Optional[Dict[int, int]] = None
+        self._retainer_first: Optional[array] = None
+        self._retainer_edges: Optional[array] = None
+        self._postorder: Optional[array] = None
+        self._path_parents: Optional[array] = None
+        self._path_edges: Optional[array] = None
+        self._dominators: Optional[array] = None
+        self._retained_sizes: Optional[array] = None
+
+    @classmethod
+    def load(cls, path: str, read_size: int = 1 << 20) -> "HeapSnapshot":
+        """Loads the, optionally gzip compressed, .heapsnapshot file at the supplied path
+
+        :param path: The path to the heap snapshot
+        :param read_size: The number of bytes read from the file at a time
+        :return: The loaded heap snapshot
+        """
+        with open(path, "rb") as peek:
+            compressed = peek.read(2) == _GZIP_MAGIC
+        fp: IO[bytes] = gzip.open(path, "rb") if compressed else open(path, "rb")
+        with fp:
+            return _SnapshotReader(fp, read_size).read()
+
+    @property
+    def node_count(self) -> int:
+        """Returns the number of nodes"""
+        return len(self.nodes) // self.node_field_count
+
+    @property
+    def edge_count(self) -> int:
+        """Returns the number of edges"""
+        return len(self.edges) // self.edge_field_count
+
+    def column(self, field: str) -> array:
+        """Returns the values of the supplied node field for all nodes in node index order
+
+        :param field: The name of the node field, e.g. self_size
+        :return: The values of the field
+        """
+        return self.nodes[self.node_fields.index(field) :: self.node_field_count]
+
+    def edge_column(self, field: str) -> array:
+        """Returns the values of the supplied edge field for all edges
+
+        :param field: The name of the edge field, e.g. to_node
+        :return: The values of the field
+        """
+        return self.edges[self.edge_fields.index(field) :: self.edge_field_count]
+
+    def node_id(self, node: int) -> int:
+        """Returns the id of the node"""
+        return self.nodes[node * self.node_field_count + self.node_fields.index("id")]
+
+    def node_name(self, node: int) -> str:
+        """Returns the name of the node"""
+        return self.strings[self.nodes[node * self.node_field_count + self.node_fields.index("name")]]
+
+    def node_type(self, node: int) -> str:
+        """Returns the type of the node"""
+        return self.node_types[self.nodes[node * self.node_field_count + self.node_fields.index("type")]]
+
+    def self_size(self, node: int) -> int:
+        """Returns the self size of the node"""
+        return self.nodes[node * self.node_field_count + self.node_fields.index("self_size")]
+
+    def class_name(self, node: int) -> str:
+        """Returns the class name of the node, its constructor name for objects or its type for the rest"""
+        return self._class_name(
+            self.nodes[node * self.node_field_count + self.node_fields.index("type")],
+            self.nodes[node * self.node_field_count + self.node_fields.index("name")],
+        )
+
+    def node_index(self, node_id: int) -> Optional[int]:
+        """Returns the index of the node with the supplied id
+
+        :param node_id: The id of the node
+        :return: The index of the node if it exists
+        """
+        if self._id_index is None:
+            self._id_index = {node_id: node for node, node_id in enumerate(self.column("id"))}
+        return self._id_index.get(node_id)
+
+    def edges_of(self, node: int) -> Iterator[Tuple[str, Union[str, int], int]]:
+        """Yields the outgoing edges of the node
+
+        :param node: The index of the node
+        :return: An iterator of (edge type, edge name or index, index of the node the edge points to) tuples
+        """
+        edges, strings, edge_types = self.edges, self.strings, self.edge_types
+        efc, nfc = self.edge_field_count, self.node_field_count
+        type_off = self.edge_fields.index("type")
+        name_off = self.edge_fields.index("name_or_index")
+        to_off = self.edge_fields.index("to_node")
+        for offset in range(self._first_edge[node] * efc, self._first_edge[node + 1] * efc, efc):
+            edge_type = edge_types[edges[offset + type_off]]
+            name: Union[str, int] = edges[offset + name_off]
+            if edge_type != "element" and edge_type != "hidden":
+                name = strings[name]
+            yield edge_type, name, edges[offset + to_off] // nfc
+
+    def retainers_of(self, node: int) -> Iterator[Tuple[int, int]]:
+        """Yields the retainers of the node, ignoring weak edges
+
+        :param node: The index of the node
+        :return: An iterator of (index of the retaining node, index of the retaining edge) tuples
+        """
+        self._build_retainers()
+        first, retainers = self._retainer_first, self._retainer_edges
+        for i in range(first[node], first[node + 1]):
+            yield retainers[2 * i], retainers[2 * i + 1]
+
+    def class_histogram(self) -> Dict[str, ClassStats]:
+        """Returns the number of nodes and their total self size per class name
+
+        :return: Mapping of class names to their stats
+        """
+        histogram: Dict[Tuple[int, int], ClassStats] = {}
+        if np is not None:
+            table = self._node_table()
+            types = table[:, self.node_fields.index("type")]
+            names = table[:, self.node_fields.index("name")]
+            keys, inverse = np.unique(types.astype(np.uint64) << np.uint64(32) | names, return_inverse=True)
+            counts = np.bincount(inverse, minlength=len(keys))
+            sizes = np.bincount(inverse, weights=table[:, self.node_fields.index("self_size")], minlength=len(keys))
+            for key, count, size in zip(keys.tolist(), counts.tolist(), sizes.tolist()):
+                stats = histogram[(key >> 32, key & 0xFFFFFFFF)] = ClassStats()
+                stats.count = count
+                stats.self_size = int(size)
+        else:
+            for type_idx, name_idx, self_size in zip(
+                self.column("type"), self.column("name"), self.column("self_size")
+            ):
+                key = (type_idx, name_idx)
+                stats = histogram.get(key)
+                if stats is None:
+                    stats = histogram[key] = ClassStats()
+                stats.count += 1
+                stats.self_size += self_size
+        result: Dict[str, ClassStats] = {}
+        for (type_idx, name_idx), stats in histogram.items():
+            name = self._class_name(type_idx, name_idx)
+            merged = result.get(name)
+            if merged is None:
+                result[name] = stats
+            else:
+                merged.count += stats.count
+                merged.self_size += stats.self_size
+        return result
+
+    def dominators(self) -> array:
+        """Returns the immediate dominator of every node, computing it if needed.
+        Nodes unreachable from the root have NO_DOMINATOR as their dominator.
+
+        :return: The index of the immediate dominator of every node in node index order
+        """
+        if self._dominators is None:
+            self._compute_dominators()
+        return self._dominators
+
+    def retained_sizes(self) -> array:
+        """Returns the retained size of every node, computing it if needed
+
+        :return: The retained sizes in node index order
+        """
+        if self._retained_sizes is None:
+            dominators = self.dominators()
+            retained = array("d", self.column("self_size"))
+            if np is not None:
+                self._accumulate_retained_sizes(retained)
+            else:
+                for node in self._postorder:
+                    dominator = dominators[node]
+                    if dominator != node and dominator != NO_DOMINATOR:
+                        retained[dominator] += retained[node]
+            self._retained_sizes = retained
+        return self._retained_sizes
+
+    def _accumulate_retained_sizes(self, retained: array) -> None:
+        """Adds the retained size of every node to its dominator one level of the dominator tree
+        at a time, deepest first, the depths being computed by pointer jumping
+
+        :param retained: The self sizes, in node index order, accumulated in place
+        """
+        dominators = np.frombuffer(self._dominators, dtype=np.uint32).astype(np.int64)
+        reachable = dominators != NO_DOMINATOR
+        reachable[0] = False
+        nodes = np.flatnonzero(reachable)
+        if not len(nodes):
+            return
+        ancestors = np.where(reachable, dominators, 0)
+        depths = reachable.astype(np.int64)
+        while ancestors.any():
+            depths += depths[ancestors]
+            ancestors = ancestors[ancestors]
+        nodes = nodes[np.argsort(depths[nodes], kind="stable")]
+        levels = np.flatnonzero(np.diff(depths[nodes])) + 1
+        sizes = np.frombuffer(retained, dtype=np.float64)
+        for level in reversed(np.split(nodes, levels)):
+            np.add.at(sizes, dominators[level], sizes[level])
+
+    def retained_size(self, node: int) -> int:
+        """Returns the retained size of the node"""
+        return int(self.retained_sizes()[node])
+
+    def largest(self, count: int = 20) -> List[Tuple[int, int]]:
+        """Returns the nodes with the largest retained sizes
+
+        :param count: The number of nodes to return
+        :return: List of (node index, retained size) tuples, largest first
+        """
+        retained = self.retained_sizes()
+        if np is not None:
+            # stable so that ties are ordered by node index as nlargest does
+            top = (np.argsort(-np.frombuffer(retained, dtype=np.float64)[1:], kind="stable")[:count] + 1).tolist()
+        else:
+            top = nlargest(count, range(1, self.node_count), key=retained.__getitem__)
+        return [(node, int(retained[node])) for node in top]
+
+    def edge_name(self, edge: int) -> str:
+        """Returns the display name of the edge, e.g. "foo" for properties and "[1]" for elements
+
+        :param edge: The index of the edge
+        :return: The name of the edge
+        """
+        offset = edge * self.edge_field_count
+        edge_type = self.edge_types[self.edges[offset + self.edge_fields.index("type")]]
+        name = self.edges[offset + self.edge_fields.index("name_or_index")]
+        if edge_type == "element" or edge_type == "hidden":
+            return f"[{name}]"
+        return self.strings[name]
+
+    def retaining_path(self, node: int, max_depth: int = 8) -> List[Tuple[int, int]]:
+        """Returns the shortest retaining path from the node towards the root,
+        ignoring weak edges
+
+        :param node: The index of the node
+        :param max_depth: The maximum number of retainers in the path
+        :return: List of (index of the retaining node, index of the retaining edge) tuples,
+        the closest retainer first. Empty if the node is unreachable
+        """
+        if self._path_parents is None:
+            self._compute_shortest_paths()
+        parents, edges = self._path_parents, self._path_edges
+        path: List[Tuple[int, int]] = []
+        while node != 0 and len(path) < max_depth:
+            parent = parents[node]
+            if parent == NO_DOMINATOR:
+                break
+            path.append((parent, edges[node]))
+            node = parent
+        return path
+
+    def _compute_shortest_paths(self) -> None:
+        """Computes the shortest retaining path of every node using a breadth first search
+        from the root, ignoring weak edges
+        """
+        if np is not None:
+            self._compute_shortest_paths_vectorized()
+            return
+        node_count = self.node_count
+        nfc = self.node_field_count
+        first_edge = self._first_edge
+        to_nodes = self.edge_column("to_node")
+        weak = self.edge_types.index("weak") if "weak" in self.edge_types else -1
+        edge_types = self.edge_column("type")
+        parents = array(TABLE_TYPECODE, [NO_DOMINATOR]) * node_count
+        path_edges = array(TABLE_TYPECODE, [0]) * node_count
+        parents[0] = 0
+        queue = array(TABLE_TYPECODE, [0])
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for edge in range(first_edge[node], first_edge[node + 1]):
+                if edge_types[edge] == weak:
+                    continue
+                child = to_nodes[edge] // nfc
+                if parents[child] == NO_DOMINATOR:
+                    parents[child] = node
+                    path_edges[child] = edge
+                    queue.append(child)
+        self._path_parents = parents
+        self._path_edges = path_edges
+
+    def _compute_shortest_paths_vectorized(self) -> None:
+        """Computes the shortest retaining paths one frontier of the breadth first search at a time.
+        The children of a frontier are kept in discovery order and each is given its first
+        discoverer as parent, so the paths are those of the node at a time search
+        """
+        nfc = self.node_field_count
+        first_edge = np.frombuffer(self._first_edge, dtype=np.uint32).astype(np.int64)
+        table = self._edge_table()
+        to_nodes = table[:, self.edge_fields.index("to_node")] // nfc
+        weak = self.edge_types.index("weak") if "weak" in self.edge_types else -1
+        strong = table[:, self.edge_fields.index("type")] != weak
+        parents = np.full(self.node_count, NO_DOMINATOR, dtype=np.uint32)
+        path_edges = np.zeros(self.node_count, dtype=np.uint32)
+        parents[0] = 0
+        frontier = np.zeros(1, dtype=np.int64)
+        while len(frontier):
+            starts = first_edge[frontier]
+            counts = first_edge[frontier + 1] - starts
+            total = int(counts.sum())
+            if not total:
+                break
+            # the edges of the frontier, node by node, in edge order
+            ends = np.cumsum(counts)
+            edges = np.arange(total) + np.repeat(starts - ends + counts, counts)
+            sources = np.repeat(frontier, counts)
+            keep = strong[edges]
+            edges, sources = edges[keep], sources[keep]
+            children = to_nodes[edges]
+            fresh = parents[children] == NO_DOMINATOR
+            edges, sources, children = edges[fresh], sources[fresh], children[fresh]
+            first_seen = np.sort(np.unique(children, return_index=True)[1])
+            frontier = children[first_seen].astype(np.int64)
+            parents[frontier] = sources[first_seen]
+            path_edges[frontier] = edges[first_seen]
+        self._path_parents = array(TABLE_TYPECODE, parents.tobytes())
+        self._path_edges = array(TABLE_TYPECODE, path_edges.tobytes())
+
+    def _node_table(self) -> Any:
+        """Returns a zero-copy numpy view of the node table, one row per node"""
+        return np.frombuffer(self.nodes, dtype=np.uint32).reshape(-1, self.node_field_count)
+
+    def _edge_table(self) -> Any:
+        """Returns a zero-copy numpy view of the edge table, one row per edge"""
+        return np.frombuffer(self.edges, dtype=np.uint32).reshape(-1, self.edge_field_count)
+
+    def _class_name(self, type_idx: int, name_idx: int) -> str:
+        """Returns the class name of a node given the indexes of its type and name"""
+        node_type = self.node_types[type_idx]
+        if node_type in _NAMED_TYPES:
+            return self.strings[name_idx]
+        if node_type in _STRING_TYPES:
+            return "(string)"
+        return f"({node_type})"
+
+    def _build_first_edge(self) -> array:
+        """Builds the index of the first edge of every node, with a sentinel for the last node"""
+        first_edge = array(TABLE_TYPECODE, [0])
+        if np is not None:
+            edge_counts = self._node_table()[:, self.node_fields.index("edge_count")]
+            first_edge.frombytes(np.cumsum(edge_counts, dtype=np.uint32).tobytes())
+            return first_edge
+        total = 0
+        for edge_count in self.column("edge_count"):
+            total += edge_count
+            first_edge.append(total)
+        return first_edge
+
+    def _build_retainers(self) -> None:
+        """Builds the reverse, retainer, index of the non-weak edges"""
+        if self._retainer_first is not None:
+            return
+        if np is not None:
+            self._build_retainers_vectorized()
+            return
+        node_count = self.node_count
+        nfc = self.node_field_count
+        to_nodes = self.edge_column("to_node")
+        weak = self.edge_types.index("weak") if "weak" in self.edge_types else -1
+        edge_types = self.edge_column("type")
+        counts = array(TABLE_TYPECODE, [0]) * (node_count + 1)
+        for to_node, edge_type in zip(to_nodes, edge_types):
+            if edge_type != weak:
+                counts[to_node // nfc + 1] += 1
+        for node in range(node_count):
+            counts[node + 1] += counts[node]
+        first = array(TABLE_TYPECODE, counts)
+        retainers = array(TABLE_TYPECODE, [0]) * (2 * counts[node_count])
+        first_edge = self._first_edge
+        for node in range(node_count):
+            for edge in range(first_edge[node], first_edge[node + 1]):
+                if edge_types[edge] == weak:
+                    continue
+                target = to_nodes[edge] // nfc
+                slot = counts[target]
+                counts[target] = slot + 1
+                retainers[2 * slot] = node
+                retainers[2 * slot + 1] = edge
+        self._retainer_first = first
+        self._retainer_edges = retainers
+
+    def _build_retainers_vectorized(self) -> None:
+        """Builds the retainer index with a stable sort of the non-weak edges by the node they point to,
+        the retainers of a node are thus in the order of the node at a time build
+        """
+        node_count = self.node_count
+        table = self._edge_table()
+        weak = self.edge_types.index("weak") if "weak" in self.edge_types else -1
+        strong = np.flatnonzero(table[:, self.edge_fields.index("type")] != weak)
+        targets = table[strong, self.edge_fields.index("to_node")] // self.node_field_count
+        first_edge = np.frombuffer(self._first_edge, dtype=np.uint32)
+        sources = np.repeat(np.arange(node_count, dtype=np.uint32), np.diff(first_edge))[strong]
+        order = np.argsort(targets, kind="stable")
+        first = np.zeros(node_count + 1, dtype=np.uint32)
+        first[1:] = np.cumsum(np.bincount(targets, minlength=node_count))
+        retainers = np.empty(2 * len(order), dtype=np.uint32)
+        retainers[0::2] = sources[order]
+        retainers[1::2] = strong[order]
+        self._retainer_first = array(TABLE_TYPECODE, first.tobytes())
+        self._retainer_edges = array(TABLE_TYPECODE, retainers.tobytes())
+
+    def _compute_dominators(self) -> None:
+        """Computes the immediate dominators of the nodes reachable from the root, node 0,
+        using the iterative algorithm of Cooper, Harvey and Kennedy
+        """
+        self._build_retainers()
+        node_count = self.node_count
+        nfc = self.node_field_count
+        first_edge = self._first_edge
+        to_nodes = self.edge_column("to_node")
+        weak = self.edge_types.index("weak") if "weak" in self.edge_types else -1
+        edge_types = self.edge_column("type")
+
+        # iterative depth first search computing the post order of the reachable nodes
+        order = array(TABLE_TYPECODE, [NO_DOMINATOR]) * node_count
+        postorder = array(TABLE_TYPECODE)
+        visited = bytearray(node_count)
+        stack = [(0, first_edge[0])]
+        visited[0] = 1
+        while stack:
+            node, edge = stack[-1]
+            end = first_edge[node + 1]
+            while edge < end and (edge_types[edge] == weak or visited[to_nodes[edge] // nfc]):
+                edge += 1
+            if edge < end:
+                stack[-1] = (node, edge + 1)
+                child = to_nodes[edge] // nfc
+                visited[child] = 1
+                stack.append((child, first_edge[child]))
+            else:
+                stack.pop()
+                order[node] = len(postorder)
+                postorder.append(node)
+
+        dominators = array(TABLE_TYPECODE, [NO_DOMINATOR]) * node_count
+        dominators[0] = 0
+        first, retainers = self._retainer_first, self._retainer_edges
+        reverse_postorder = postorder[::-1]
+        changed = True
+        while changed:
+            changed = False
+            for node in reverse_postorder:
+                if node == 0:
+                    continue
+                new_idom = NO_DOMINATOR
+                for i in range(first[node], first[node + 1]):
+                    pred = retainers[2 * i]
+                    if dominators[pred] == NO_DOMINATOR:
+                        continue
+                    if new_idom == NO_DOMINATOR:
+                        new_idom = pred
+                        continue
+                    # intersect
+                    a, b = pred, new_idom
+                    while a != b:
+                        while order[a] < order[b]:
+                            a = dominators[a]
+                        while order[b] < order[a]:
+                            b = dominators[b]
+                    new_idom = a
+                if new_idom != NO_DOMINATOR and dominators[node] != new_idom:
+                    dominators[node] = new_idom
+                    changed = True
+        self._postorder = postorder
+        self._dominators = dominators
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(nodes={self.node_count}, edges={self.edge_count}, "
+            f"strings={len(self.strings)})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def load_heap_snapshot(path: str, read_size: int = 1 << 20) -> HeapSnapshot:
+    """Loads the, optionally gzip compressed, .heapsnapshot file at the supplied path
+
+    :param path: The path to the heap snapshot
+    :param read_size: The number of bytes read from the file at a time
+    :return: The loaded heap snapshot
+    """
+    return HeapSnapshot.load(path, read_size)
+
+
+class _SnapshotReader:
+    """Incrementally reads a .heapsnapshot file decoding the node and edge tables
+    directly into arrays
+    """
+
+    __slots__ = ["_buf", "_decoder", "_eof", "_fp", "_pos", "_raw_decode", "_read_size"]
+
+    def __init__(self, fp: IO[bytes], read_size: int) -> None:
+        self._fp: IO[bytes] = fp
+        self._read_size: int = read_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._raw_decode = JSONDecoder().raw_decode
+        self._buf: str = ""
+        self._pos: int = 0
+        self._eof: bool = False
+
+    def read(self) -> HeapSnapshot:
+        """Reads the heap snapshot
+
+        :return: The heap snapshot
+        """
+        snapshot: Optional[Dict[str, Any]] = None
+        nodes = array(TABLE_TYPECODE)
+        edges = array(TABLE_TYPECODE)
+        strings: List[str] = []
+        self._expect("{")
+        while True:
+            char = self._peek()
+            if char == "}":
+                break
+            if char == ",":
+                self._pos += 1
+                continue
+            key = self._decode_value()
+            self._expect(":")
+            char = self._peek()
+            if key == "nodes":
+                self._read_int_array(nodes)
+            elif key == "edges":
+                self._read_int_array(edges)
+            elif key == "strings":
+                strings = self._read_array_items()
+            elif key in _SKIPPED_ARRAYS and char == "[":
+                self._skip_number_array()
+            else:
+                value = self._decode_value()
+                if key == "snapshot":
+                    snapshot = value
+        if snapshot is None:
+            raise ClientError("The heap snapshot does not contain the snapshot meta information")
+        return HeapSnapshot(snapshot["meta"], nodes, edges, strings)
+
+    def _fill(self) -> bool:
+        """Reads more of the file into the buffer, growing the amount read with the
+        size of the pending buffer so that large values are decoded in linear time
+
+        :return: T/F indicating if more data was read
+        """
+        if self._eof:
+            return False
+        pending = len(self._buf) - self._pos
+        data = self._fp.read(max(self._read_size, pending))
+        self._eof = not data
+        self._buf = self._buf[self._pos :] + self._decoder.decode(data, final=self._eof)
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Skips whitespace returning the next character"""
+        while True:
+            buf = self._buf
+            pos = self._pos
+            end = len(buf)
+            while pos < end and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < end:
+                return buf[pos]
+            if not self._fill():
+                raise ClientError("Unexpected end of the heap snapshot")
+
+    def _expect(self, char: str) -> None:
+        """Consumes the expected character"""
+        if self._peek() != char:
+            raise ClientError(f"Malformed heap snapshot, expected {char!r} at {self._pos}")
+        self._pos += 1
+
+    def _decode_value(self) -> Any:
+        """Decodes the next JSON value"""
+        self._peek()
+        while True:
+            try:
+                value, self._pos = self._raw_decode(self._buf, self._pos)
+                return value
+            except ValueError:
+                if not self._fill():
+                    raise
+
+    def _read_array_items(self) -> List[Any]:
+        """Decodes the next JSON array one item at a time"""
+        self._expect("[")
+        items: List[Any] = []
+        while True:
+            char = self._peek()
+            if char == "]":
+                self._pos += 1
+                return items
+            if char == ",":
+                self._pos += 1
+                continue
+            items.append(self._decode_value())
+
+    def _read_int_array(self, out: array) -> None:
+        """Decodes the next JSON array of integers into the supplied array
+
+        :param out: The array the integers are added to
+        """
+        self._expect("[")
+        while True:
+            buf = self._buf
+            end = buf.find("]", self._pos)
+            if end != -1:
+                _extend_ints(out, buf[self._pos : end])
+                self._pos = end + 1
+                return
+            cut = buf.rfind(",", self._pos)
+            if cut != -1:
+                _extend_ints(out, buf[self._pos : cut])
+                self._pos = cut + 1
+            if not self._fill():
+                raise ClientError("Unexpected end of the heap snapshot")
+
+    def _skip_number_array(self) -> None:
+        """Skips the next JSON array of numbers or of nested arrays of numbers, e.g. trace_tree,
+        by counting the brackets, the array containing no strings
+        """
+        self._expect("[")
+        depth = 1
+        while True:
+            buf = self._buf
+            for match in _BRACKETS.finditer(buf, self._pos):
+                depth += 1 if match.group() == "[" else -1
+                if not depth:
+                    self._pos = match.end()
+                    return
+            self._pos = len(buf)
+            if not self._fill():
+                raise ClientError("Unexpected end of the heap snapshot")
+
+
+def _extend_ints(out: array, text: str) -> None:
+    """Adds the comma separated integers of the supplied text to the array"""
+    if text.strip():
+        out.extend(map(int, text.split(",")))
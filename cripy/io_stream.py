@@ -0,0 +1,133 @@
+from binascii import a2b_base64
+from collections import deque
+from typing import AsyncIterator, Deque, List, TYPE_CHECKING, Union
+
+import aiofiles
+
+from .cdp_result_future import CDPResultFuture
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["IOStream", "DEFAULT_READ_SIZE", "DEFAULT_MAX_INFLIGHT"]
+
+#: The default number of bytes requested by each IO.read
+DEFAULT_READ_SIZE: int = 1 << 20
+#: The default number of IO.read commands kept in-flight
+DEFAULT_MAX_INFLIGHT: int = 4
+
+
+class IOStream:
+    """Reads the stream represented by an IO stream handle, e.g. the handles returned by
+    Fetch.takeResponseBodyAsStream, Page.printToPDF and Tracing.tracingComplete when using
+    the ReturnAsStream transfer mode.
+
+    Several IO.read commands are kept in-flight and each chunk is decoded as it is received
+    so the stream never has to be held fully in memory.
+    """
+
+    __slots__ = ["_bytes_read", "_client", "_close_on_eof", "_closed", "_handle", "_max_inflight", "_read_size"]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        handle: str,
+        read_size: int = DEFAULT_READ_SIZE,
+        max_inflight: int = DEFAULT_MAX_INFLIGHT,
+        close_on_eof: bool = True,
+    ) -> None:
+        """Construct a new instance of IOStream
+
+        :param client: The connection or session the stream belongs to
+        :param handle: The handle of the stream
+        :param read_size: The maximum number of bytes requested by each IO.read
+        :param max_inflight: The number of IO.read commands kept in-flight
+        :param close_on_eof: Should the stream be closed (IO.close) once it has been read
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._handle: str = handle
+        self._read_size: int = read_size
+        self._max_inflight: int = max(1, max_inflight)
+        self._close_on_eof: bool = close_on_eof
+        self._closed: bool = False
+        self._bytes_read: int = 0
+
+    @property
+    def handle(self) -> str:
+        """Returns the handle of the stream"""
+        return self._handle
+
+    @property
+    def bytes_read(self) -> int:
+        """Returns the number of decoded bytes read from the stream so far"""
+        return self._bytes_read
+
+    @property
+    def closed(self) -> bool:
+        """Returns T/F indicating if the stream was closed"""
+        return self._closed
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Yields the decoded chunks of the stream as they are read
+
+        :return: An async iterator of the chunks of the stream
+        """
+        send = self._client.send
+        params = {"handle": self._handle, "size": self._read_size}
+        pending: Deque[CDPResultFuture] = deque(send("IO.read", params) for _ in range(self._max_inflight))
+        try:
+            while pending:
+                resp = await pending.popleft()
+                data = resp.get("data")
+                if data:
+                    chunk = a2b_base64(data) if resp.get("base64Encoded") else data.encode("utf-8")
+                    self._bytes_read += len(chunk)
+                    yield chunk
+                if resp.get("eof"):
+                    break
+                pending.append(send("IO.read", params))
+        finally:
+            for read in pending:
+                read.cancel()
+            if self._close_on_eof:
+                await self.close()
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self.chunks()
+
+    async def read_all(self) -> bytes:
+        """Reads the entire stream into memory
+
+        :return: The contents of the stream
+        """
+        parts: List[bytes] = []
+        async for chunk in self.chunks():
+            parts.append(chunk)
+        return b"".join(parts)
+
+    async def to_file(self, path: str, mode: str = "wb") -> int:
+        """Writes the stream to the file at the supplied path chunk by chunk
+
+        :param path: The path to the file
+        :param mode: The mode the file is opened with, use "ab" to append
+        :return: The number of bytes written
+        """
+        written = 0
+        async with aiofiles.open(path, mode=mode) as out:
+            async for chunk in self.chunks():
+                await out.write(chunk)
+                written += len(chunk)
+        return written
+
+    async def close(self) -> None:
+        """Closes the stream (IO.close) discarding any temporary backing storage"""
+        if self._closed:
+            return
+        self._closed = True
+        await self._client.send("IO.close", {"handle": self._handle})
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(handle={self._handle}, bytes_read={self._bytes_read}, closed={self._closed})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
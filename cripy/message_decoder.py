@@ -0,0 +1,370 @@
+import gc
+import re
+from asyncio import AbstractEventLoop, Task, sleep
+from collections import deque
+from concurrent.futures import Executor
+from json import JSONDecodeError, JSONDecoder
+from json.scanner import make_scanner
+from threading import Lock
+from typing import Any, Awaitable, Deque, Dict, List, Optional, Tuple
+
+__all__ = ["LoopLagMonitor", "MessageDecoder", "decode_message", "decode_sliced"]
+
+#: The default maximum number of characters decoded by a single call of the C JSON scanner
+SLICE_SIZE: int = 1 << 16
+
+_scan_once = make_scanner(JSONDecoder())
+_WS = re.compile(r"[ \t\n\r]*")
+_NUMBER = r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?"
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+#: A run of array items that are numbers, strings, true, false or null, each followed by a comma
+_SCALAR_RUN = re.compile(r"(?:[ \t\n\r]*(?:%s|%s|true|false|null)[ \t\n\r]*,)+" % (_NUMBER, _STRING))
+
+
+def decode_sliced(text: str, slice_size: int = SLICE_SIZE) -> Any:
+    """Decodes the JSON text in slices of at most about slice_size characters.
+
+    The C JSON decoders hold the GIL for the whole call, decoding a large message in a thread
+    blocks the event loop just as much as decoding it inline. Here arrays and objects larger than
+    a slice are walked in Python while their items, and runs of scalar items, are decoded by the
+    C scanner one slice at a time, so that the thread decoding the text regularly lets the event
+    loop run. The result is identical to json.loads, at about twice its cost.
+
+    :param text: The JSON text
+    :param slice_size: The maximum number of characters decoded by a single call of the C scanner,
+    strings longer than that are decoded by a single call regardless
+    :return: The decoded value
+    """
+    return _SlicedDecoder(text, slice_size).decode()
+
+
+def _scan(text: str, pos: int) -> Tuple[Any, int]:
+    """Decodes the value starting at pos with the C scanner, raising JSONDecodeError if there is none"""
+    try:
+        return _scan_once(text, pos)
+    except StopIteration as e:
+        raise JSONDecodeError("Expecting value", text, e.value) from None
+
+
+class _SlicedDecoder:
+    """Recursive descent over the arrays and objects too large to be decoded in one slice"""
+
+    __slots__ = ["slice_size", "text"]
+
+    def __init__(self, text: str, slice_size: int) -> None:
+        self.text: str = text
+        self.slice_size: int = slice_size
+
+    def decode(self) -> Any:
+        text = self.text
+        value, pos = self._value(_WS.match(text, 0).end())
+        pos = _WS.match(text, pos).end()
+        if pos != len(text):
+            raise JSONDecodeError("Extra data", text, pos)
+        return value
+
+    def _value(self, pos: int) -> Tuple[Any, int]:
+        """Decodes the value starting at pos, trying windows growing up to a slice before
+        descending into an array or object that does not fit in one
+        """
+        text = self.text
+        char = text[pos : pos + 1]
+        if char != "[" and char != "{":
+            return _scan(text, pos)
+        size = 256
+        while size <= self.slice_size:
+            try:
+                value, end = _scan_once(text[pos : pos + size], 0)
+                return value, pos + end
+            except (StopIteration, ValueError):
+                if pos + size >= len(text):
+                    break
+            size <<= 2
+        if char == "[":
+            return self._array(pos + 1)
+        return self._object(pos + 1)
+
+    def _array(self, pos: int) -> Tuple[List[Any], int]:
+        text = self.text
+        ws = _WS.match
+        scalar_run = _SCALAR_RUN.match
+        items: List[Any] = []
+        pos = ws(text, pos).end()
+        if text[pos : pos + 1] == "]":
+            return items, pos + 1
+        while True:
+            run = scalar_run(text, pos, pos + self.slice_size)
+            if run is not None:
+                end = run.end()
+                # the run ends with a comma, decoded as one array without it
+                items.extend(_scan_once("[" + text[pos : end - 1] + "]", 0)[0])
+                pos = ws(text, end).end()
+                continue
+            value, pos = self._value(pos)
+            items.append(value)
+            pos = ws(text, pos).end()
+            char = text[pos : pos + 1]
+            if char == "]":
+                return items, pos + 1
+            if char != ",":
+                raise JSONDecodeError("Expecting ',' delimiter", text, pos)
+            pos = ws(text, pos + 1).end()
+
+    def _object(self, pos: int) -> Tuple[Dict[str, Any], int]:
+        text = self.text
+        ws = _WS.match
+        obj: Dict[str, Any] = {}
+        pos = ws(text, pos).end()
+        if text[pos : pos + 1] == "}":
+            return obj, pos + 1
+        while True:
+            if text[pos : pos + 1] != '"':
+                raise JSONDecodeError("Expecting property name enclosed in double quotes", text, pos)
+            key, pos = _scan(text, pos)
+            pos = ws(text, pos).end()
+            if text[pos : pos + 1] != ":":
+                raise JSONDecodeError("Expecting ':' delimiter", text, pos)
+            obj[key], pos = self._value(ws(text, pos + 1).end())
+            pos = ws(text, pos).end()
+            char = text[pos : pos + 1]
+            if char == "}":
+                return obj, pos + 1
+            if char != ",":
+                raise JSONDecodeError("Expecting ',' delimiter", text, pos)
+            pos = ws(text, pos + 1).end()
+
+
+class _GCPause:
+    """Pauses the garbage collector while messages are decoded off the event loop.
+
+    A full collection triggered by the millions of objects of a large message runs in a single
+    C call, blocking the event loop for as long as decoding inline would. Once the last decoding
+    finishes the objects allocated meanwhile are moved to the oldest generation (gc.freeze then
+    gc.unfreeze, both constant time) rather than being traversed by the next young collection
+    on the event loop. The promotion is skipped if objects were frozen by someone else
+    """
+
+    __slots__ = ["_enabled", "_lock", "_pauses"]
+
+    def __init__(self) -> None:
+        self._lock: Lock = Lock()
+        self._pauses: int = 0
+        self._enabled: bool = False
+
+    def __enter__(self) -> None:
+        with self._lock:
+            if not self._pauses:
+                self._enabled = gc.isenabled()
+                gc.disable()
+            self._pauses += 1
+
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        with self._lock:
+            self._pauses -= 1
+            if self._pauses or not self._enabled:
+                return
+            freeze = getattr(gc, "freeze", None)
+            if freeze is not None and not gc.get_freeze_count():
+                freeze()
+                gc.unfreeze()
+            gc.enable()
+
+
+_gc_pause = _GCPause()
+
+
+def decode_message(message: str, slice_size: int = SLICE_SIZE) -> Dict:
+    """Decodes a message received from the remote browser instance in slices (decode_sliced)
+    with the garbage collector paused, intended to run in a thread. The message of a
+    Target.receivedMessageFromTarget event is decoded too so that the session receiving it does not have to
+
+    :param message: The JSON message string
+    :param slice_size: The maximum number of characters decoded by a single call of the C scanner
+    :return: The decoded message
+    """
+    with _gc_pause:
+        msg = decode_sliced(message, slice_size)
+        if msg.get("method") == "Target.receivedMessageFromTarget":
+            params = msg.get("params")
+            if params is not None and isinstance(params.get("message"), str):
+                params["message"] = decode_sliced(params["message"], slice_size)
+    return msg
+
+
+class MessageDecoder:
+    """Size threshold policy for decoding the messages received by a connection.
+
+    Messages smaller than threshold are decoded inline by the receive loop. Larger messages
+    are decoded in slices in the thread executor (decode_message), so that decoding a huge response,
+    e.g. of Page.captureScreenshot or DOMSnapshot.captureSnapshot, does not block the event loop
+    beyond a slice at a time. The receive loop waits for each offloaded message to be decoded
+    before receiving the next message so responses and events are still handled in the order
+    they were received.
+    """
+
+    __slots__ = ["_executor", "_inline", "_inline_bytes", "_slice_size", "_threaded", "_threaded_bytes", "_threshold"]
+
+    def __init__(
+        self, threshold: int = 1 << 20, executor: Optional[Executor] = None, slice_size: int = SLICE_SIZE
+    ) -> None:
+        """Construct a new instance of MessageDecoder
+
+        :param threshold: The size, in characters, from which messages are decoded off the event loop
+        :param executor: The thread executor messages are decoded in, defaults to the event loop's
+        default executor
+        :param slice_size: The maximum number of characters decoded at once by the thread holding the GIL
+        """
+        self._threshold: int = threshold
+        self._executor: Optional[Executor] = executor
+        self._slice_size: int = slice_size
+        self._inline: int = 0
+        self._inline_bytes: int = 0
+        self._threaded: int = 0
+        self._threaded_bytes: int = 0
+
+    @property
+    def threshold(self) -> int:
+        """Returns the size from which messages are decoded off the event loop"""
+        return self._threshold
+
+    @property
+    def slice_size(self) -> int:
+        """Returns the maximum number of characters decoded at once by the thread holding the GIL"""
+        return self._slice_size
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Returns the number, and total size, of the messages decoded inline and in the thread executor"""
+        return {
+            "inline": self._inline,
+            "inline_bytes": self._inline_bytes,
+            "threaded": self._threaded,
+            "threaded_bytes": self._threaded_bytes,
+        }
+
+    def offloads(self, message: str) -> bool:
+        """Returns T/F indicating if the message is decoded off the event loop, counting it if it is not
+
+        :param message: The JSON message string
+        :return: T/F indicating if decode should be awaited for the message
+        """
+        if len(message) < self._threshold:
+            self._inline += 1
+            self._inline_bytes += len(message)
+            return False
+        return True
+
+    def decode(self, message: str, loop: AbstractEventLoop) -> Awaitable[Dict]:
+        """Decodes the message off the event loop
+
+        :param message: The JSON message string
+        :param loop: The event loop of the connection
+        :return: An awaitable resolving to the decoded message
+        """
+        self._threaded += 1
+        self._threaded_bytes += len(message)
+        return loop.run_in_executor(self._executor, decode_message, message, self._slice_size)
+
+    def reset_stats(self) -> None:
+        """Resets the counters"""
+        self._inline = self._inline_bytes = 0
+        self._threaded = self._threaded_bytes = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(threshold={self._threshold}, slice_size={self._slice_size}, "
+            f"inline={self._inline}, threaded={self._threaded})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a callback scheduled every interval seconds,
+    i.e. for how long the event loop was blocked, e.g. by decoding a large message inline
+    """
+
+    __slots__ = ["_interval", "_lags", "_loop", "_task"]
+
+    def __init__(self, loop: AbstractEventLoop, interval: float = 0.01, max_samples: int = 10000) -> None:
+        """Construct a new instance of LoopLagMonitor
+
+        :param loop: The event loop monitored
+        :param interval: The number of seconds between two measurements
+        :param max_samples: The maximum number of measurements kept, older measurements are discarded first
+        """
+        self._loop: AbstractEventLoop = loop
+        self._interval: float = interval
+        self._lags: Deque[float] = deque(maxlen=max_samples)
+        self._task: Optional[Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Returns T/F indicating if the monitor is measuring"""
+        return self._task is not None and not self._task.done()
+
+    @property
+    def samples(self) -> int:
+        """Returns the number of measurements kept"""
+        return len(self._lags)
+
+    @property
+    def max_lag(self) -> float:
+        """Returns the largest lag, in seconds, measured"""
+        return max(self._lags, default=0.0)
+
+    @property
+    def mean_lag(self) -> float:
+        """Returns the mean lag, in seconds, measured"""
+        return sum(self._lags) / len(self._lags) if self._lags else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """Returns the lag, in seconds, below which the supplied percent of the measurements fall
+
+        :param percent: The percent, 0 to 100
+        :return: The lag
+        """
+        if not self._lags:
+            return 0.0
+        lags = sorted(self._lags)
+        return lags[min(len(lags) - 1, int(len(lags) * percent / 100))]
+
+    def start(self) -> None:
+        """Starts measuring"""
+        if not self.running:
+            self._task = self._loop.create_task(self._measure())
+
+    def stop(self) -> None:
+        """Stops measuring, the measurements are kept"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def reset(self) -> None:
+        """Discards the measurements"""
+        self._lags.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the stats of the measurements"""
+        return {
+            "samples": len(self._lags),
+            "mean": self.mean_lag,
+            "p99": self.percentile(99),
+            "max": self.max_lag,
+        }
+
+    async def _measure(self) -> None:
+        loop_time = self._loop.time
+        interval = self._interval
+        lags = self._lags
+        while 1:
+            expected = loop_time() + interval
+            await sleep(interval)
+            lags.append(max(0.0, loop_time() - expected))
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(samples={len(self._lags)}, max_lag={self.max_lag:.4f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,272 @@
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["NetworkLedger", "RequestRecord"]
+
+Exporter = Callable[[List["RequestRecord"]], Any]
+
+
+class RequestRecord:
+    """The fields of interest of the Network events of a single request folded into one record"""
+
+    __slots__ = [
+        "data_length",
+        "encoded_data_length",
+        "error",
+        "finished",
+        "frame_id",
+        "from_cache",
+        "method",
+        "mime_type",
+        "protocol",
+        "redirects",
+        "request_id",
+        "resource_type",
+        "started",
+        "status",
+        "url",
+        "wall_time",
+    ]
+
+    def __init__(self, request_id: str, event: Dict, redirects: int = 0) -> None:
+        """Construct a new instance of RequestRecord from a Network.requestWillBeSent event
+
+        :param request_id: The id of the request
+        :param event: The Network.requestWillBeSent event
+        :param redirects: The number of redirects that led to the request
+        """
+        request = event["request"]
+        self.request_id: str = request_id
+        self.url: str = request["url"]
+        self.method: str = request.get("method", "GET")
+        self.resource_type: Optional[str] = event.get("type")
+        self.frame_id: Optional[str] = event.get("frameId")
+        #: Monotonic timestamp, in seconds, the request was sent
+        self.started: float = event.get("timestamp", 0.0)
+        self.wall_time: float = event.get("wallTime", 0.0)
+        self.redirects: int = redirects
+        self.status: Optional[int] = None
+        self.mime_type: Optional[str] = None
+        self.protocol: Optional[str] = None
+        self.from_cache: bool = False
+        #: Sum of the data lengths of the Network.dataReceived events
+        self.data_length: int = 0
+        self.encoded_data_length: int = 0
+        #: Monotonic timestamp, in seconds, loading finished or failed
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def completed(self) -> bool:
+        """Returns T/F indicating if the request finished or failed loading"""
+        return self.finished is not None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Returns the number of seconds from sending the request until it finished or failed loading"""
+        if self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def set_response(self, response: Dict) -> None:
+        """Folds the fields of interest of the supplied Network.Response into the record
+
+        :param response: The response
+        """
+        self.status = response.get("status")
+        self.mime_type = response.get("mimeType")
+        self.protocol = response.get("protocol")
+        self.from_cache = response.get("fromDiskCache", False) or response.get("fromServiceWorker", False)
+        self.encoded_data_length = int(response.get("encodedDataLength", 0))
+
+    def to_json(self) -> Dict[str, Any]:
+        """Returns the JSON serializable representation of the record"""
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(request_id={self.request_id}, url={self.url}, status={self.status}, "
+            f"completed={self.completed})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class NetworkLedger:
+    """Keeps one RequestRecord per request of a connection or session by folding
+    the Network.requestWillBeSent, responseReceived, dataReceived, loadingFinished
+    and loadingFailed events into it, discarding the remaining fields of the events.
+
+    Completed records are held until drained, exported in batches or, once more than
+    max_completed are held, evicted oldest first so that memory use stays bounded
+    no matter how long the ledger runs.
+    """
+
+    __slots__ = [
+        "_active",
+        "_batch_size",
+        "_client",
+        "_completed",
+        "_enabled",
+        "_evicted",
+        "_exporter",
+        "_max_active",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        max_completed: int = 10000,
+        max_active: int = 10000,
+        exporter: Optional[Exporter] = None,
+        batch_size: int = 500,
+    ) -> None:
+        """Construct a new instance of NetworkLedger
+
+        :param client: The connection or session whose requests are recorded
+        :param max_completed: The maximum number of completed records held
+        :param max_active: The maximum number of records of requests still loading held,
+        requests that never complete, e.g. long polling, are evicted oldest first
+        :param exporter: Optional function called with each batch of completed records,
+        exported records are no longer held by the ledger
+        :param batch_size: The number of completed records exported at a time
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._active: Dict[str, RequestRecord] = {}
+        self._max_active: int = max_active
+        self._completed: Deque[RequestRecord] = deque(maxlen=max_completed)
+        self._exporter: Optional[Exporter] = exporter
+        self._batch_size: int = batch_size
+        self._evicted: int = 0
+        self._enabled: bool = False
+
+    @property
+    def active(self) -> int:
+        """Returns the number of requests still loading"""
+        return len(self._active)
+
+    @property
+    def completed(self) -> int:
+        """Returns the number of completed records held"""
+        return len(self._completed)
+
+    @property
+    def evicted(self) -> int:
+        """Returns the number of records evicted because the ledger was full"""
+        return self._evicted
+
+    def get(self, request_id: str) -> Optional[RequestRecord]:
+        """Returns the record of the request that is still loading
+
+        :param request_id: The id of the request
+        :return: The record if the request is still loading
+        """
+        return self._active.get(request_id)
+
+    def drain(self, max_records: Optional[int] = None) -> List[RequestRecord]:
+        """Removes and returns the completed records, oldest first
+
+        :param max_records: The maximum number of records returned, defaults to all
+        :return: The completed records
+        """
+        completed = self._completed
+        count = len(completed) if max_records is None else min(max_records, len(completed))
+        return [completed.popleft() for _ in range(count)]
+
+    def flush(self) -> None:
+        """Exports the completed records held, in batches"""
+        if self._exporter is None:
+            return
+        while self._completed:
+            self._exporter(self.drain(self._batch_size))
+
+    async def enable(self) -> None:
+        """Starts recording requests (Network.enable)"""
+        if self._enabled:
+            return
+        self._enabled = True
+        client = self._client
+        client.on("Network.requestWillBeSent", self._on_request_will_be_sent)
+        client.on("Network.responseReceived", self._on_response_received)
+        client.on("Network.dataReceived", self._on_data_received)
+        client.on("Network.loadingFinished", self._on_loading_finished)
+        client.on("Network.loadingFailed", self._on_loading_failed)
+        await client.send("Network.enable")
+
+    async def disable(self) -> None:
+        """Stops recording requests and exports the completed records held if there is an exporter.
+        The Network domain is left enabled as others may depend on it
+        """
+        if not self._enabled:
+            return
+        self._enabled = False
+        client = self._client
+        client.remove_listener("Network.requestWillBeSent", self._on_request_will_be_sent)
+        client.remove_listener("Network.responseReceived", self._on_response_received)
+        client.remove_listener("Network.dataReceived", self._on_data_received)
+        client.remove_listener("Network.loadingFinished", self._on_loading_finished)
+        client.remove_listener("Network.loadingFailed", self._on_loading_failed)
+        self.flush()
+
+    def _complete(self, record: RequestRecord) -> None:
+        """Moves the record to the completed records exporting a batch once there are enough"""
+        completed = self._completed
+        if len(completed) == completed.maxlen:
+            self._evicted += 1
+        completed.append(record)
+        if self._exporter is not None and len(completed) >= self._batch_size:
+            self._exporter(self.drain(self._batch_size))
+
+    def _on_request_will_be_sent(self, event: Dict) -> None:
+        request_id = event["requestId"]
+        redirects = 0
+        redirect = event.get("redirectResponse")
+        if redirect is not None:
+            previous = self._active.pop(request_id, None)
+            if previous is not None:
+                previous.set_response(redirect)
+                previous.finished = event.get("timestamp", previous.started)
+                redirects = previous.redirects + 1
+                self._complete(previous)
+        active = self._active
+        if request_id not in active and len(active) >= self._max_active:
+            del active[next(iter(active))]
+            self._evicted += 1
+        active[request_id] = RequestRecord(request_id, event, redirects)
+
+    def _on_response_received(self, event: Dict) -> None:
+        record = self._active.get(event["requestId"])
+        if record is not None:
+            record.set_response(event["response"])
+
+    def _on_data_received(self, event: Dict) -> None:
+        record = self._active.get(event["requestId"])
+        if record is not None:
+            record.data_length += event.get("dataLength", 0)
+
+    def _on_loading_finished(self, event: Dict) -> None:
+        record = self._active.pop(event["requestId"], None)
+        if record is not None:
+            record.finished = event.get("timestamp", record.started)
+            record.encoded_data_length = int(event.get("encodedDataLength", record.encoded_data_length))
+            self._complete(record)
+
+    def _on_loading_failed(self, event: Dict) -> None:
+        record = self._active.pop(event["requestId"], None)
+        if record is not None:
+            record.finished = event.get("timestamp", record.started)
+            record.error = "canceled" if event.get("canceled") else event.get("errorText", "")
+            self._complete(record)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(active={len(self._active)}, completed={len(self._completed)}, "
+            f"evicted={self._evicted})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,360 @@
+from asyncio import AbstractEventLoop
+from itertools import count
+from typing import Any, Dict, List, Optional, TYPE_CHECKING, Union
+from weakref import finalize
+
+from .cdp_batch import consume_outcome
+from .errors import ClientError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["HandlePool", "ObjectGroup", "RemoteHandle"]
+
+
+class RemoteHandle:
+    """A handle to a Runtime.RemoteObject of an ObjectGroup.
+
+    The remote object is released (Runtime.releaseObject) once the handle is garbage collected
+    unless its object group was released before that
+    """
+
+    __slots__ = ["__weakref__", "class_name", "description", "group", "object_id", "subtype", "type", "value"]
+
+    def __init__(self, remote_object: Dict[str, Any], group: Optional["ObjectGroup"] = None) -> None:
+        """Construct a new instance of RemoteHandle
+
+        :param remote_object: The Runtime.RemoteObject
+        :param group: The object group the remote object belongs to
+        """
+        self.object_id: Optional[str] = remote_object.get("objectId")
+        self.type: str = remote_object.get("type", "undefined")
+        self.subtype: Optional[str] = remote_object.get("subtype")
+        self.class_name: Optional[str] = remote_object.get("className")
+        self.description: Optional[str] = remote_object.get("description")
+        self.value: Any = remote_object.get("value")
+        self.group: Optional[ObjectGroup] = group
+
+    @property
+    def alive(self) -> bool:
+        """Returns T/F indicating if the remote object is still pinned, i.e. its group was not released"""
+        return self.object_id is not None and self.group is not None and not self.group.released
+
+    def to_argument(self) -> Dict[str, Any]:
+        """Returns the Runtime.CallArgument referring to the remote object"""
+        if self.object_id is not None:
+            return {"objectId": self.object_id}
+        return {"value": self.value}
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(object_id={self.object_id}, type={self.type}, "
+            f"description={self.description})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ObjectGroup:
+    """A scope of remote objects released all at once (Runtime.releaseObjectGroup).
+
+    Commands issued through the group place their results in it. Used as an async context manager
+    the group is released on exit.
+    """
+
+    __slots__ = ["_finalizers", "_pool", "_released", "name"]
+
+    def __init__(self, pool: "HandlePool", name: str) -> None:
+        """Construct a new instance of ObjectGroup
+
+        :param pool: The pool the group belongs to
+        :param name: The name of the object group
+        """
+        self._pool: HandlePool = pool
+        self.name: str = name
+        self._finalizers: Dict[str, List[finalize]] = {}
+        self._released: bool = False
+
+    @property
+    def released(self) -> bool:
+        """Returns T/F indicating if the group was released"""
+        return self._released
+
+    @property
+    def outstanding(self) -> int:
+        """Returns the number of remote objects of the group still pinned"""
+        return len(self._finalizers)
+
+    def wrap(self, remote_object: Dict[str, Any]) -> RemoteHandle:
+        """Returns a handle to the remote object, which must belong to this group
+
+        :param remote_object: The Runtime.RemoteObject
+        :return: The handle
+        """
+        handle = RemoteHandle(remote_object, self)
+        object_id = handle.object_id
+        if object_id is not None and not self._released:
+            # the same remote object can be returned more than once,
+            # it is released once all of its handles are collected
+            self._finalizers.setdefault(object_id, []).append(finalize(handle, self._on_collected, object_id))
+        return handle
+
+    async def evaluate(self, expression: str, **params: Any) -> RemoteHandle:
+        """Evaluates the expression (Runtime.evaluate) placing the result in the group
+
+        :param expression: The expression
+        :param params: Additional parameters of Runtime.evaluate, e.g. contextId
+        :return: The handle to the result
+        :raises ClientError: If the group was released or the expression threw
+        """
+        params["expression"] = expression
+        return await self._run("Runtime.evaluate", params)
+
+    async def call_function_on(
+        self, function_declaration: str, handle: Optional[RemoteHandle] = None, *arguments: Any, **params: Any
+    ) -> RemoteHandle:
+        """Calls the function (Runtime.callFunctionOn) placing the result in the group
+
+        :param function_declaration: The declaration of the function
+        :param handle: The handle to the object the function is called on, if None params
+        must contain executionContextId
+        :param arguments: The arguments of the call, handles or values
+        :param params: Additional parameters of Runtime.callFunctionOn
+        :return: The handle to the result
+        :raises ClientError: If the group was released or the function threw
+        """
+        params["functionDeclaration"] = function_declaration
+        if handle is not None:
+            params["objectId"] = handle.object_id
+        if arguments:
+            params["arguments"] = [
+                argument.to_argument() if isinstance(argument, RemoteHandle) else {"value": argument}
+                for argument in arguments
+            ]
+        return await self._run("Runtime.callFunctionOn", params)
+
+    async def resolve_node(
+        self, node_id: Optional[int] = None, backend_node_id: Optional[int] = None
+    ) -> RemoteHandle:
+        """Resolves the node (DOM.resolveNode) placing its remote object in the group
+
+        :param node_id: The id of the node
+        :param backend_node_id: The backend id of the node
+        :return: The handle to the node
+        :raises ClientError: If the group was released
+        """
+        params: Dict[str, Any] = {}
+        if node_id is not None:
+            params["nodeId"] = node_id
+        if backend_node_id is not None:
+            params["backendNodeId"] = backend_node_id
+        resp = await self._send("DOM.resolveNode", params)
+        return self._place(resp["object"])
+
+    async def release(self) -> None:
+        """Releases all the remote objects of the group (Runtime.releaseObjectGroup)"""
+        if self._released:
+            return
+        self._released = True
+        self._detach()
+        self._pool._forget(self)
+        await self._pool.client.send("Runtime.releaseObjectGroup", {"objectGroup": self.name})
+
+    async def _send(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Sends the command placing its result in the group
+
+        :param method: The method of the command
+        :param params: The parameters of the command
+        :return: The response to the command
+        :raises ClientError: If the group was released
+        """
+        if self._released:
+            raise ClientError(f"The object group {self.name} was released")
+        params["objectGroup"] = self.name
+        return await self._pool.client.send(method, params)
+
+    async def _run(self, method: str, params: Dict[str, Any]) -> RemoteHandle:
+        """Runs the script (Runtime.evaluate or Runtime.callFunctionOn) placing its result in the group
+
+        :param method: The method of the command
+        :param params: The parameters of the command
+        :return: The handle to the result
+        :raises ClientError: If the group was released or the script threw
+        """
+        resp = await self._send(method, params)
+        details = resp.get("exceptionDetails")
+        if details is None:
+            return self._place(resp["result"])
+        # the handle to the thrown value is dropped at once so the value is released
+        self._place(resp["result"])
+        raise ClientError(details.get("exception", {}).get("description") or details.get("text", ""))
+
+    def _place(self, remote_object: Dict[str, Any]) -> RemoteHandle:
+        """Returns the handle to the remote object placed in the group by a command
+
+        :param remote_object: The Runtime.RemoteObject
+        :return: The handle
+        :raises ClientError: If the group was released while the command was in-flight
+        """
+        if self._released:
+            # the remote object outlives the release of its group, release it on its own
+            object_id = remote_object.get("objectId")
+            if object_id is not None:
+                self._pool._schedule_release(object_id)
+            raise ClientError(f"The object group {self.name} was released")
+        return self.wrap(remote_object)
+
+    def _detach(self) -> None:
+        for finalizers in self._finalizers.values():
+            for finalizer in finalizers:
+                finalizer.detach()
+        self._finalizers.clear()
+
+    def _on_collected(self, object_id: str) -> None:
+        finalizers = self._finalizers.get(object_id)
+        if finalizers is None:
+            return
+        alive = [finalizer for finalizer in finalizers if finalizer.alive]
+        if alive:
+            self._finalizers[object_id] = alive
+            return
+        del self._finalizers[object_id]
+        self._pool._schedule_release(object_id)
+
+    async def __aenter__(self) -> "ObjectGroup":
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        await self.release()
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(name={self.name}, outstanding={len(self._finalizers)}, "
+            f"released={self._released})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class HandlePool:
+    """Manages the remote objects pinned in the renderer by the results of commands such as
+    Runtime.evaluate, Runtime.callFunctionOn and DOM.resolveNode.
+
+    Remote objects are placed in object groups, one per scope, released in bulk with a single
+    Runtime.releaseObjectGroup. Remote objects whose handle is garbage collected before their
+    group is released are released too, the releases being batched into one write per event loop iteration.
+    """
+
+    __slots__ = [
+        "_client",
+        "_flush_scheduled",
+        "_groups",
+        "_loop",
+        "_pending",
+        "_prefix",
+        "_released_groups",
+        "_released_objects",
+        "_seq",
+    ]
+
+    def __init__(self, client: Union["ConnectionType", "SessionType"], prefix: str = "cripy") -> None:
+        """Construct a new instance of HandlePool
+
+        :param client: The connection or session the remote objects belong to
+        :param prefix: The prefix of the names of the object groups created
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._loop: AbstractEventLoop = client.loop
+        self._prefix: str = prefix
+        self._seq = count(1)
+        self._groups: Dict[str, ObjectGroup] = {}
+        self._pending: List[str] = []
+        self._flush_scheduled: bool = False
+        self._released_groups: int = 0
+        self._released_objects: int = 0
+
+    @property
+    def client(self) -> Union["ConnectionType", "SessionType"]:
+        """Returns the connection or session the remote objects belong to"""
+        return self._client
+
+    @property
+    def outstanding(self) -> int:
+        """Returns the number of remote objects still pinned by the groups of the pool"""
+        return sum(group.outstanding for group in self._groups.values())
+
+    @property
+    def groups(self) -> List[ObjectGroup]:
+        """Returns the groups not yet released"""
+        return list(self._groups.values())
+
+    @property
+    def released_groups(self) -> int:
+        """Returns the number of groups released"""
+        return self._released_groups
+
+    @property
+    def released_objects(self) -> int:
+        """Returns the number of remote objects released because their handle was garbage collected"""
+        return self._released_objects
+
+    def group(self, name: Optional[str] = None) -> ObjectGroup:
+        """Returns a new object group, or the group with the supplied name if it was not released
+
+        :param name: The name of the group, defaults to a unique name
+        :return: The object group
+        """
+        if name is None:
+            name = f"{self._prefix}-{next(self._seq)}"
+        group = self._groups.get(name)
+        if group is None:
+            group = self._groups[name] = ObjectGroup(self, name)
+        return group
+
+    async def release_all(self) -> None:
+        """Releases all the groups of the pool"""
+        groups = list(self._groups.values())
+        for group in groups:
+            group._released = True
+            group._detach()
+        self._groups.clear()
+        self._released_groups += len(groups)
+        if groups:
+            await self._client.send_many(
+                [("Runtime.releaseObjectGroup", {"objectGroup": group.name}) for group in groups]
+            )
+
+    async def flush(self) -> None:
+        """Releases the remote objects whose handle was garbage collected now"""
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
+        self._released_objects += len(pending)
+        await self._client.send_many([("Runtime.releaseObject", {"objectId": object_id}) for object_id in pending])
+
+    def _forget(self, group: ObjectGroup) -> None:
+        if self._groups.get(group.name) is group:
+            del self._groups[group.name]
+            self._released_groups += 1
+
+    def _schedule_release(self, object_id: str) -> None:
+        """Queues the release of the remote object, called by finalizers which may run during
+        garbage collection in any thread
+        """
+        self._pending.append(object_id)
+        if not self._flush_scheduled and not self._loop.is_closed():
+            self._flush_scheduled = True
+            self._loop.call_soon_threadsafe(self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._flush_scheduled = False
+        self._loop.create_task(self.flush()).add_done_callback(consume_outcome)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(groups={len(self._groups)}, outstanding={self.outstanding})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
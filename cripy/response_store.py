@@ -0,0 +1,535 @@
+import logging
+import mmap
+import os
+import struct
+from asyncio import get_event_loop
+from base64 import b64decode
+from binascii import b2a_base64
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b, sha256
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TYPE_CHECKING, Tuple, Union
+
+try:
+    from ujson import dumps, loads
+except ImportError:
+    from json import dumps, loads
+
+from .cdp_batch import consume_outcome
+from .errors import ClientError, ProtocolError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["ResponseRecorder", "ResponseReplayer", "ResponseStore", "StoredResponse"]
+
+logger = logging.getLogger(__name__)
+
+_INDEX_MAGIC: bytes = b"CRIPYRS1"
+#: magic, capacity, count
+_HEADER = struct.Struct("<8sQQ8x")
+#: key digest, record offset, record length
+_SLOT = struct.Struct("<16sQI4x")
+_EMPTY_KEY: bytes = bytes(16)
+_INITIAL_CAPACITY: int = 1024
+
+
+def _response_key(method: str, url: str) -> bytes:
+    """Returns the index key of the supplied method and URL"""
+    return blake2b(f"{method.upper()} {url}".encode("utf-8"), digest_size=16).digest()
+
+
+class StoredResponse:
+    """A response, status and headers, recorded in a ResponseStore. The body is stored separately
+    by the digest of its contents
+    """
+
+    __slots__ = ["digest", "headers", "method", "size", "status", "status_text", "url"]
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        status: int,
+        headers: List[Dict[str, str]],
+        digest: str,
+        size: int,
+        status_text: str = "",
+    ) -> None:
+        self.method: str = method
+        self.url: str = url
+        self.status: int = status
+        self.status_text: str = status_text
+        #: The response headers as a list of {"name": ..., "value": ...} entries
+        self.headers: List[Dict[str, str]] = headers
+        #: The sha256 hex digest of the body
+        self.digest: str = digest
+        #: The size of the body in bytes
+        self.size: int = size
+
+    def to_json(self) -> Dict[str, Any]:
+        """Returns the JSON serializable representation of the response"""
+        return {
+            "method": self.method,
+            "url": self.url,
+            "status": self.status,
+            "statusText": self.status_text,
+            "headers": self.headers,
+            "digest": self.digest,
+            "size": self.size,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "StoredResponse":
+        """Returns the response represented by the supplied JSON"""
+        return cls(
+            data["method"],
+            data["url"],
+            data["status"],
+            data["headers"],
+            data["digest"],
+            data["size"],
+            data.get("statusText", ""),
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(method={self.method}, url={self.url}, status={self.status}, size={self.size})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ResponseStore:
+    """A directory of recorded responses looked up by method and URL.
+
+    Bodies are content-addressed, stored once per distinct body under bodies/ named by their
+    sha256 digest. The responses themselves are appended to records.jsonl and located through
+    index.bin, an open addressing hash table of fixed size slots that is memory-mapped so that
+    lookups only read the slots probed and the record found. Recording the same method and URL
+    again replaces the previous response.
+
+    The methods are synchronous, their async counterparts (put_async, get_async and body_async)
+    run them in the I/O thread of the store, one at a time in the order they are called,
+    so that the event loop is not blocked by the file I/O.
+    """
+
+    __slots__ = ["_capacity", "_count", "_directory", "_index", "_index_file", "_io", "_records"]
+
+    def __init__(self, directory: str) -> None:
+        """Construct a new instance of ResponseStore, creating the store if it does not exist
+
+        :param directory: The directory of the store
+        """
+        self._directory: str = directory
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        self._records = open(os.path.join(directory, "records.jsonl"), "a+b")
+        index_path = os.path.join(directory, "index.bin")
+        if not os.path.exists(index_path):
+            self._write_index(index_path, _INITIAL_CAPACITY, [])
+        self._index_file = open(index_path, "r+b")
+        self._index: mmap.mmap = mmap.mmap(self._index_file.fileno(), 0)
+        self._io: Optional[ThreadPoolExecutor] = None
+        magic, self._capacity, self._count = _HEADER.unpack_from(self._index, 0)
+        if magic != _INDEX_MAGIC:
+            self.close()
+            raise ClientError(f"{index_path} is not a response store index")
+
+    @property
+    def directory(self) -> str:
+        """Returns the directory of the store"""
+        return self._directory
+
+    @property
+    def closed(self) -> bool:
+        """Returns T/F indicating if the store was closed"""
+        return self._records.closed
+
+    def put(
+        self,
+        method: str,
+        url: str,
+        status: int,
+        headers: List[Dict[str, str]],
+        body: bytes,
+        status_text: str = "",
+    ) -> StoredResponse:
+        """Records the response to the request
+
+        :param method: The HTTP method of the request
+        :param url: The URL of the request
+        :param status: The response code
+        :param headers: The response headers as a list of {"name": ..., "value": ...} entries
+        :param body: The response body
+        :param status_text: The response status text
+        :return: The stored response
+        """
+        digest = sha256(body).hexdigest()
+        body_path = self._body_path(digest)
+        if not os.path.exists(body_path):
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            tmp_path = f"{body_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as out:
+                out.write(body)
+            os.replace(tmp_path, body_path)
+        response = StoredResponse(method.upper(), url, status, headers, digest, len(body), status_text)
+        record = (dumps(response.to_json()) + "\n").encode("utf-8")
+        self._records.seek(0, os.SEEK_END)
+        offset = self._records.tell()
+        self._records.write(record)
+        self._records.flush()
+        if (self._count + 1) * 2 > self._capacity:
+            self._grow()
+        self._insert(_response_key(method, url), offset, len(record))
+        return response
+
+    def get(self, method: str, url: str) -> Optional[StoredResponse]:
+        """Returns the response recorded for the request
+
+        :param method: The HTTP method of the request
+        :param url: The URL of the request
+        :return: The stored response if one was recorded
+        """
+        slot = self._find(_response_key(method, url))
+        if slot is None:
+            return None
+        _, offset, length = _SLOT.unpack_from(self._index, slot)
+        self._records.seek(offset)
+        return StoredResponse.from_json(loads(self._records.read(length)))
+
+    def body(self, response: StoredResponse) -> bytes:
+        """Returns the body of the stored response
+
+        :param response: The stored response
+        :return: The body
+        """
+        with open(self._body_path(response.digest), "rb") as body:
+            return body.read()
+
+    async def put_async(
+        self,
+        method: str,
+        url: str,
+        status: int,
+        headers: List[Dict[str, str]],
+        body: bytes,
+        status_text: str = "",
+    ) -> StoredResponse:
+        """Records the response to the request in the I/O thread of the store
+
+        :param method: The HTTP method of the request
+        :param url: The URL of the request
+        :param status: The response code
+        :param headers: The response headers as a list of {"name": ..., "value": ...} entries
+        :param body: The response body
+        :param status_text: The response status text
+        :return: The stored response
+        """
+        return await self._in_io_thread(self.put, method, url, status, headers, body, status_text)
+
+    async def get_async(self, method: str, url: str) -> Optional[StoredResponse]:
+        """Returns the response recorded for the request, read in the I/O thread of the store
+
+        :param method: The HTTP method of the request
+        :param url: The URL of the request
+        :return: The stored response if one was recorded
+        """
+        return await self._in_io_thread(self.get, method, url)
+
+    async def body_async(self, response: StoredResponse) -> bytes:
+        """Returns the body of the stored response, read in the I/O thread of the store
+
+        :param response: The stored response
+        :return: The body
+        """
+        return await self._in_io_thread(self.body, response)
+
+    def close(self) -> None:
+        """Closes the store, waiting for the operations running in its I/O thread to complete"""
+        if self._records.closed:
+            return
+        if self._io is not None:
+            self._io.shutdown(wait=True)
+            self._io = None
+        self._index.flush()
+        self._index.close()
+        self._index_file.close()
+        self._records.close()
+
+    def _in_io_thread(self, fn: Callable[..., Any], *args: Any) -> Awaitable[Any]:
+        """Runs the operation in the I/O thread of the store after the operations submitted before it"""
+        if self._records.closed:
+            raise ClientError("The response store is closed")
+        if self._io is None:
+            self._io = ThreadPoolExecutor(1)
+        return get_event_loop().run_in_executor(self._io, fn, *args)
+
+    def _body_path(self, digest: str) -> str:
+        return os.path.join(self._directory, "bodies", digest[:2], digest)
+
+    def _slot_offset(self, slot: int) -> int:
+        return _HEADER.size + slot * _SLOT.size
+
+    def _find(self, key: bytes) -> Optional[int]:
+        """Returns the offset of the slot holding the key
+
+        :param key: The key
+        :return: The offset of the slot if the key is in the index
+        """
+        mask = self._capacity - 1
+        slot = int.from_bytes(key[:8], "little") & mask
+        index = self._index
+        while True:
+            offset = self._slot_offset(slot)
+            slot_key = index[offset : offset + 16]
+            if slot_key == key:
+                return offset
+            if slot_key == _EMPTY_KEY:
+                return None
+            slot = (slot + 1) & mask
+
+    def _insert(self, key: bytes, record_offset: int, record_length: int) -> None:
+        """Inserts the key, or updates its record if it is already in the index"""
+        mask = self._capacity - 1
+        slot = int.from_bytes(key[:8], "little") & mask
+        index = self._index
+        while True:
+            offset = self._slot_offset(slot)
+            slot_key = index[offset : offset + 16]
+            if slot_key == _EMPTY_KEY:
+                self._count += 1
+                _HEADER.pack_into(index, 0, _INDEX_MAGIC, self._capacity, self._count)
+                break
+            if slot_key == key:
+                break
+            slot = (slot + 1) & mask
+        _SLOT.pack_into(index, offset, key, record_offset, record_length)
+
+    def _grow(self) -> None:
+        """Rebuilds the index with double the capacity"""
+        entries: List[Tuple[bytes, int, int]] = []
+        for slot in range(self._capacity):
+            entry = _SLOT.unpack_from(self._index, self._slot_offset(slot))
+            if entry[0] != _EMPTY_KEY:
+                entries.append(entry)
+        index_path = os.path.join(self._directory, "index.bin")
+        self._index.close()
+        self._index_file.close()
+        self._write_index(index_path, self._capacity * 2, entries)
+        self._index_file = open(index_path, "r+b")
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+        self._capacity *= 2
+
+    @staticmethod
+    def _write_index(path: str, capacity: int, entries: List[Tuple[bytes, int, int]]) -> None:
+        """Writes an index of the supplied capacity holding the entries, replacing the existing index"""
+        table = bytearray(_HEADER.size + capacity * _SLOT.size)
+        _HEADER.pack_into(table, 0, _INDEX_MAGIC, capacity, len(entries))
+        mask = capacity - 1
+        for key, record_offset, record_length in entries:
+            slot = int.from_bytes(key[:8], "little") & mask
+            while table[_HEADER.size + slot * _SLOT.size : _HEADER.size + slot * _SLOT.size + 16] != _EMPTY_KEY:
+                slot = (slot + 1) & mask
+            _SLOT.pack_into(table, _HEADER.size + slot * _SLOT.size, key, record_offset, record_length)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(table)
+        os.replace(tmp_path, path)
+
+    def __contains__(self, request: Tuple[str, str]) -> bool:
+        return self._find(_response_key(*request)) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> "ResponseStore":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(directory={self._directory}, responses={self._count})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ResponseRecorder:
+    """Records the responses received by a page into a ResponseStore by pausing every request,
+    matching the supplied patterns, at the response stage (Fetch.getResponseBody)
+    """
+
+    __slots__ = ["_client", "_enabled", "_patterns", "_recorded", "_store"]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        store: ResponseStore,
+        url_patterns: Optional[List[str]] = None,
+    ) -> None:
+        """Construct a new instance of ResponseRecorder
+
+        :param client: The connection or session whose responses are recorded
+        :param store: The store the responses are recorded in
+        :param url_patterns: The URL patterns of the requests recorded, defaults to all requests
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._store: ResponseStore = store
+        self._patterns: List[Dict[str, str]] = [
+            {"urlPattern": pattern, "requestStage": "Response"} for pattern in (url_patterns or ["*"])
+        ]
+        self._enabled: bool = False
+        self._recorded: int = 0
+
+    @property
+    def recorded(self) -> int:
+        """Returns the number of responses recorded"""
+        return self._recorded
+
+    async def enable(self) -> None:
+        """Starts recording responses"""
+        if self._enabled:
+            return
+        self._enabled = True
+        self._client.on("Fetch.requestPaused", self._on_request_paused)
+        await self._client.send("Fetch.enable", {"patterns": self._patterns})
+
+    async def disable(self) -> None:
+        """Stops recording responses"""
+        if not self._enabled:
+            return
+        self._enabled = False
+        self._client.remove_listener("Fetch.requestPaused", self._on_request_paused)
+        await self._client.send("Fetch.disable")
+
+    async def _on_request_paused(self, event: Dict) -> None:
+        """Lets the paused response continue once its body is retrieved then records it
+
+        :param event: The Fetch.requestPaused event
+        """
+        request_id = event["requestId"]
+        status = event.get("responseStatusCode")
+        body: Optional[bytes] = None
+        try:
+            if status is None:
+                return
+            if 300 <= status < 400:
+                # the body of redirect responses is not available
+                body = b""
+            else:
+                try:
+                    resp = await self._client.send("Fetch.getResponseBody", {"requestId": request_id})
+                except ProtocolError:
+                    return
+                body = b64decode(resp["body"]) if resp.get("base64Encoded") else resp["body"].encode("utf-8")
+        finally:
+            self._client.send("Fetch.continueRequest", {"requestId": request_id}).add_done_callback(consume_outcome)
+        request = event["request"]
+        await self._store.put_async(
+            request.get("method", "GET"),
+            request["url"],
+            status,
+            event.get("responseHeaders", []),
+            body,
+            event.get("responseStatusText", ""),
+        )
+        self._recorded += 1
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(store={self._store}, recorded={self._recorded})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ResponseReplayer:
+    """Answers every request of a page with the response recorded in a ResponseStore (Fetch.fulfillRequest).
+
+    Requests without a recorded response fail as if disconnected from the internet
+    unless pass_through is True in which case they continue to the network.
+    """
+
+    __slots__ = ["_client", "_enabled", "_misses", "_pass_through", "_replayed", "_store"]
+
+    def __init__(
+        self, client: Union["ConnectionType", "SessionType"], store: ResponseStore, pass_through: bool = False
+    ) -> None:
+        """Construct a new instance of ResponseReplayer
+
+        :param client: The connection or session whose requests are answered
+        :param store: The store the responses are read from
+        :param pass_through: Should requests without a recorded response continue to the network
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._store: ResponseStore = store
+        self._pass_through: bool = pass_through
+        self._enabled: bool = False
+        self._replayed: int = 0
+        self._misses: int = 0
+
+    @property
+    def replayed(self) -> int:
+        """Returns the number of requests answered from the store"""
+        return self._replayed
+
+    @property
+    def misses(self) -> int:
+        """Returns the number of requests without a recorded response"""
+        return self._misses
+
+    async def enable(self) -> None:
+        """Starts answering requests from the store"""
+        if self._enabled:
+            return
+        self._enabled = True
+        self._client.on("Fetch.requestPaused", self._on_request_paused)
+        await self._client.send("Fetch.enable", {"patterns": [{"urlPattern": "*"}]})
+
+    async def disable(self) -> None:
+        """Stops answering requests from the store"""
+        if not self._enabled:
+            return
+        self._enabled = False
+        self._client.remove_listener("Fetch.requestPaused", self._on_request_paused)
+        await self._client.send("Fetch.disable")
+
+    async def _on_request_paused(self, event: Dict) -> None:
+        """Fulfills the paused request with its recorded response
+
+        :param event: The Fetch.requestPaused event
+        """
+        request = event["request"]
+        store = self._store
+        try:
+            response = await store.get_async(request.get("method", "GET"), request["url"])
+            body = await store.body_async(response) if response is not None else b""
+        except Exception:
+            # the request must not stay paused, it is answered as if nothing was recorded
+            logger.exception("reading the recorded response to %s failed", request["url"])
+            response = None
+        if response is not None:
+            self._replayed += 1
+            method = "Fetch.fulfillRequest"
+            params = {
+                "requestId": event["requestId"],
+                "responseCode": response.status,
+                "responseHeaders": response.headers,
+                "body": b2a_base64(body, newline=False).decode("ascii"),
+            }
+            if response.status_text:
+                params["responsePhrase"] = response.status_text
+        elif self._pass_through:
+            self._misses += 1
+            method, params = "Fetch.continueRequest", {"requestId": event["requestId"]}
+        else:
+            self._misses += 1
+            method = "Fetch.failRequest"
+            params = {"requestId": event["requestId"], "errorReason": "InternetDisconnected"}
+        self._client.send(method, params).add_done_callback(consume_outcome)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(store={self._store}, replayed={self._replayed}, misses={self._misses})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,159 @@
+from asyncio import AbstractEventLoop
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Dict, Optional, Tuple
+
+from .cdp_result_future import CDPResultFuture
+from .command_coalescer import CommandKey, CommandSender, command_key
+
+__all__ = ["ResultCache", "STATIC_BROWSER_INFO_TTLS"]
+
+#: Default time to live, in seconds, of the results of commands returning effectively static data
+STATIC_BROWSER_INFO_TTLS: Dict[str, float] = {
+    "Browser.getBrowserCommandLine": 300.0,
+    "Browser.getVersion": 300.0,
+    "Schema.getDomains": 300.0,
+    "SystemInfo.getInfo": 300.0,
+    "Tracing.getCategories": 300.0,
+}
+
+
+class ResultCache:
+    """A size bounded LRU cache of the results of commands whose methods have a time to live.
+
+    Sending a command whose result is cached and not expired resolves locally
+    without making a round-trip to the remote instance.
+    """
+
+    __slots__ = ["_entries", "_hits", "_loop", "_maxsize", "_misses", "_ttls"]
+
+    def __init__(
+        self,
+        loop: AbstractEventLoop,
+        ttls: Optional[Dict[str, float]] = None,
+        maxsize: int = 256,
+    ) -> None:
+        """Construct a new instance of ResultCache
+
+        :param loop: The event loop the futures of the commands belong to
+        :param ttls: Mapping of method names to the number of seconds their results are cached for.
+        Defaults to STATIC_BROWSER_INFO_TTLS
+        :param maxsize: The maximum number of results cached
+        """
+        self._loop: AbstractEventLoop = loop
+        self._ttls: Dict[str, float] = dict(STATIC_BROWSER_INFO_TTLS if ttls is None else ttls)
+        self._maxsize: int = maxsize
+        self._entries: "OrderedDict[CommandKey, Tuple[float, Any]]" = OrderedDict()
+        self._hits: int = 0
+        self._misses: int = 0
+
+    @property
+    def ttls(self) -> Dict[str, float]:
+        """Returns the mapping of method names to the time to live of their results"""
+        return self._ttls
+
+    @property
+    def maxsize(self) -> int:
+        """Returns the maximum number of results cached"""
+        return self._maxsize
+
+    @property
+    def hits(self) -> int:
+        """Returns the number of commands served from the cache"""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """Returns the number of cacheable commands that were actually sent"""
+        return self._misses
+
+    def set_ttl(self, method: str, ttl: Optional[float]) -> None:
+        """Sets the time to live of the results of the supplied method.
+
+        :param method: The name of the method
+        :param ttl: The number of seconds its results are cached for,
+        None to stop caching the method
+        """
+        if ttl is None:
+            self._ttls.pop(method, None)
+            self.invalidate(method=method)
+        else:
+            self._ttls[method] = ttl
+
+    def send(
+        self, sender: CommandSender, session_id: Optional[str], method: str, params: Dict
+    ) -> CDPResultFuture:
+        """Resolve the command from the cache or send the command using
+        the supplied sender caching its result once received.
+
+        The cached result is shared between the callers and should not be mutated.
+
+        :param sender: The function used to send the command if its result is not cached
+        :param session_id: The id of the session the command is for, None for the connection
+        :param method: The method to be used
+        :param params: The parameters (arguments) for the command
+        :return: A future that resolves once the commands response is received
+        """
+        key = command_key(session_id, method, params)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > self._loop.time():
+                self._hits += 1
+                self._entries.move_to_end(key)
+                future = CDPResultFuture(method, loop=self._loop)
+                future.set_result(entry[1])
+                return future
+            del self._entries[key]
+        self._misses += 1
+        future = sender(method, params)
+        future.add_done_callback(partial(self._store, key, self._ttls[method]))
+        return future
+
+    def invalidate(self, method: Optional[str] = None, session_id: Optional[str] = None) -> None:
+        """Removes the cached results matching the supplied method and or session id.
+        If neither are supplied the entire cache is cleared.
+
+        :param method: Optional method name the results to be removed are for
+        :param session_id: Optional id of the session the results to be removed are for
+        """
+        if method is None and session_id is None:
+            self._entries.clear()
+            return
+        stale = [
+            key
+            for key in self._entries
+            if (method is None or key[1] == method) and (session_id is None or key[0] == session_id)
+        ]
+        for key in stale:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """Removes all cached results"""
+        self._entries.clear()
+
+    def _store(self, key: CommandKey, ttl: float, future: CDPResultFuture) -> None:
+        """Caches the result of the successfully completed command
+
+        :param key: The key of the command
+        :param ttl: The number of seconds the result is cached for
+        :param future: The future of the command
+        """
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        if result is None:
+            return
+        entries = self._entries
+        entries[key] = (self._loop.time() + ttl, result)
+        entries.move_to_end(key)
+        while len(entries) > self._maxsize:
+            entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(size={len(self._entries)}, hits={self._hits}, misses={self._misses})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
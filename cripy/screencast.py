@@ -0,0 +1,250 @@
+from asyncio import AbstractEventLoop, Future
+from binascii import a2b_base64
+from collections import deque
+from concurrent.futures import Executor
+from functools import partial
+from hashlib import blake2b
+from typing import Any, AsyncIterator, Deque, Dict, Optional, TYPE_CHECKING, Tuple, Union
+
+from .cdp_batch import consume_outcome
+from .errors import ClientError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["ScreencastFrame", "ScreencastPipeline"]
+
+DecodedFrame = Tuple[bytes, Optional[bytes]]
+
+
+class ScreencastFrame:
+    """A decoded Page.screencastFrame"""
+
+    __slots__ = ["data", "digest", "metadata", "number", "received_at", "timestamp"]
+
+    def __init__(
+        self, number: int, data: bytes, metadata: Dict[str, Any], received_at: float, digest: Optional[bytes]
+    ) -> None:
+        #: The sequence number of the frame, frames are numbered in the order they were received
+        self.number: int = number
+        #: The decoded image
+        self.data: bytes = data
+        #: The screencast frame metadata
+        self.metadata: Dict[str, Any] = metadata
+        #: The time, according to the event loop's clock, the frame was received
+        self.received_at: float = received_at
+        #: The time, in seconds since the epoch, the frame was swapped, if reported
+        self.timestamp: Optional[float] = metadata.get("timestamp")
+        #: The digest of the decoded image, if duplicate frames are suppressed
+        self.digest: Optional[bytes] = digest
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(number={self.number}, size={len(self.data)}, timestamp={self.timestamp})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ScreencastPipeline:
+    """Receives the frames of a screencast (Page.startScreencast) keeping up with Chrome.
+
+    Every Page.screencastFrame is acknowledged as soon as it is received, so that Chrome never
+    waits on the consumer, and its image is decoded off of the event loop. Decoded frames are kept
+    in a fixed size ring buffer, once it is full the oldest frames are dropped in favour of
+    the newest. Frames decoded out of order are dropped as stale.
+    """
+
+    __slots__ = [
+        "_buffer",
+        "_client",
+        "_dedupe",
+        "_dropped",
+        "_duplicates",
+        "_executor",
+        "_last_digest",
+        "_last_number",
+        "_loop",
+        "_options",
+        "_received",
+        "_running",
+        "_waiter",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        format: str = "jpeg",
+        quality: Optional[int] = None,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        every_nth_frame: Optional[int] = None,
+        buffer_size: int = 4,
+        dedupe: bool = False,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Construct a new instance of ScreencastPipeline
+
+        :param client: The connection or session of the page to screencast
+        :param format: Image compression format, jpeg or png
+        :param quality: Compression quality from range [0..100] (jpeg only)
+        :param max_width: Maximum screenshot width
+        :param max_height: Maximum screenshot height
+        :param every_nth_frame: Send every n-th frame
+        :param buffer_size: The number of decoded frames buffered before the oldest are dropped
+        :param dedupe: Should frames whose image is identical to the previous frame be dropped
+        :param executor: The executor frames are decoded in, defaults to the event loop's default executor
+        """
+        if buffer_size < 1:
+            raise ClientError("The screencast buffer size must be at least 1")
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._loop: AbstractEventLoop = client.loop
+        self._options: Dict[str, Any] = {"format": format}
+        if quality is not None:
+            self._options["quality"] = quality
+        if max_width is not None:
+            self._options["maxWidth"] = max_width
+        if max_height is not None:
+            self._options["maxHeight"] = max_height
+        if every_nth_frame is not None:
+            self._options["everyNthFrame"] = every_nth_frame
+        self._buffer: Deque[ScreencastFrame] = deque(maxlen=buffer_size)
+        self._dedupe: bool = dedupe
+        self._executor: Optional[Executor] = executor
+        self._waiter: Optional[Future] = None
+        self._running: bool = False
+        self._received: int = 0
+        self._dropped: int = 0
+        self._duplicates: int = 0
+        self._last_number: int = -1
+        self._last_digest: Optional[bytes] = None
+
+    @property
+    def running(self) -> bool:
+        """Returns T/F indicating if the screencast is running"""
+        return self._running
+
+    @property
+    def received(self) -> int:
+        """Returns the number of frames received"""
+        return self._received
+
+    @property
+    def dropped(self) -> int:
+        """Returns the number of frames dropped because they were stale or the buffer was full"""
+        return self._dropped
+
+    @property
+    def duplicates(self) -> int:
+        """Returns the number of frames dropped because they were identical to the previous frame"""
+        return self._duplicates
+
+    @property
+    def buffered(self) -> int:
+        """Returns the number of frames in the buffer"""
+        return len(self._buffer)
+
+    async def start(self) -> None:
+        """Starts the screencast"""
+        if self._running:
+            raise ClientError("The screencast is already running")
+        self._running = True
+        self._client.on("Page.screencastFrame", self._on_frame)
+        try:
+            await self._client.send("Page.startScreencast", self._options)
+        except Exception:
+            self._running = False
+            self._client.remove_listener("Page.screencastFrame", self._on_frame)
+            raise
+
+    async def stop(self) -> None:
+        """Stops the screencast, the buffered frames remain available"""
+        if not self._running:
+            return
+        self._running = False
+        self._client.remove_listener("Page.screencastFrame", self._on_frame)
+        self._wake()
+        await self._client.send("Page.stopScreencast")
+
+    async def frames(self) -> AsyncIterator[ScreencastFrame]:
+        """Yields the buffered frames, oldest first, waiting for new frames
+        until the screencast is stopped
+
+        :return: An async iterator of the frames
+        """
+        buffer = self._buffer
+        while True:
+            if buffer:
+                yield buffer.popleft()
+                continue
+            if not self._running:
+                return
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    def __aiter__(self) -> AsyncIterator[ScreencastFrame]:
+        return self.frames()
+
+    def _on_frame(self, event: Dict) -> None:
+        """Acknowledges the Page.screencastFrame and schedules the decoding of its image
+
+        :param event: The Page.screencastFrame event
+        """
+        ack = self._client.send("Page.screencastFrameAck", {"sessionId": event["sessionId"]})
+        ack.add_done_callback(consume_outcome)
+        number = self._received
+        self._received += 1
+        decoding = self._loop.run_in_executor(self._executor, _decode_frame, event["data"], self._dedupe)
+        decoding.add_done_callback(
+            partial(self._on_decoded, number, event.get("metadata", {}), self._loop.time())
+        )
+
+    def _on_decoded(self, number: int, metadata: Dict[str, Any], received_at: float, decoding: Future) -> None:
+        """Buffers the decoded frame unless it is stale or a duplicate
+
+        :param number: The sequence number of the frame
+        :param metadata: The screencast frame metadata
+        :param received_at: The time the frame was received
+        :param decoding: The future of the decoding of the frame
+        """
+        if decoding.cancelled() or decoding.exception() is not None or number < self._last_number:
+            self._dropped += 1
+            return
+        data, digest = decoding.result()
+        self._last_number = number
+        if digest is not None:
+            if digest == self._last_digest:
+                self._duplicates += 1
+                return
+            self._last_digest = digest
+        if len(self._buffer) == self._buffer.maxlen:
+            self._dropped += 1
+        self._buffer.append(ScreencastFrame(number, data, metadata, received_at, digest))
+        self._wake()
+
+    def _wake(self) -> None:
+        """Wakes the consumer waiting for a frame"""
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(running={self._running}, received={self._received}, "
+            f"dropped={self._dropped}, duplicates={self._duplicates})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _decode_frame(data: str, dedupe: bool) -> DecodedFrame:
+    """Decodes the base64 encoded image of a screencast frame, runs in an executor
+
+    :param data: The base64 encoded image
+    :param dedupe: Should the digest of the image be computed
+    :return: The image and its digest
+    """
+    image = a2b_base64(data)
+    return image, blake2b(image, digest_size=16).digest() if dedupe else None
@@ -0,0 +1,216 @@
+from asyncio import AbstractEventLoop, Future
+from functools import partial
+from hashlib import blake2b
+from typing import Any, Dict, Optional, TYPE_CHECKING, Tuple, Union
+
+from .cdp_batch import share_inflight
+from .errors import ProtocolError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["ScriptRegistry", "script_digest"]
+
+#: executionContextId (None for the default context), digest of the source
+ScriptKey = Tuple[Optional[int], bytes]
+
+
+def script_digest(source: str) -> bytes:
+    """Returns the digest identifying the source of a script
+
+    :param source: The source of the script
+    :return: The digest of the source
+    """
+    return blake2b(source.encode("utf-8"), digest_size=16).digest()
+
+
+class ScriptRegistry:
+    """Compiles scripts once per execution context (Runtime.compileScript with persistScript)
+    and runs the compiled script (Runtime.runScript) thereafter, so that scripts evaluated
+    repeatedly are neither resent nor recompiled.
+
+    The ids of the compiled scripts are keyed by execution context id and the digest of the source.
+    They are discarded when their execution context is destroyed or all contexts are cleared.
+    If a compiled script is gone nonetheless, the script is evaluated (Runtime.evaluate) instead
+    and compiled again the next time it is run.
+    """
+
+    __slots__ = [
+        "_client",
+        "_compiled",
+        "_compiling",
+        "_enabled",
+        "_fallbacks",
+        "_generation",
+        "_hits",
+        "_loop",
+        "_scripts",
+    ]
+
+    def __init__(self, client: Union["ConnectionType", "SessionType"]) -> None:
+        """Construct a new instance of ScriptRegistry
+
+        :param client: The connection or session the scripts are run in
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._loop: AbstractEventLoop = client.loop
+        self._scripts: Dict[ScriptKey, str] = {}
+        self._compiling: Dict[ScriptKey, Future] = {}
+        self._generation: int = 0
+        self._enabled: bool = False
+        self._compiled: int = 0
+        self._hits: int = 0
+        self._fallbacks: int = 0
+
+    @property
+    def compiled(self) -> int:
+        """Returns the number of scripts compiled"""
+        return self._compiled
+
+    @property
+    def hits(self) -> int:
+        """Returns the number of times an already compiled script was run"""
+        return self._hits
+
+    @property
+    def fallbacks(self) -> int:
+        """Returns the number of times a script was evaluated because its compiled script was gone"""
+        return self._fallbacks
+
+    async def enable(self) -> None:
+        """Starts discarding the compiled scripts of destroyed execution contexts (Runtime.enable)"""
+        if self._enabled:
+            return
+        self._enabled = True
+        self._client.on("Runtime.executionContextDestroyed", self._on_context_destroyed)
+        self._client.on("Runtime.executionContextsCleared", self._on_contexts_cleared)
+        await self._client.send("Runtime.enable")
+
+    def disable(self) -> None:
+        """Stops listening for execution contexts being destroyed and discards all compiled scripts"""
+        if self._enabled:
+            self._enabled = False
+            self._client.remove_listener("Runtime.executionContextDestroyed", self._on_context_destroyed)
+            self._client.remove_listener("Runtime.executionContextsCleared", self._on_contexts_cleared)
+        self.clear()
+
+    def clear(self) -> None:
+        """Discards all compiled scripts"""
+        self._generation += 1
+        self._scripts.clear()
+
+    def script_id(self, source: str, context_id: Optional[int] = None) -> Optional[str]:
+        """Returns the id of the compiled script
+
+        :param source: The source of the script
+        :param context_id: The id of the execution context the script was compiled in
+        :return: The id of the compiled script if the script is compiled
+        """
+        return self._scripts.get((context_id, script_digest(source)))
+
+    async def run(
+        self,
+        source: str,
+        context_id: Optional[int] = None,
+        return_by_value: bool = False,
+        await_promise: bool = False,
+        object_group: Optional[str] = None,
+        silent: bool = False,
+    ) -> Dict[str, Any]:
+        """Runs the script in the execution context compiling it first if it is not already compiled
+
+        :param source: The source of the script
+        :param context_id: The id of the execution context, defaults to the context of the inspected page
+        :param return_by_value: Should the result be returned by value
+        :param await_promise: Should the result be awaited if it is a promise
+        :param object_group: The symbolic group name the result is placed in
+        :param silent: Should exceptions thrown be ignored by the debugger
+        :return: The result of Runtime.runScript, i.e. the result and the exception details if any.
+        If the script fails to compile the exception details of Runtime.compileScript
+        """
+        key = (context_id, script_digest(source))
+        script_id = self._scripts.get(key)
+        if script_id is not None:
+            self._hits += 1
+        else:
+            compiled = await self._compile(key, source)
+            script_id = compiled.get("scriptId")
+            if script_id is None:
+                return {"exceptionDetails": compiled.get("exceptionDetails")}
+        params: Dict[str, Any] = {"scriptId": script_id}
+        if context_id is not None:
+            params["executionContextId"] = context_id
+        if return_by_value:
+            params["returnByValue"] = True
+        if await_promise:
+            params["awaitPromise"] = True
+        if object_group is not None:
+            params["objectGroup"] = object_group
+        if silent:
+            params["silent"] = True
+        try:
+            return await self._client.send("Runtime.runScript", params)
+        except ProtocolError:
+            # the compiled script is gone, e.g. its context was destroyed before we were told
+            if self._scripts.get(key) == script_id:
+                del self._scripts[key]
+            self._fallbacks += 1
+        del params["scriptId"]
+        if context_id is not None:
+            del params["executionContextId"]
+            params["contextId"] = context_id
+        params["expression"] = source
+        return await self._client.send("Runtime.evaluate", params)
+
+    async def _compile(self, key: ScriptKey, source: str) -> Dict[str, Any]:
+        """Compiles the script, concurrent compilations of the same script in the same context share one command.
+        Cancelling a caller does not cancel the compilation the other callers wait for
+
+        :param key: The key of the script
+        :param source: The source of the script
+        :return: The result of Runtime.compileScript
+        """
+        return await share_inflight(self._compiling, key, partial(self._send_compile, key, source), self._loop)
+
+    async def _send_compile(self, key: ScriptKey, source: str) -> Dict[str, Any]:
+        """Sends Runtime.compileScript recording the id of the compiled script
+
+        :param key: The key of the script
+        :param source: The source of the script
+        :return: The result of Runtime.compileScript
+        """
+        generation = self._generation
+        params: Dict[str, Any] = {"expression": source, "sourceURL": "", "persistScript": True}
+        if key[0] is not None:
+            params["executionContextId"] = key[0]
+        result = await self._client.send("Runtime.compileScript", params)
+        script_id = result.get("scriptId")
+        if script_id is not None:
+            self._compiled += 1
+            # the context may have been destroyed while the script was being compiled
+            if generation == self._generation:
+                self._scripts[key] = script_id
+        return result
+
+    def _on_context_destroyed(self, event: Dict) -> None:
+        context_id = event["executionContextId"]
+        stale = [key for key in self._scripts if key[0] == context_id]
+        if stale:
+            self._generation += 1
+            for key in stale:
+                del self._scripts[key]
+
+    def _on_contexts_cleared(self, event: Optional[Dict] = None) -> None:
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self._scripts)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(scripts={len(self._scripts)}, compiled={self._compiled}, "
+            f"hits={self._hits}, fallbacks={self._fallbacks})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,203 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from .dom_mirror import DOMMirror
+
+__all__ = ["SelectorCache"]
+
+#: root nodeId, selector, all matches
+SelectorKey = Tuple[int, str, bool]
+SelectorResult = Union[int, List[int]]
+
+
+class SelectorCache:
+    """A size bounded LRU cache of the results of DOM.querySelector and DOM.querySelectorAll
+    keyed by root nodeId and selector.
+
+    Cached results are invalidated using the DOMMirror of the page: a child node being inserted
+    or removed, or an attribute being modified or removed, invalidates the results of the queries
+    whose root is the affected node, one of its ancestors or one of its descendants, as selectors
+    are matched in the context of the entire document. The cache is emptied when the document
+    is updated.
+    """
+
+    __slots__ = [
+        "_entries",
+        "_generation",
+        "_hits",
+        "_invalidations",
+        "_listening",
+        "_maxsize",
+        "_mirror",
+        "_misses",
+    ]
+
+    def __init__(self, mirror: DOMMirror, maxsize: int = 512) -> None:
+        """Construct a new instance of SelectorCache
+
+        :param mirror: The mirror of the DOM of the page the queries are made against
+        :param maxsize: The maximum number of results cached
+        """
+        self._mirror: DOMMirror = mirror
+        self._maxsize: int = maxsize
+        self._entries: "OrderedDict[SelectorKey, SelectorResult]" = OrderedDict()
+        self._generation: int = 0
+        self._hits: int = 0
+        self._misses: int = 0
+        self._invalidations: int = 0
+        self._listening: bool = False
+
+    @property
+    def hits(self) -> int:
+        """Returns the number of queries answered from the cache"""
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """Returns the number of queries sent to the remote instance"""
+        return self._misses
+
+    @property
+    def invalidations(self) -> int:
+        """Returns the number of results invalidated by mutations"""
+        return self._invalidations
+
+    async def query_selector(self, node_id: int, selector: str) -> int:
+        """Returns the nodeId of the first node matching the selector (DOM.querySelector)
+
+        :param node_id: The id of the node to query upon
+        :param selector: The selector string
+        :return: The id of the matching node, 0 if no node matches
+        """
+        return await self._query(node_id, selector, False)
+
+    async def query_selector_all(self, node_id: int, selector: str) -> List[int]:
+        """Returns the nodeIds of the nodes matching the selector (DOM.querySelectorAll)
+
+        :param node_id: The id of the node to query upon
+        :param selector: The selector string
+        :return: The ids of the matching nodes
+        """
+        return list(await self._query(node_id, selector, True))
+
+    def invalidate(self, node_id: Optional[int] = None) -> None:
+        """Invalidates the results affected by a mutation of the node or, if no node is supplied, all results
+
+        :param node_id: The id of the mutated node
+        """
+        self._generation += 1
+        if node_id is None:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            return
+        affected = self._affected_roots(node_id)
+        stale = [key for key in self._entries if affected is None or key[0] in affected]
+        for key in stale:
+            del self._entries[key]
+        self._invalidations += len(stale)
+
+    def clear(self) -> None:
+        """Empties the cache and resets the stats"""
+        self._generation += 1
+        self._entries.clear()
+        self._hits = self._misses = self._invalidations = 0
+
+    def close(self) -> None:
+        """Stops listening for mutations and empties the cache"""
+        if self._listening:
+            self._listening = False
+            client = self._mirror.client
+            client.remove_listener("DOM.childNodeInserted", self._on_child_nodes_changed)
+            client.remove_listener("DOM.childNodeRemoved", self._on_child_nodes_changed)
+            client.remove_listener("DOM.childNodeCountUpdated", self._on_node_changed)
+            client.remove_listener("DOM.attributeModified", self._on_node_changed)
+            client.remove_listener("DOM.attributeRemoved", self._on_node_changed)
+            client.remove_listener("DOM.documentUpdated", self._on_document_updated)
+        self.clear()
+
+    async def _query(self, node_id: int, selector: str, all_matches: bool) -> SelectorResult:
+        if not self._listening:
+            self._listen()
+        key = (node_id, selector, all_matches)
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return result
+        self._misses += 1
+        generation = self._generation
+        params = {"nodeId": node_id, "selector": selector}
+        if all_matches:
+            result = (await self._mirror.client.send("DOM.querySelectorAll", params))["nodeIds"]
+        else:
+            result = (await self._mirror.client.send("DOM.querySelector", params))["nodeId"]
+        # a result whose query raced a mutation may already be stale
+        if generation == self._generation:
+            self._entries[key] = result
+            if len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def _listen(self) -> None:
+        self._listening = True
+        client = self._mirror.client
+        client.on("DOM.childNodeInserted", self._on_child_nodes_changed)
+        client.on("DOM.childNodeRemoved", self._on_child_nodes_changed)
+        client.on("DOM.childNodeCountUpdated", self._on_node_changed)
+        client.on("DOM.attributeModified", self._on_node_changed)
+        client.on("DOM.attributeRemoved", self._on_node_changed)
+        client.on("DOM.documentUpdated", self._on_document_updated)
+
+    def _affected_roots(self, node_id: int) -> Optional[Set[int]]:
+        """Returns the ids of the cached roots whose results a mutation of the node may affect
+
+        :param node_id: The id of the mutated node
+        :return: The ids of the affected roots, None if all roots may be affected
+        """
+        mirror = self._mirror
+        node = mirror.get(node_id)
+        if node is None:
+            return None
+        ancestry: Set[int] = set()
+        while node is not None:
+            ancestry.add(node.node_id)
+            node = node.parent
+        affected: Set[int] = set()
+        roots: Set[int] = {key[0] for key in self._entries}
+        for root_id in roots:
+            if root_id in ancestry:
+                affected.add(root_id)
+                continue
+            root = mirror.get(root_id)
+            if root is None:
+                # the root is no longer known, e.g. it was removed along with the mutated node
+                affected.add(root_id)
+                continue
+            parent = root.parent
+            while parent is not None:
+                if parent.node_id == node_id:
+                    affected.add(root_id)
+                    break
+                parent = parent.parent
+        return affected
+
+    def _on_child_nodes_changed(self, event: Dict) -> None:
+        self.invalidate(event["parentNodeId"])
+
+    def _on_node_changed(self, event: Dict) -> None:
+        self.invalidate(event["nodeId"])
+
+    def _on_document_updated(self, event: Optional[Dict] = None) -> None:
+        self.invalidate()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(size={len(self._entries)}, hits={self._hits}, misses={self._misses}, "
+            f"invalidations={self._invalidations})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
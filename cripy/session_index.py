@@ -0,0 +1,120 @@
+from typing import Dict, Iterator, List, Optional, Set, TYPE_CHECKING
+from weakref import WeakValueDictionary
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import SessionType  # noqa: F401
+
+__all__ = ["SessionIndex"]
+
+
+class SessionIndex:
+    """Flat index of all the sessions of a connection, including the sessions
+    of sessions, keyed by their session id.
+
+    Attached sessions are strongly referenced by the index as messages for them can arrive
+    at any time. Once removed a session is only weakly referenced so that detached sessions
+    that are still alive, i.e. leaked, can be reported.
+    """
+
+    __slots__ = ["_children", "_detached", "_parents", "_sessions"]
+
+    def __init__(self) -> None:
+        self._sessions: Dict[str, "SessionType"] = {}
+        self._parents: Dict[str, Optional[str]] = {}
+        self._children: Dict[str, Set[str]] = {}
+        self._detached: "WeakValueDictionary[str, SessionType]" = WeakValueDictionary()
+
+    def add(self, session: "SessionType", parent_id: Optional[str] = None) -> None:
+        """Adds the session to the index
+
+        :param session: The session to be added
+        :param parent_id: The id of the session the session was created from,
+        None if it was created from the connection
+        """
+        session_id = session.session_id
+        self._sessions[session_id] = session
+        self._parents[session_id] = parent_id
+        self._detached.pop(session_id, None)
+        if parent_id is not None:
+            self._children.setdefault(parent_id, set()).add(session_id)
+
+    def get(self, session_id: str) -> Optional["SessionType"]:
+        """Returns the attached session associated with the supplied session id
+
+        :param session_id: The id of the session
+        :return: The session if it is attached
+        """
+        return self._sessions.get(session_id)
+
+    def parent_id(self, session_id: str) -> Optional[str]:
+        """Returns the id of the session the session associated with the supplied
+        session id was created from
+
+        :param session_id: The id of the session
+        :return: The id of the parent session or None if the session was created from the connection
+        """
+        return self._parents.get(session_id)
+
+    def children(self, session_id: str) -> List[str]:
+        """Returns the ids of the attached sessions created from the session
+        associated with the supplied session id
+
+        :param session_id: The id of the session
+        :return: The ids of the child sessions
+        """
+        return list(self._children.get(session_id, ()))
+
+    def remove(self, session_id: str) -> Optional["SessionType"]:
+        """Removes the session from the index, keeping only a weak reference to it
+
+        :param session_id: The id of the session
+        :return: The removed session if it was attached
+        """
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return None
+        parent_id = self._parents.pop(session_id, None)
+        if parent_id is not None:
+            siblings = self._children.get(parent_id)
+            if siblings is not None:
+                siblings.discard(session_id)
+                if not siblings:
+                    del self._children[parent_id]
+        self._detached[session_id] = session
+        return session
+
+    def remove_all(self) -> List["SessionType"]:
+        """Removes all sessions from the index
+
+        :return: The removed sessions
+        """
+        sessions = list(self._sessions.values())
+        for session in sessions:
+            self._detached[session.session_id] = session
+        self._sessions.clear()
+        self._parents.clear()
+        self._children.clear()
+        return sessions
+
+    def leaked(self) -> List[str]:
+        """Returns the ids of the sessions that were removed from the index but
+        are still referenced elsewhere.
+
+        :return: The ids of the leaked sessions
+        """
+        return list(self._detached.keys())
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __iter__(self) -> Iterator["SessionType"]:
+        return iter(list(self._sessions.values()))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(attached={len(self._sessions)}, detached={len(self._detached)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
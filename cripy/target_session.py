@@ -1,4 +1,5 @@
 from typing import Dict, TYPE_CHECKING, Union
+from weakref import proxy
 
 from .connection import CDPSession
 from .protocol import (
@@ -171,12 +172,18 @@ class TargetSession(CDPSession):
         session = TargetSession(
             connection, target_type, session_id, flat_session=self._flat_session
         )
-        if self._flat_session:
-            self._connection.add_session(session)
-        else:
-            self._sessions[session_id] = session
+        self._root.add_session(session, self)
         return session
 
+    def on_closed(self) -> None:
+        """Close this session and the sessions created from it"""
+        super().on_closed()
+        # the domains point back at this session, a weak reference breaks
+        # the cycle so that the session is freed once no longer referenced
+        session = proxy(self)
+        for domain in TargetSession.__slots__:
+            getattr(self, domain).client = session
+
 
 class TargetSessionDynamic(CDPSession):
     def __init__(
@@ -218,8 +225,14 @@ class TargetSessionDynamic(CDPSession):
             flat_session=self._flat_session,
             proto_def=self._proto_def,
         )
-        if self._flat_session:
-            self._connection.add_session(session)
-        else:
-            self._sessions[session_id] = session
+        self._root.add_session(session, self)
         return session
+
+    def on_closed(self) -> None:
+        """Close this session and the sessions created from it"""
+        super().on_closed()
+        # the domains point back at this session, a weak reference breaks
+        # the cycle so that the session is freed once no longer referenced
+        session = proxy(self)
+        for domain in self._proto_def:
+            getattr(self, domain).client = session
@@ -0,0 +1,398 @@
+import codecs
+import gzip
+from asyncio import Future
+from concurrent.futures import ThreadPoolExecutor
+from json import JSONDecoder
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, TYPE_CHECKING, Tuple, Union
+
+try:
+    from ujson import dumps
+except ImportError:
+    from json import dumps
+
+from .errors import ClientError
+from .io_stream import IOStream
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = [
+    "EventStats",
+    "TraceRecorder",
+    "TraceSummary",
+    "iter_trace_events",
+    "summarize_trace",
+]
+
+REPORT_EVENTS: str = "ReportEvents"
+RETURN_AS_STREAM: str = "ReturnAsStream"
+
+_GZIP_MAGIC: bytes = b"\x1f\x8b"
+_SKIPPABLE: str = " \t\r\n,"
+
+ThreadKey = Tuple[int, int]
+
+
+class TraceRecorder:
+    """Records a Chrome trace straight to a, optionally gzip compressed, file.
+
+    Using the ReportEvents transfer mode the trace events of each Tracing.dataCollected event are
+    appended to the file as they are received, the encoding, compression and writing being done
+    in a single writer thread, which keeps the chunks in order, so that the event loop is not blocked.
+    Using the ReturnAsStream transfer mode the trace is read from the IO stream returned by
+    Tracing.tracingComplete and written to the file chunk by chunk.
+    Either way the file contains the trace in the JSON Object Format, i.e. {"traceEvents": [...]}.
+    """
+
+    __slots__ = [
+        "_client",
+        "_compress",
+        "_compresslevel",
+        "_events_written",
+        "_file",
+        "_path",
+        "_recording",
+        "_transfer_mode",
+        "_write_error",
+        "_writer",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        path: str,
+        transfer_mode: str = REPORT_EVENTS,
+        compress: bool = True,
+        compresslevel: int = 6,
+    ) -> None:
+        """Construct a new instance of TraceRecorder
+
+        :param client: The connection or session to trace
+        :param path: The path to the file the trace is written to
+        :param transfer_mode: Either ReportEvents or ReturnAsStream
+        :param compress: Should the trace be gzip compressed
+        :param compresslevel: The gzip compression level used for the ReportEvents transfer mode
+        """
+        if transfer_mode not in (REPORT_EVENTS, RETURN_AS_STREAM):
+            raise ClientError(f"Unknown trace transfer mode: {transfer_mode}")
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._path: str = path
+        self._transfer_mode: str = transfer_mode
+        self._compress: bool = compress
+        self._compresslevel: int = compresslevel
+        self._file: Optional[IO[bytes]] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._write_error: Optional[BaseException] = None
+        self._recording: bool = False
+        self._events_written: int = 0
+
+    @property
+    def path(self) -> str:
+        """Returns the path to the file the trace is written to"""
+        return self._path
+
+    @property
+    def recording(self) -> bool:
+        """Returns T/F indicating if a trace is being recorded"""
+        return self._recording
+
+    @property
+    def events_written(self) -> int:
+        """Returns the number of trace events written when using the ReportEvents transfer mode"""
+        return self._events_written
+
+    async def start(self, categories: Optional[str] = None, trace_config: Optional[Dict[str, Any]] = None) -> None:
+        """Starts recording the trace
+
+        :param categories: Optional category/tag filter
+        :param trace_config: Optional trace config
+        """
+        if self._recording:
+            raise ClientError("The trace is already being recorded")
+        params: Dict[str, Any] = {"transferMode": self._transfer_mode}
+        if categories is not None:
+            params["categories"] = categories
+        if trace_config is not None:
+            params["traceConfig"] = trace_config
+        if self._transfer_mode == RETURN_AS_STREAM:
+            params["streamFormat"] = "json"
+            params["streamCompression"] = "gzip" if self._compress else "none"
+        else:
+            self._writer = ThreadPoolExecutor(1)
+            self._write_error = None
+            self._events_written = 0
+            try:
+                await self._write(self._open_file)
+            except Exception:
+                self._writer.shutdown(wait=False)
+                self._writer = None
+                raise
+            self._client.on("Tracing.dataCollected", self._on_data_collected)
+        self._recording = True
+        try:
+            await self._client.send("Tracing.start", params)
+        except Exception:
+            self._recording = False
+            if self._transfer_mode == REPORT_EVENTS:
+                self._client.remove_listener("Tracing.dataCollected", self._on_data_collected)
+                await self._finish_file()
+            raise
+
+    async def stop(self) -> str:
+        """Stops recording the trace and waits for the trace to be written
+
+        :return: The path to the file the trace was written to
+        """
+        if not self._recording:
+            raise ClientError("The trace is not being recorded")
+        complete = self._client.loop.create_future()
+
+        def on_complete(event: Dict) -> None:
+            if not complete.done():
+                complete.set_result(event)
+
+        self._client.once("Tracing.tracingComplete", on_complete)
+        try:
+            await self._client.send("Tracing.end")
+            event = await complete
+        finally:
+            self._recording = False
+            if self._transfer_mode == REPORT_EVENTS:
+                self._client.remove_listener("Tracing.dataCollected", self._on_data_collected)
+                await self._finish_file()
+        if self._transfer_mode == RETURN_AS_STREAM:
+            await IOStream(self._client, event["stream"]).to_file(self._path)
+        return self._path
+
+    def _write(self, fn: Any, *args: Any) -> Future:
+        """Runs the file operation in the writer thread, after the operations submitted before it
+
+        :param fn: The file operation
+        :param args: The arguments of the operation
+        :return: A future resolved once the operation has run
+        """
+        return self._client.loop.run_in_executor(self._writer, fn, *args)
+
+    async def _finish_file(self) -> None:
+        """Waits for the pending writes, closes the file and raises the first error writing the trace if any"""
+        try:
+            await self._write(self._close_file)
+        finally:
+            self._writer.shutdown(wait=False)
+            self._writer = None
+        error = self._write_error
+        if error is not None:
+            self._write_error = None
+            raise error
+
+    def _open_file(self) -> None:
+        """Opens the file the trace events are written to, runs in the writer thread"""
+        if self._compress:
+            self._file = gzip.open(self._path, "wb", compresslevel=self._compresslevel)
+        else:
+            self._file = open(self._path, "wb")
+        self._file.write(b'{"traceEvents":[')
+
+    def _close_file(self) -> None:
+        """Terminates the trace events and closes the file, runs in the writer thread"""
+        if self._file is None:
+            return
+        try:
+            self._file.write(b"]}")
+        finally:
+            self._file.close()
+            self._file = None
+
+    def _write_events(self, values: List[Dict], first: bool) -> None:
+        """Appends the trace events to the file, runs in the writer thread
+
+        :param values: The trace events
+        :param first: T/F indicating if these are the first trace events written
+        """
+        if self._file is None or self._write_error is not None:
+            return
+        try:
+            chunk = ",".join(dumps(value) for value in values)
+            if not first:
+                chunk = "," + chunk
+            self._file.write(chunk.encode("utf-8"))
+        except Exception as e:
+            # reported by stop, the remaining trace events are dropped
+            self._write_error = e
+
+    def _on_data_collected(self, event: Dict) -> None:
+        """Queues the trace events of the Tracing.dataCollected event to be appended to the file
+
+        :param event: The Tracing.dataCollected event
+        """
+        values = event.get("value")
+        if not values or self._writer is None:
+            return
+        self._write(self._write_events, values, self._events_written == 0)
+        self._events_written += len(values)
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(path={self._path}, transfer_mode={self._transfer_mode}, "
+            f"recording={self._recording})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def iter_trace_events(path: str, read_size: int = 1 << 16) -> Iterator[Dict]:
+    """Yields the trace events of the trace file at the supplied path one at a time
+    without loading the entire trace.
+
+    Both the JSON Object Format ({"traceEvents": [...]}) and the JSON Array Format ([...])
+    are supported, optionally gzip compressed.
+
+    :param path: The path to the trace file
+    :param read_size: The number of bytes read from the file at a time
+    :return: An iterator of the trace events
+    """
+    with open(path, "rb") as peek:
+        compressed = peek.read(2) == _GZIP_MAGIC
+    fp: IO[bytes] = gzip.open(path, "rb") if compressed else open(path, "rb")
+    with fp:
+        yield from _iter_events(fp, read_size)
+
+
+def _iter_events(fp: IO[bytes], read_size: int) -> Iterator[Dict]:
+    """Incrementally decodes the trace events contained in the supplied file
+
+    :param fp: The binary file containing the trace
+    :param read_size: The number of bytes read from the file at a time
+    :return: An iterator of the trace events
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    raw_decode = JSONDecoder().raw_decode
+    buf = ""
+    eof = False
+
+    def fill(keep_from: int) -> bool:
+        nonlocal buf, eof
+        if eof:
+            return False
+        data = fp.read(read_size)
+        eof = not data
+        buf = buf[keep_from:] + decoder.decode(data, final=eof)
+        return True
+
+    # locate the start of the trace events array
+    pos = -1
+    while pos == -1:
+        stripped = buf.lstrip()
+        if stripped.startswith("["):
+            pos = buf.index("[") + 1
+        elif stripped.startswith("{"):
+            key = buf.find('"traceEvents"')
+            start = buf.find("[", key) if key != -1 else -1
+            if start != -1:
+                pos = start + 1
+        if pos == -1 and not fill(0):
+            return
+
+    while True:
+        end = len(buf)
+        while pos < end and buf[pos] in _SKIPPABLE:
+            pos += 1
+        if pos == end:
+            if not fill(pos):
+                return
+            pos = 0
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            event, pos = raw_decode(buf, pos)
+        except ValueError:
+            if not fill(pos):
+                raise
+            pos = 0
+            continue
+        yield event
+
+
+class EventStats:
+    """The number of trace events and their total duration, in microseconds"""
+
+    __slots__ = ["count", "duration"]
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.duration: float = 0.0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(count={self.count}, duration={self.duration})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class TraceSummary:
+    """Per category and per thread aggregates of trace events, built one event at a time"""
+
+    __slots__ = ["categories", "event_count", "thread_names", "threads"]
+
+    def __init__(self) -> None:
+        self.event_count: int = 0
+        self.categories: Dict[str, EventStats] = {}
+        self.threads: Dict[ThreadKey, EventStats] = {}
+        self.thread_names: Dict[ThreadKey, str] = {}
+
+    def add(self, event: Dict) -> None:
+        """Adds the trace event to the aggregates
+
+        :param event: The trace event
+        """
+        self.event_count += 1
+        thread = (event.get("pid", 0), event.get("tid", 0))
+        if event.get("ph") == "M":
+            if event.get("name") == "thread_name":
+                self.thread_names[thread] = event.get("args", {}).get("name", "")
+            return
+        duration = event.get("dur", 0)
+        categories = self.categories
+        for category in event.get("cat", "").split(","):
+            stats = categories.get(category)
+            if stats is None:
+                stats = categories[category] = EventStats()
+            stats.count += 1
+            stats.duration += duration
+        stats = self.threads.get(thread)
+        if stats is None:
+            stats = self.threads[thread] = EventStats()
+        stats.count += 1
+        stats.duration += duration
+
+    def add_all(self, events: Iterable[Dict]) -> "TraceSummary":
+        """Adds the trace events to the aggregates
+
+        :param events: The trace events
+        :return: This summary
+        """
+        add = self.add
+        for event in events:
+            add(event)
+        return self
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(events={self.event_count}, categories={len(self.categories)}, "
+            f"threads={len(self.threads)})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def summarize_trace(path: str) -> TraceSummary:
+    """Builds the per category and per thread aggregates of the trace file at the supplied path
+    without loading the entire trace
+
+    :param path: The path to the trace file
+    :return: The summary of the trace
+    """
+    return TraceSummary().add_all(iter_trace_events(path))
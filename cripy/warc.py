@@ -0,0 +1,485 @@
+import gzip
+import os
+import shutil
+from asyncio import AbstractEventLoop, Future, Semaphore, gather
+from binascii import a2b_base64
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from hashlib import sha256
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, Callable, Dict, List, Optional, Set, TYPE_CHECKING, Tuple, Union
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+from .errors import ClientError, NetworkError, ProtocolError
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["WARCArchiver", "WARCWriter"]
+
+WARC_VERSION: bytes = b"WARC/1.1"
+_CRLF: bytes = b"\r\n"
+#: Number of base64 characters decoded at a time, a multiple of 4
+_DECODE_CHUNK: int = 1 << 20
+#: Response headers describing the encoding of the body as transferred,
+#: which no longer apply to the decoded body returned by Network.getResponseBody
+_TRANSFER_HEADERS = frozenset(["content-encoding", "content-length", "transfer-encoding"])
+
+HeaderList = List[Tuple[str, str]]
+
+
+def _warc_date() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _record_id() -> str:
+    return f"<urn:uuid:{uuid4()}>"
+
+
+class WARCWriter:
+    """Writes WARC records, each as its own gzip member, to a series of files.
+
+    Once the current file exceeds max_size a new file is started, every file begins with a
+    warcinfo record. Record blocks are copied from file objects so that large payloads are
+    never held whole in memory.
+
+    Writing is synchronous, archivers writing from the event loop do so in the I/O thread
+    of the writer, one record at a time, so that the compression and writes do not block it.
+    """
+
+    __slots__ = [
+        "_compresslevel",
+        "_directory",
+        "_file",
+        "_io",
+        "_max_size",
+        "_paths",
+        "_prefix",
+        "_records_written",
+        "_serial",
+        "_warcinfo",
+    ]
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "cripy",
+        max_size: int = 1 << 30,
+        compresslevel: int = 6,
+        warcinfo: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Construct a new instance of WARCWriter
+
+        :param directory: The directory the WARC files are written to
+        :param prefix: The prefix of the names of the WARC files
+        :param max_size: The size, in bytes, after which a new WARC file is started
+        :param compresslevel: The gzip compression level
+        :param warcinfo: Additional fields of the warcinfo records
+        """
+        self._directory: str = directory
+        self._prefix: str = prefix
+        self._max_size: int = max_size
+        self._compresslevel: int = compresslevel
+        self._warcinfo: Dict[str, str] = {"software": "cripy", "format": "WARC File Format 1.1"}
+        if warcinfo:
+            self._warcinfo.update(warcinfo)
+        self._file: Optional[IO[bytes]] = None
+        self._io: Optional[ThreadPoolExecutor] = None
+        self._paths: List[str] = []
+        self._serial: int = 0
+        self._records_written: int = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def paths(self) -> List[str]:
+        """Returns the paths of the WARC files written so far"""
+        return list(self._paths)
+
+    @property
+    def records_written(self) -> int:
+        """Returns the number of records written"""
+        return self._records_written
+
+    def write_record(
+        self,
+        warc_type: str,
+        fields: HeaderList,
+        block: Union[bytes, IO[bytes]],
+        length: Optional[int] = None,
+        content_type: Optional[str] = None,
+    ) -> str:
+        """Writes a record
+
+        :param warc_type: The type of the record, e.g. response
+        :param fields: The additional named fields of the record
+        :param block: The content block, either bytes or a file object positioned at its start
+        :param length: The length of the block when it is a file object
+        :param content_type: The content type of the block
+        :return: The id of the record
+        """
+        if self._file is None or self._file.tell() >= self._max_size:
+            self._rotate()
+        return self._write(warc_type, fields, block, length, content_type)
+
+    def write_response(
+        self,
+        url: str,
+        status: int,
+        status_text: str,
+        headers: Dict[str, str],
+        payload: IO[bytes],
+        payload_length: int,
+        payload_digest: Optional[str] = None,
+    ) -> str:
+        """Writes a response record whose block is the HTTP response
+
+        :param url: The URL of the response
+        :param status: The status code of the response
+        :param status_text: The status text of the response
+        :param headers: The response headers
+        :param payload: File object positioned at the start of the decoded response body
+        :param payload_length: The length of the body
+        :param payload_digest: The WARC-Payload-Digest of the body, e.g. sha256:...
+        :return: The id of the record
+        """
+        lines = [f"HTTP/1.1 {status} {status_text}".rstrip()]
+        for name, value in headers.items():
+            if name.lower() not in _TRANSFER_HEADERS:
+                for line in value.split("\n"):
+                    lines.append(f"{name}: {line}")
+        lines.append(f"Content-Length: {payload_length}")
+        http_headers = ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+        fields = [("WARC-Target-URI", url)]
+        if payload_digest is not None:
+            fields.append(("WARC-Payload-Digest", payload_digest))
+        return self.write_record(
+            "response",
+            fields,
+            _ConcatReader(http_headers, payload),
+            len(http_headers) + payload_length,
+            "application/http;msgtype=response",
+        )
+
+    def write_request(
+        self,
+        url: str,
+        method: str,
+        headers: Dict[str, str],
+        body: bytes = b"",
+        concurrent_to: Optional[str] = None,
+    ) -> str:
+        """Writes a request record whose block is the HTTP request
+
+        :param url: The URL of the request
+        :param method: The HTTP method of the request
+        :param headers: The request headers
+        :param body: The request body
+        :param concurrent_to: The id of the response record of the request
+        :return: The id of the record
+        """
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        lines = [f"{method} {target} HTTP/1.1"]
+        if not any(name.lower() == "host" for name in headers):
+            lines.append(f"Host: {parts.netloc}")
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        block = ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + body
+        fields = [("WARC-Target-URI", url)]
+        if concurrent_to is not None:
+            fields.append(("WARC-Concurrent-To", concurrent_to))
+        return self.write_record("request", fields, block, content_type="application/http;msgtype=request")
+
+    def close(self) -> None:
+        """Closes the current WARC file, waiting for the records being written in the I/O thread"""
+        if self._io is not None:
+            self._io.shutdown(wait=True)
+            self._io = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _in_io_thread(self, loop: AbstractEventLoop, fn: Callable[..., Any], *args: Any) -> Future:
+        """Runs the function in the I/O thread of the writer after the functions submitted before it"""
+        if self._io is None:
+            self._io = ThreadPoolExecutor(1)
+        return loop.run_in_executor(self._io, fn, *args)
+
+    def _rotate(self) -> None:
+        """Starts a new WARC file beginning with a warcinfo record"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._serial += 1
+        filename = f"{self._prefix}-{datetime.now(timezone.utc):%Y%m%d%H%M%S}-{self._serial:05d}.warc.gz"
+        path = os.path.join(self._directory, filename)
+        self._file = open(path, "wb")
+        self._paths.append(path)
+        info = "".join(f"{name}: {value}\r\n" for name, value in self._warcinfo.items()).encode("utf-8")
+        self._write("warcinfo", [("WARC-Filename", filename)], info, None, "application/warc-fields")
+
+    def _write(
+        self,
+        warc_type: str,
+        fields: HeaderList,
+        block: Union[bytes, IO[bytes]],
+        length: Optional[int],
+        content_type: Optional[str],
+    ) -> str:
+        """Writes the record as a gzip member of the current WARC file"""
+        if isinstance(block, bytes):
+            length = len(block)
+        elif length is None:
+            raise ClientError("The length of a block read from a file object is required")
+        record_id = _record_id()
+        header = [
+            WARC_VERSION,
+            f"WARC-Type: {warc_type}".encode("utf-8"),
+            f"WARC-Record-ID: {record_id}".encode("utf-8"),
+            f"WARC-Date: {_warc_date()}".encode("utf-8"),
+        ]
+        header.extend(f"{name}: {value}".encode("utf-8") for name, value in fields)
+        if content_type is not None:
+            header.append(f"Content-Type: {content_type}".encode("utf-8"))
+        header.append(f"Content-Length: {length}".encode("utf-8"))
+        with gzip.GzipFile(fileobj=self._file, mode="wb", compresslevel=self._compresslevel) as member:
+            member.write(_CRLF.join(header) + _CRLF + _CRLF)
+            if isinstance(block, bytes):
+                member.write(block)
+            else:
+                shutil.copyfileobj(block, member)
+            member.write(_CRLF + _CRLF)
+        self._records_written += 1
+        return record_id
+
+    def __enter__(self) -> "WARCWriter":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __str__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(directory={self._directory}, files={len(self._paths)}, "
+            f"records={self._records_written})"
+        )
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class _ConcatReader:
+    """Minimal file object reading the supplied bytes followed by the contents of a file object"""
+
+    __slots__ = ["_head", "_tail"]
+
+    def __init__(self, head: bytes, tail: IO[bytes]) -> None:
+        self._head: bytes = head
+        self._tail: IO[bytes] = tail
+
+    def read(self, size: int = -1) -> bytes:
+        if self._head:
+            if size < 0 or size >= len(self._head):
+                head, self._head = self._head, b""
+                return head + self._tail.read(size - len(head) if size >= 0 else -1)
+            head, self._head = self._head[:size], self._head[size:]
+            return head
+        return self._tail.read(size)
+
+
+class _Exchange:
+    """The request and response of a requestId, correlated from the Network events"""
+
+    __slots__ = ["request", "response"]
+
+    def __init__(self, request: Dict) -> None:
+        self.request: Dict = request
+        self.response: Optional[Dict] = None
+
+
+class WARCArchiver:
+    """Archives the exchanges of a page to a WARCWriter.
+
+    Network.requestWillBeSent, Network.responseReceived and Network.loadingFinished are correlated
+    by requestId and, once loading has finished, the body is retrieved (Network.getResponseBody)
+    with bounded concurrency. The body is decoded into a temporary file that is kept in memory only
+    while small and is then copied into the record, both in the I/O thread of the writer.
+    """
+
+    __slots__ = [
+        "_archived",
+        "_client",
+        "_enabled",
+        "_exchanges",
+        "_failed",
+        "_limiter",
+        "_loop",
+        "_spool_size",
+        "_tasks",
+        "_writer",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        writer: WARCWriter,
+        max_concurrency: int = 6,
+        spool_size: int = 1 << 20,
+    ) -> None:
+        """Construct a new instance of WARCArchiver
+
+        :param client: The connection or session of the page to archive
+        :param writer: The writer the records are written with
+        :param max_concurrency: The maximum number of response bodies retrieved, or waiting to be written, concurrently
+        :param spool_size: The size, in bytes, above which decoded bodies are spooled to disk
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._loop: AbstractEventLoop = client.loop
+        self._writer: WARCWriter = writer
+        self._limiter: Semaphore = Semaphore(max(1, max_concurrency))
+        self._spool_size: int = spool_size
+        self._exchanges: Dict[str, _Exchange] = {}
+        self._tasks: Set[Future] = set()
+        self._enabled: bool = False
+        self._archived: int = 0
+        self._failed: int = 0
+
+    @property
+    def archived(self) -> int:
+        """Returns the number of exchanges archived"""
+        return self._archived
+
+    @property
+    def failed(self) -> int:
+        """Returns the number of exchanges whose body could not be retrieved"""
+        return self._failed
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of exchanges being correlated or archived"""
+        return len(self._exchanges) + len(self._tasks)
+
+    async def enable(self) -> None:
+        """Starts archiving (Network.enable)"""
+        if self._enabled:
+            return
+        self._enabled = True
+        self._client.on("Network.requestWillBeSent", self._on_request_will_be_sent)
+        self._client.on("Network.responseReceived", self._on_response_received)
+        self._client.on("Network.loadingFinished", self._on_loading_finished)
+        self._client.on("Network.loadingFailed", self._on_loading_failed)
+        await self._client.send("Network.enable")
+
+    async def disable(self) -> None:
+        """Stops archiving waiting for the bodies being retrieved to be archived.
+        Exchanges that have not finished loading are discarded
+        """
+        if not self._enabled:
+            return
+        self._enabled = False
+        self._client.remove_listener("Network.requestWillBeSent", self._on_request_will_be_sent)
+        self._client.remove_listener("Network.responseReceived", self._on_response_received)
+        self._client.remove_listener("Network.loadingFinished", self._on_loading_finished)
+        self._client.remove_listener("Network.loadingFailed", self._on_loading_failed)
+        self._exchanges.clear()
+        await self.wait()
+
+    async def wait(self) -> None:
+        """Waits for the bodies being retrieved to be archived"""
+        while self._tasks:
+            await gather(*self._tasks, return_exceptions=True)
+
+    def _on_request_will_be_sent(self, event: Dict) -> None:
+        request = event["request"]
+        if request["url"].startswith("data:"):
+            return
+        request_id = event["requestId"]
+        redirect = event.get("redirectResponse")
+        previous = self._exchanges.get(request_id)
+        if redirect is not None and previous is not None:
+            previous.response = redirect
+            self._track(self._writer._in_io_thread(self._loop, self._archive, previous, None))
+        self._exchanges[request_id] = _Exchange(request)
+
+    def _on_response_received(self, event: Dict) -> None:
+        exchange = self._exchanges.get(event["requestId"])
+        if exchange is not None:
+            exchange.response = event["response"]
+
+    def _on_loading_finished(self, event: Dict) -> None:
+        request_id = event["requestId"]
+        exchange = self._exchanges.pop(request_id, None)
+        if exchange is None or exchange.response is None:
+            return
+        self._track(self._loop.create_task(self._archive_with_body(request_id, exchange)))
+
+    def _track(self, future: Future) -> None:
+        """Keeps the future archiving an exchange until it is done so that wait can wait for it"""
+        self._tasks.add(future)
+        future.add_done_callback(self._tasks.discard)
+
+    def _on_loading_failed(self, event: Dict) -> None:
+        self._exchanges.pop(event["requestId"], None)
+
+    async def _archive_with_body(self, request_id: str, exchange: _Exchange) -> None:
+        """Retrieves the body of the exchange then archives it, at most max_concurrency at a time.
+        The body is held under the limiter until it is written so that at most max_concurrency bodies
+        are in memory when the writer is slower than the retrievals
+        """
+        async with self._limiter:
+            try:
+                body = await self._client.send("Network.getResponseBody", {"requestId": request_id})
+            except (NetworkError, ProtocolError):
+                self._failed += 1
+                return
+            await self._writer._in_io_thread(self._loop, self._archive, exchange, body)
+
+    def _archive(self, exchange: _Exchange, body: Optional[Dict]) -> None:
+        """Writes the response and request records of the exchange, runs in the I/O thread of the writer
+
+        :param exchange: The exchange
+        :param body: The result of Network.getResponseBody, None if the response has no body
+        """
+        with SpooledTemporaryFile(max_size=self._spool_size) as payload:
+            digest = sha256()
+            if body is not None:
+                data = body.get("body", "")
+                if body.get("base64Encoded"):
+                    for start in range(0, len(data), _DECODE_CHUNK):
+                        chunk = a2b_base64(data[start : start + _DECODE_CHUNK])
+                        digest.update(chunk)
+                        payload.write(chunk)
+                else:
+                    for start in range(0, len(data), _DECODE_CHUNK):
+                        chunk = data[start : start + _DECODE_CHUNK].encode("utf-8")
+                        digest.update(chunk)
+                        payload.write(chunk)
+            length = payload.tell()
+            payload.seek(0)
+            request = exchange.request
+            response = exchange.response
+            response_id = self._writer.write_response(
+                request["url"],
+                response.get("status", 0),
+                response.get("statusText", ""),
+                response.get("headers", {}),
+                payload,
+                length,
+                f"sha256:{digest.hexdigest()}",
+            )
+        self._writer.write_request(
+            request["url"],
+            request.get("method", "GET"),
+            request.get("headers", {}),
+            request.get("postData", "").encode("utf-8"),
+            response_id,
+        )
+        self._archived += 1
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(archived={self._archived}, pending={self.pending}, failed={self._failed})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
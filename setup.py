@@ -28,7 +28,7 @@ setup(
         "websockets"
     ],
     package_data={"": ["templates/simple/*.j2", "templates/full/*.j2"]},
-    extras_require={"speed": ["uvloop", "ujson", "aiodns"], "win-speed": ["ujson", "aiodns"]},
+    extras_require={"speed": ["uvloop", "ujson", "aiodns"], "win-speed": ["ujson", "aiodns"], "columnar": ["numpy"]},
     include_package_data=True,
     zip_safe=False,
     license="Apache",
@@ -1,6 +1,9 @@
 from .chrome import launch_chrome
 from .utils import (
     Cleaner,
+    EventSource,
+    HeapNode,
+    write_heap_snapshot,
     evaluation_result,
     make_target_selector,
     get_target_from_list,
@@ -9,6 +12,9 @@ from .utils import (
 __all__ = [
     "launch_chrome",
     "Cleaner",
+    "EventSource",
+    "HeapNode",
+    "write_heap_snapshot",
     "evaluation_result",
     "make_target_selector",
     "get_target_from_list",
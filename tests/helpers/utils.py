@@ -1,4 +1,7 @@
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import inspect
+import json
+from asyncio import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import attr
 from pyee2 import EventEmitter, EventEmitterS
@@ -7,6 +10,9 @@ from cripy import CDP, Client, Connection
 
 __all__ = [
     "Cleaner",
+    "EventSource",
+    "HeapNode",
+    "write_heap_snapshot",
     "evaluation_result",
     "make_target_selector",
     "get_target_from_list",
@@ -17,6 +23,43 @@ EE = Union[EventEmitter, EventEmitterS]
 EEListener = Dict[str, Union[str, EE, Callable]]
 
 
+class EventSource(EventEmitterS):
+    """Stands in for a connection or session, emitting only the events it is fed and
+    answering commands using the supplied handler"""
+
+    def __init__(self, handler: Optional[Callable[[str, Optional[Dict]], Any]] = None) -> None:
+        super().__init__()
+        self.handler = handler
+        self.sent: List[Tuple[str, Optional[Dict]]] = []
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def send(self, method: str, params: Optional[Dict] = None) -> Future:
+        # a future, like the CDPResultFuture of connections and sessions
+        self.sent.append((method, params))
+        return self._loop.create_task(self._answer(method, params))
+
+    async def _answer(self, method: str, params: Optional[Dict]) -> Any:
+        if self.handler is None:
+            return {}
+        result = self.handler(method, params)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def send_many(self, commands: Iterable[Tuple[str, Optional[Dict]]]) -> List[Any]:
+        futures = [self.send(method, params) for method, params in commands]
+        results = []
+        for future in futures:
+            try:
+                results.append(await future)
+            except Exception as e:
+                results.append(e)
+        return results
+
+
 @attr.dataclass(slots=True)
 class Cleaner:
     listeners: List[EEListener] = attr.ib(init=False, factory=list)
@@ -104,3 +147,53 @@ async def get_target_from_list(
             elif return_what == "id":
                 return target["id"]
     return None
+
+
+HEAP_NODE_FIELDS = ["type", "name", "id", "self_size", "edge_count", "trace_node_id", "detachedness"]
+HEAP_NODE_TYPES = [
+    "hidden", "array", "string", "object", "code", "closure", "regexp", "number",
+    "native", "synthetic", "concatenated string", "sliced string", "symbol", "bigint",
+]
+HEAP_EDGE_TYPES = ["context", "element", "property", "internal", "hidden", "shortcut", "weak"]
+
+# (type, name, id, self_size, [(edge type, edge name or index, index of the node pointed to)])
+HeapNode = Tuple[str, str, int, int, List[Tuple[str, Union[str, int], int]]]
+
+
+def write_heap_snapshot(path: str, graph: List[HeapNode], trace_tree: Optional[List] = None) -> None:
+    strings: List[str] = ["<dummy>"]
+
+    def string_index(value: str) -> int:
+        if value not in strings:
+            strings.append(value)
+        return strings.index(value)
+
+    nodes: List[int] = []
+    edges: List[int] = []
+    for node_type, name, node_id, self_size, node_edges in graph:
+        nodes.extend([HEAP_NODE_TYPES.index(node_type), string_index(name), node_id, self_size, len(node_edges), 0, 0])
+        for edge_type, edge_name, to_node in node_edges:
+            if edge_type not in ("element", "hidden"):
+                edge_name = string_index(edge_name)
+            edges.extend([HEAP_EDGE_TYPES.index(edge_type), edge_name, to_node * len(HEAP_NODE_FIELDS)])
+    snapshot = {
+        "snapshot": {
+            "meta": {
+                "node_fields": HEAP_NODE_FIELDS,
+                "node_types": [HEAP_NODE_TYPES, "string", "number", "number", "number", "number", "number"],
+                "edge_fields": ["type", "name_or_index", "to_node"],
+                "edge_types": [HEAP_EDGE_TYPES, "string_or_number", "node"],
+            },
+            "node_count": len(graph),
+            "edge_count": len(edges) // 3,
+        },
+        "nodes": nodes,
+        "edges": edges,
+        "trace_function_infos": [],
+        "trace_tree": trace_tree or [],
+        "samples": [],
+        "locations": [],
+        "strings": strings,
+    }
+    with open(path, "w") as out:
+        out.write(json.dumps(snapshot).replace(",", ",\n"))
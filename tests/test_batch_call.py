@@ -0,0 +1,78 @@
+import json
+from typing import Dict, Optional
+
+import pytest
+
+from cripy import Client, ClientError, ProtocolError, call_function_on_many
+from .helpers import EventSource
+
+
+def page(method: str, params: Optional[Dict]) -> Dict:
+    """Stands in for the page, the function doubles the number in the id of the object"""
+    if method == "DOM.resolveNode":
+        if params["backendNodeId"] < 0:
+            raise ProtocolError("No node with given id found")
+        return {"object": {"type": "object", "objectId": f"obj-{params['backendNodeId']}"}}
+    if method == "Runtime.callFunctionOn":
+        factor = params["arguments"][0]["value"][0]
+        out = []
+        for argument in params["arguments"][1:]:
+            number = int(argument["objectId"].split("-")[1])
+            out.append({"e": "Error: odd"} if number == 13 else {"v": number * factor})
+        return {"result": {"type": "string", "value": json.dumps(out)}}
+    return {}
+
+
+class TestCallFunctionOnMany:
+    @pytest.mark.asyncio
+    async def test_calls_in_chunks(self):
+        source = EventSource(page)
+        object_ids = [f"obj-{number}" for number in range(10, 16)]
+        results = await call_function_on_many(
+            source, "function(factor) { return this.n * factor }", object_ids, arguments=[2], chunk_size=4
+        )
+        assert results[:3] == [20, 22, 24] and results[4:] == [28, 30]
+        assert isinstance(results[3], ClientError)
+        calls = [params for method, params in source.sent if method == "Runtime.callFunctionOn"]
+        assert [len(params["arguments"]) - 1 for params in calls] == [4, 2]
+        assert all(params["returnByValue"] for params in calls)
+
+    @pytest.mark.asyncio
+    async def test_chunks_shrink_when_the_payload_is_too_big(self):
+        source = EventSource(page)
+        object_ids = [f"obj-{number}" for number in range(20, 40)]
+        results = await call_function_on_many(
+            source, "function(f) {}", object_ids, arguments=[1], chunk_size=10, max_payload=40
+        )
+        assert results == list(range(20, 40))
+        calls = [params for method, params in source.sent if method == "Runtime.callFunctionOn"]
+        sizes = [len(params["arguments"]) - 1 for params in calls]
+        assert sizes[0] == 10 and max(sizes[1:]) <= 4
+
+    @pytest.mark.asyncio
+    async def test_resolves_backend_node_ids(self):
+        source = EventSource(page)
+        results = await call_function_on_many(source, "function(f) {}", backend_node_ids=[1, -1, 2], arguments=[3])
+        assert results[0] == 3 and results[2] == 6 and isinstance(results[1], ClientError)
+        method, params = source.sent[-1]
+        assert method == "Runtime.releaseObjectGroup" and params["objectGroup"].startswith("cripy-batch-")
+
+
+@pytest.mark.usefixtures("chrome")
+class TestCallFunctionOnManyPage:
+    @pytest.mark.asyncio
+    async def test_calls_function_on_nodes(self, client: Client):
+        await client.Runtime.evaluate("document.body.innerHTML = '<p>a</p><p>bb</p><p>ccc</p>'")
+        doc = await client.DOM.getDocument()
+        node_ids = (await client.DOM.querySelectorAll(nodeId=doc["root"]["nodeId"], selector="p"))["nodeIds"]
+        backend_node_ids = [
+            (await client.DOM.describeNode(nodeId=node_id))["node"]["backendNodeId"] for node_id in node_ids
+        ]
+        results = await call_function_on_many(
+            client,
+            "function(suffix) { return this.textContent + suffix }",
+            backend_node_ids=backend_node_ids,
+            arguments=["!"],
+            chunk_size=2,
+        )
+        assert results == ["a!", "bb!", "ccc!"]
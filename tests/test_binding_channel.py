@@ -0,0 +1,77 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import pytest
+
+from cripy import BindingChannel, Client
+from .helpers import EventSource
+
+
+def batch(messages: List[Any], context_id: int = 1, dropped: int = 0) -> Dict:
+    payload = json.dumps({"s": 0, "d": dropped, "m": messages})
+    return {"name": "__metricsBinding", "payload": payload, "executionContextId": context_id}
+
+
+class TestBindingChannel:
+    @pytest.mark.asyncio
+    async def test_unbatches_messages_with_backpressure(self):
+        source = EventSource()
+        channel = BindingChannel(source, name="metrics", high_water=4, low_water=1)
+        await channel.open()
+        assert ("Runtime.addBinding", {"name": "__metricsBinding"}) in source.sent
+
+        source.emit("Runtime.bindingCalled", {"name": "other", "payload": "[]", "executionContextId": 1})
+        source.emit("Runtime.bindingCalled", batch([1, 2, 3]))
+        assert await channel.receive() == 1
+        source.emit("Runtime.bindingCalled", batch([4, 5], dropped=2))
+        assert channel.paused and channel.pending == 4
+        await asyncio.sleep(0)
+        assert source.sent[-1] == ("Runtime.evaluate", {"expression": 'globalThis["metrics"].pause()', "contextId": 1})
+
+        received = [await channel.receive() for _ in range(3)]
+        assert received == [2, 3, 4] and not channel.paused
+        await asyncio.sleep(0)
+        assert source.sent[-1][1]["expression"] == 'globalThis["metrics"].resume()'
+        assert channel.stats == {"batches": 2, "messages": 5, "dropped": 2}
+
+        source.emit("Runtime.executionContextDestroyed", {"executionContextId": 1})
+        source.emit("Runtime.bindingCalled", batch([6, 7, 8], context_id=2, dropped=1))
+        await asyncio.sleep(0)
+        signalled = [params["contextId"] for _, params in source.sent if params and "contextId" in params]
+        assert signalled[-1] == 2 and signalled.count(1) == 2 and channel.stats["dropped"] == 3
+        source.emit("Runtime.executionContextsCleared")
+        assert channel.stats["dropped"] == 3
+
+        await channel.close()
+        assert [message async for message in channel] == [5, 6, 7, 8]
+
+
+@pytest.mark.usefixtures("chrome")
+class TestBindingChannelPage:
+    @pytest.mark.asyncio
+    async def test_streams_messages_from_the_page(self, client: Client):
+        channel = BindingChannel(client, max_batch=100)
+        await channel.open()
+        await client.Runtime.evaluate("for (let i = 0; i < 250; i++) cripyChannel.send({i})")
+        received = [await asyncio.wait_for(channel.receive(), 5) for _ in range(250)]
+        assert [message["i"] for message in received] == list(range(250))
+        assert channel.stats["batches"] <= 3
+        await channel.close()
+
+    @pytest.mark.asyncio
+    async def test_draining_page_buffer_is_bounded(self, client: Client):
+        channel = BindingChannel(client, name="boundedChannel", max_batch=10, max_buffered=20)
+        await channel.open()
+        resp = await client.Runtime.evaluate(
+            "boundedChannel.pause();"
+            "for (let i = 0; i < 20; i++) boundedChannel.send(i);"
+            "boundedChannel.resume();"
+            "for (let i = 20; i < 120; i++) boundedChannel.send(i);"
+            "boundedChannel.dropped",
+            returnByValue=True,
+        )
+        assert resp["result"]["value"] == 90
+        received = [await asyncio.wait_for(channel.receive(), 5) for _ in range(30)]
+        assert received == list(range(30))
+        await channel.close()
@@ -0,0 +1,83 @@
+from base64 import b64encode
+from typing import Dict, Optional
+
+import pytest
+
+from cripy import BodyCache, BodyPrefetcher, ProtocolError
+from .helpers import EventSource
+
+BODIES = {"doc": b"<p>hi</p>", "app": b"shared", "vendor": b"shared", "big": b"x" * 100, "gone": None}
+
+
+def get_response_body(method: str, params: Optional[Dict]) -> Dict:
+    if method != "Network.getResponseBody":
+        return {}
+    body = BODIES[params["requestId"]]
+    if body is None:
+        raise ProtocolError("No resource with given identifier found")
+    return {"body": b64encode(body).decode("ascii"), "base64Encoded": True}
+
+
+def finish(source: EventSource, request_id: str, mime_type: str, resource_type: str, size: int) -> None:
+    response = {"url": f"https://example.com/{request_id}", "mimeType": mime_type}
+    source.emit("Network.responseReceived", {"requestId": request_id, "type": resource_type, "response": response})
+    source.emit("Network.loadingFinished", {"requestId": request_id, "encodedDataLength": size})
+
+
+class TestBodyCache:
+    def test_identical_bodies_are_stored_once_and_evicted_lru(self):
+        cache = BodyCache(max_bytes=10)
+        cache.put("1", "d1", b"aaaa")
+        cache.put("2", "d1", b"aaaa")
+        cache.put("3", "d2", b"bbbb")
+        assert (len(cache), cache.size) == (2, 8)
+        assert cache.get("1") is cache.get("2")
+        cache.put("4", "d3", b"cccc")
+        assert "1" in cache and "2" in cache
+        assert cache.get("3") is None
+        assert cache.size == 8
+
+
+class TestBodyPrefetcher:
+    @pytest.mark.asyncio
+    async def test_filters_prioritizes_and_caches_bodies(self):
+        source = EventSource(get_response_body)
+        prefetcher = BodyPrefetcher(
+            source,
+            max_concurrency=1,
+            mime_types=["text/", "application/javascript"],
+            max_size=50,
+            prioritizer=lambda response, resource_type: 0 if resource_type == "Script" else 1,
+        )
+        await prefetcher.enable()
+        finish(source, "doc", "text/html", "Document", 10)
+        finish(source, "app", "application/javascript", "Script", 10)
+        finish(source, "vendor", "application/javascript", "Script", 10)
+        finish(source, "big", "text/plain", "XHR", 100)
+        finish(source, "img", "image/png", "Image", 10)
+        finish(source, "gone", "text/plain", "XHR", 10)
+        assert await prefetcher.body("vendor") == b"shared"
+        await prefetcher.wait()
+        requested = [params["requestId"] for method, params in source.sent if method == "Network.getResponseBody"]
+        assert requested == ["app", "vendor", "doc", "gone"]
+        assert (prefetcher.fetched, prefetcher.failed, prefetcher.skipped) == (3, 1, 2)
+        assert prefetcher.cache.digest_of("app") == prefetcher.cache.digest_of("vendor")
+        assert len(prefetcher.cache) == 2
+        await prefetcher.disable()
+
+    @pytest.mark.asyncio
+    async def test_unexpected_errors_are_counted_and_the_queue_drained(self):
+        def answer(method: str, params: Optional[Dict]) -> Dict:
+            if params["requestId"] == "broken":
+                return {"body": "not base64!", "base64Encoded": True}
+            if params["requestId"] == "odd":
+                raise RuntimeError("unexpected")
+            return get_response_body(method, params)
+
+        source = EventSource(answer)
+        prefetcher = BodyPrefetcher(source, max_concurrency=1)
+        for request_id in ["broken", "odd", "doc"]:
+            prefetcher.prefetch(request_id)
+        assert await prefetcher.body("doc") == b"<p>hi</p>"
+        await prefetcher.wait()
+        assert (prefetcher.fetched, prefetcher.failed, prefetcher.pending) == (1, 2, 0)
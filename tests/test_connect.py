@@ -1,3 +1,5 @@
+import asyncio
+import gc
 from asyncio import AbstractEventLoop
 from typing import Any
 
@@ -6,8 +8,10 @@ from aiohttp import ClientConnectorError
 from async_timeout import timeout
 from websockets import InvalidURI
 
+from cripy import Client
 from cripy.cdp import CDP, connect
 from cripy.connection import Connection
+from cripy.errors import ProtocolError
 from cripy.events import ConnectionEvents
 from .helpers import Cleaner
 
@@ -161,3 +165,123 @@ class TestConnecting:
 
         async with timeout(10, loop=event_loop):
             assert await future
+
+
+@pytest.mark.usefixtures("chrome")
+class TestSendMany:
+    @pytest.mark.asyncio
+    async def test_send_many_returns_results_in_order(self, client: Connection):
+        results = await client.send_many(
+            [
+                ("Browser.getVersion", None),
+                ("Runtime.evaluate", {"expression": "1 + 1", "returnByValue": True}),
+                ("Not.aMethod", {}),
+            ]
+        )
+        assert len(results) == 3
+        assert results[0]["product"] in results[0]["userAgent"]
+        assert results[1]["result"]["value"] == 2
+        assert isinstance(results[2], ProtocolError)
+
+    @pytest.mark.asyncio
+    async def test_send_many_unordered_yields_every_result(self, client: Connection):
+        commands = [
+            ("Runtime.evaluate", {"expression": f"{i}", "returnByValue": True})
+            for i in range(10)
+        ]
+        seen = {}
+        async for idx, result in client.send_many_unordered(commands):
+            seen[idx] = result["result"]["value"]
+        assert seen == {i: i for i in range(10)}
+
+
+@pytest.mark.usefixtures("chrome")
+class TestCoalescing:
+    @pytest.mark.asyncio
+    async def test_identical_inflight_commands_share_a_response(self, client: Connection):
+        coalescer = client.enable_coalescing("Browser.getVersion")
+        results = await asyncio.gather(*[client.Browser.getVersion() for _ in range(5)])
+        assert all(result == results[0] for result in results)
+        assert coalescer.misses == 1
+        assert coalescer.hits == 4
+        assert coalescer.inflight == 0
+
+
+@pytest.mark.usefixtures("chrome")
+class TestResultCache:
+    @pytest.mark.asyncio
+    async def test_static_results_are_served_from_the_cache(self, client: Connection):
+        cache = client.enable_result_cache()
+        first = await client.Browser.getVersion()
+        second = await client.Browser.getVersion()
+        assert first == second
+        assert cache.misses == 1
+        assert cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_cache_is_invalidated_on_close(self, client: Connection):
+        cache = client.enable_result_cache({"Browser.getVersion": 60})
+        await client.Browser.getVersion()
+        assert len(cache) == 1
+        await client.dispose()
+        assert len(cache) == 0
+
+
+@pytest.mark.usefixtures("chrome")
+class TestCancellation:
+    @pytest.mark.asyncio
+    async def test_cancelled_commands_are_removed_from_callbacks(
+        self, client: Connection, event_loop: AbstractEventLoop
+    ):
+        futures = [
+            client.send("Runtime.evaluate", {"expression": "new Promise(r => setTimeout(r, 500))", "awaitPromise": True})
+            for _ in range(5)
+        ]
+        for future in futures:
+            future.cancel()
+        assert len(client._callbacks) == 0
+        async with timeout(10, loop=event_loop):
+            while client.orphaned_responses < 5:
+                await asyncio.sleep(0.1)
+        version = await client.Browser.getVersion()
+        assert version["product"] in version["userAgent"]
+
+
+class TestSessionRelease:
+    @pytest.mark.asyncio
+    async def test_closed_sessions_are_freed_without_the_garbage_collector(self):
+        client = Client(flatten_sessions=True)
+        session = client._new_session("page", "S1")
+        client.add_session(session)
+        client.sessions.remove("S1").on_closed()
+        assert client.leaked_sessions() == ["S1"]
+        runtime = session.Runtime
+        gc.disable()
+        try:
+            del session
+            assert client.leaked_sessions() == []
+        finally:
+            gc.enable()
+        with pytest.raises(ReferenceError):
+            runtime.client.send("Runtime.enable")
+
+
+@pytest.mark.usefixtures("chrome")
+class TestSessionIndex:
+    @pytest.mark.asyncio
+    async def test_sessions_are_indexed_and_released_on_detach(self, mr_clean: Cleaner):
+        client = await connect(flatten_sessions=True)
+        mr_clean.add_disposable(client)
+        targets = await client.Target.getTargets()
+        page = next(t for t in targets["targetInfos"] if t["type"] == "page")
+        session = await client.create_session(page["targetId"])
+        assert client.sessions.get(session.session_id) is session
+        assert Connection.from_session(session) is client
+        await session.detach()
+        async with timeout(10):
+            while session.session_id in client.sessions:
+                await asyncio.sleep(0.1)
+        assert client.leaked_sessions() == [session.session_id]
+        session_id = session.session_id
+        del session
+        assert session_id not in client.leaked_sessions()
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Dict, Optional
+
+import pytest
+
+from cripy import Client, ExecutionContextRegistry
+from .helpers import EventSource
+
+
+def context(context_id: int, frame_id: str, name: str = "", origin: str = "https://example.com") -> Dict:
+    aux_data = {"frameId": frame_id, "isDefault": not name, "type": "isolated" if name else "default"}
+    return {"context": {"id": context_id, "origin": origin, "name": name, "auxData": aux_data}}
+
+
+class TestExecutionContextRegistry:
+    @pytest.mark.asyncio
+    async def test_indexes_contexts(self):
+        source = EventSource()
+        registry = ExecutionContextRegistry(source)
+        await registry.enable()
+        waiter = asyncio.ensure_future(registry.wait_for_main_world("F1"))
+        source.emit("Runtime.executionContextCreated", context(1, "F1"))
+        source.emit("Runtime.executionContextCreated", context(2, "F1", "utility"))
+        source.emit("Runtime.executionContextCreated", context(3, "F2", origin="https://other.com"))
+        assert (await waiter).id == 1
+        assert registry.main_world("F1").id == 1 and registry.world("F1", "utility").id == 2
+        assert [ctx.id for ctx in registry.frame_contexts("F1")] == [1, 2]
+        assert sorted(ctx.id for ctx in registry.by_origin("https://example.com")) == [1, 2]
+
+        source.emit("Runtime.executionContextDestroyed", {"executionContextId": 2})
+        assert registry.world("F1", "utility") is None and 2 not in registry
+        source.emit("Runtime.executionContextsCleared")
+        assert len(registry) == 0 and registry.by_origin("https://other.com") == []
+        with pytest.raises(asyncio.TimeoutError):
+            await registry.wait_for_main_world("F1", timeout=0.01)
+        registry.disable()
+
+    @pytest.mark.asyncio
+    async def test_creates_isolated_worlds_once(self):
+        def handler(method: str, params: Optional[Dict]) -> Dict:
+            if method == "Page.createIsolatedWorld":
+                return {"executionContextId": 7}
+            return {}
+
+        source = EventSource(handler)
+        registry = ExecutionContextRegistry(source)
+        await registry.enable()
+        first, second = await asyncio.gather(registry.isolated_world("F1"), registry.isolated_world("F1"))
+        assert first is second and first.id == 7 and not first.is_default
+        await registry.isolated_world("F1")
+        assert [method for method, _ in source.sent].count("Page.createIsolatedWorld") == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelling_the_first_caller_does_not_strand_the_others(self):
+        creating = asyncio.Event()
+
+        async def handler(method: str, params: Optional[Dict]) -> Dict:
+            if method == "Page.createIsolatedWorld":
+                await creating.wait()
+                return {"executionContextId": 7}
+            return {}
+
+        source = EventSource(handler)
+        registry = ExecutionContextRegistry(source)
+        loop = asyncio.get_event_loop()
+        first = loop.create_task(registry.isolated_world("F1"))
+        await asyncio.sleep(0)
+        second = loop.create_task(registry.isolated_world("F1"))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        creating.set()
+        context = await asyncio.wait_for(second, 1)
+        assert context.id == 7 and registry.world("F1", "__cripy_utility_world__") is context
+        assert [method for method, _ in source.sent].count("Page.createIsolatedWorld") == 1
+
+
+@pytest.mark.usefixtures("chrome")
+class TestExecutionContextRegistryPage:
+    @pytest.mark.asyncio
+    async def test_resolves_worlds_of_the_main_frame(self, client: Client):
+        registry = ExecutionContextRegistry(client)
+        await registry.enable()
+        frame_id = (await client.Page.getFrameTree())["frameTree"]["frame"]["id"]
+        main_world = await registry.wait_for_main_world(frame_id, timeout=5)
+        utility = await registry.isolated_world(frame_id, "utility")
+        assert utility.id != main_world.id
+        assert await registry.isolated_world(frame_id, "utility") is utility
+        registry.disable()
@@ -0,0 +1,98 @@
+import json
+import re
+from typing import Dict, Optional
+
+import pytest
+
+from cripy import Client, ClientError, extract_table
+from .helpers import EventSource
+
+
+class Page:
+    """Stands in for a page with two matching paragraphs, backend node ids 12 and 14, in its main
+    document or, when framed, in the document of a frame with the first paragraph gone by the time
+    of the snapshot"""
+
+    def __init__(self, framed: bool = False) -> None:
+        self.marker: Optional[str] = None
+        self.framed = framed
+
+    def __call__(self, method: str, params: Optional[Dict]) -> Dict:
+        if method == "Runtime.evaluate" and "JSON.stringify" in params["expression"]:
+            match = re.search(r'"(data-cripy-extract-\d+)"\)$', params["expression"])
+            self.marker = match.group(1) if match else None
+            value = {"rows": 2, "columns": [["p", "p"], ["first", None], [[0, 0, 10, 10], [0, 10, 10, 10]]]}
+            return {"result": {"type": "string", "value": json.dumps(value)}}
+        if method == "DOMSnapshot.captureSnapshot":
+            strings = ["#document", "P", self.marker, "1", "0", "id", "first"]
+            nodes = {
+                "parentIndex": [-1, 0, 0],
+                "nodeType": [9, 1, 1],
+                "nodeName": [0, 1, 1],
+                "nodeValue": [-1, -1, -1],
+                "backendNodeId": [10, 14, 12],
+                "attributes": [[], [2, 3], [5, 6, 2, 4]],
+            }
+            empty = {"nodeIndex": [], "bounds": [], "text": [], "styles": []}
+            text_boxes = {"layoutIndex": [], "bounds": [], "start": [], "length": []}
+            document = {"documentURL": 0, "nodes": nodes, "layout": empty, "textBoxes": text_boxes}
+            if not self.framed:
+                return {"strings": strings, "documents": [document]}
+            main_nodes = {key: values[:1] for key, values in nodes.items()}
+            main = {"documentURL": 0, "nodes": main_nodes, "layout": empty, "textBoxes": text_boxes}
+            nodes["attributes"][2] = [5, 6]
+            return {"strings": strings, "documents": [main, document]}
+        return {}
+
+
+class TestExtractTable:
+    @pytest.mark.asyncio
+    async def test_extracts_columns_and_backend_node_ids(self):
+        page = Page()
+        source = EventSource(page)
+        table = await extract_table(source, "p", {"tag": "tag", "id": "attr:id", "box": "box"}, backend_node_ids=True)
+        assert len(table) == 2 and table.fields == ["tag", "id", "box"]
+        assert table["id"] == ["first", None]
+        assert table.backend_node_ids == [12, 14]
+        assert table.row(1) == {"tag": "p", "id": None, "box": [0, 10, 10, 10], "backendNodeId": 14}
+        methods = [method for method, _ in source.sent]
+        assert methods == ["Runtime.evaluate", "DOMSnapshot.captureSnapshot", "Runtime.evaluate"]
+
+    @pytest.mark.asyncio
+    async def test_extracts_in_a_single_round_trip_by_default(self):
+        source = EventSource(Page())
+        table = await extract_table(source, "p", ["tag", "attr:id"])
+        assert table["attr:id"] == ["first", None] and table.backend_node_ids is None
+        assert [method for method, _ in source.sent] == ["Runtime.evaluate"]
+        assert source.sent[0][1]["expression"].endswith(", null)")
+        assert table.row(0) == {"tag": "p", "attr:id": "first"}
+
+    @pytest.mark.asyncio
+    async def test_finds_rows_in_every_document(self):
+        table = await extract_table(EventSource(Page(framed=True)), "p", ["tag"], True, context_id=3)
+        assert table.backend_node_ids == [None, 14]
+        assert table.row(0) == {"tag": "p", "backendNodeId": None}
+
+    @pytest.mark.asyncio
+    async def test_rejects_unknown_field_specs(self):
+        with pytest.raises(ClientError):
+            await extract_table(EventSource(Page()), "p", ["colour"])
+        with pytest.raises(ClientError):
+            await extract_table(EventSource(Page()), "p", ["attr:"])
+
+
+@pytest.mark.usefixtures("chrome")
+class TestExtractTablePage:
+    @pytest.mark.asyncio
+    async def test_extracts_matching_elements(self, client: Client):
+        await client.Runtime.evaluate(
+            "document.body.innerHTML = '<a href=/a>one</a><a href=/b style=\"display: none\">two</a>'"
+        )
+        table = await extract_table(client, "a", ["text", "attr:href", "style:display", "visible"], True)
+        assert table["text"] == ["one", "two"]
+        assert table["attr:href"] == ["/a", "/b"]
+        assert table["style:display"] == ["inline", "none"]
+        assert table["visible"] == [True, False]
+        for backend_node_id, text in zip(table.backend_node_ids, table["text"]):
+            node = (await client.DOM.describeNode(backendNodeId=backend_node_id))["node"]
+            assert node["localName"] == "a" and not any(name.startswith("data-cripy") for name in node["attributes"])
@@ -0,0 +1,102 @@
+import asyncio
+from typing import Dict, Optional
+
+import pytest
+
+from cripy import Client, DOMMirror, ProtocolError
+from .helpers import EventSource
+
+
+def node(node_id: int, name: str, children=None, node_type: int = 1, value: str = "", **extra) -> Dict:
+    result = {"nodeId": node_id, "backendNodeId": node_id + 100, "nodeType": node_type, "nodeName": name}
+    result["nodeValue"] = value
+    if children is not None:
+        result["children"] = children
+        result["childNodeCount"] = len(children)
+    result.update(extra)
+    return result
+
+
+def text(node_id: int, value: str) -> Dict:
+    return node(node_id, "#text", node_type=3, value=value)
+
+
+BODY = node(3, "BODY", [node(4, "P", [text(5, "hello")], attributes=["id", "greeting"]), node(6, "UL")])
+DOCUMENT = node(1, "#document", [node(2, "HTML", [BODY])], node_type=9)
+
+
+def get_document(method: str, params: Optional[Dict]) -> Dict:
+    return {"root": DOCUMENT} if method == "DOM.getDocument" else {}
+
+
+class TestDOMMirror:
+    @pytest.mark.asyncio
+    async def test_applies_mutation_events(self):
+        source = EventSource(get_document)
+        mirror = DOMMirror(source)
+        document = await mirror.load()
+        assert len(mirror) == 6
+        assert mirror.get_by_backend_id(104).get_attribute("id") == "greeting"
+        assert document.text_content() == "hello"
+
+        source.emit("DOM.characterDataModified", {"nodeId": 5, "characterData": "bye"})
+        source.emit("DOM.attributeModified", {"nodeId": 4, "name": "class", "value": "big"})
+        source.emit("DOM.attributeRemoved", {"nodeId": 4, "name": "id"})
+        source.emit("DOM.childNodeInserted", {"parentNodeId": 3, "previousNodeId": 4, "node": node(7, "DIV", [])})
+        source.emit("DOM.childNodeCountUpdated", {"nodeId": 6, "childNodeCount": 2})
+        source.emit("DOM.setChildNodes", {"parentId": 6, "nodes": [node(8, "LI", [text(9, "a")]), node(10, "LI")]})
+        assert mirror.get(4).attributes == {"class": "big"}
+        assert [child.node_name for child in mirror.get(3).children] == ["P", "DIV", "UL"]
+        assert [child.node_id for child in mirror.get(6).children] == [8, 10]
+        assert document.text_content() == "byea"
+
+        source.emit("DOM.shadowRootPushed", {"hostId": 7, "root": node(11, "#document-fragment", [text(12, "shadow")])})
+        assert mirror.get(7).shadow_roots[0].text_content() == "shadow"
+        source.emit("DOM.shadowRootPopped", {"hostId": 7, "rootId": 11})
+        source.emit("DOM.childNodeRemoved", {"parentNodeId": 3, "nodeId": 6})
+        assert 8 not in mirror and 11 not in mirror and mirror.get_by_backend_id(109) is None
+        assert mirror.get(3).child_count == 2
+        version = mirror.version
+        mirror.close()
+        source.emit("DOM.attributeModified", {"nodeId": 4, "name": "class", "value": "small"})
+        assert mirror.version == version
+        assert len(mirror) == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_reload_leaves_the_mirror_unloaded(self, caplog):
+        failures = [ProtocolError("Document needs to be requested first")]
+
+        def fail_reload(method: str, params: Optional[Dict]) -> Dict:
+            if method == "DOM.getDocument" and mirror.version > 1 and failures:
+                raise failures.pop()
+            return get_document(method, params)
+
+        source = EventSource(fail_reload)
+        mirror = DOMMirror(source)
+        await mirror.load()
+        assert mirror.loaded
+        source.emit("DOM.documentUpdated", {})
+        while not caplog.records:
+            await asyncio.sleep(0)
+        assert not mirror.loaded and len(mirror) == 0
+        assert "reloading the DOM mirror failed" in caplog.text
+        await mirror.load()
+        assert mirror.loaded and len(mirror) == 6
+
+
+@pytest.mark.usefixtures("chrome")
+class TestDOMMirrorPage:
+    @pytest.mark.asyncio
+    async def test_mirror_follows_the_page(self, client: Client):
+        mirror = DOMMirror(client)
+        await client.Runtime.evaluate("document.body.innerHTML = '<ul id=list><li>a</li></ul>'")
+        await mirror.load()
+        await client.Runtime.evaluate(
+            "document.getElementById('list').appendChild(document.createElement('li')).textContent = 'b'"
+        )
+        await client.Runtime.evaluate("document.getElementById('list').setAttribute('data-x', '1')")
+        body = mirror.document.children[-1].children[-1]
+        assert body.node_name == "BODY"
+        assert body.children[0].get_attribute("data-x") == "1"
+        assert body.text_content() == "ab"
+        mirror.close()
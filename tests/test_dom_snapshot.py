@@ -0,0 +1,99 @@
+import pytest
+
+from cripy import Client, ClientError, capture_snapshot, decode_snapshot
+
+STRINGS = [
+    "#document",
+    "HTML",
+    "BODY",
+    "P",
+    "#text",
+    "hello world",
+    "block",
+    "visible",
+    "hidden",
+    "SPAN",
+    "inline",
+    "id",
+    "x",
+    "https://example.com/",
+    "bye",
+]
+
+SNAPSHOT = {
+    "strings": STRINGS,
+    "documents": [
+        {
+            "documentURL": 13,
+            "frameId": -1,
+            "nodes": {
+                "parentIndex": [-1, 0, 1, 2, 3, 2, 5],
+                "nodeType": [9, 1, 1, 1, 3, 1, 3],
+                "nodeName": [0, 1, 2, 3, 4, 9, 4],
+                "nodeValue": [-1, -1, -1, -1, 5, -1, 14],
+                "backendNodeId": [1, 2, 3, 4, 5, 6, 7],
+                "attributes": [[], [], [], [11, 12], [], [], []],
+                "isClickable": {"index": [3]},
+            },
+            "layout": {
+                "nodeIndex": [1, 2, 3, 4, 5, 6],
+                "bounds": [
+                    [0, 0, 800, 600],
+                    [8, 8, 784, 584],
+                    [8, 8, 784, 20],
+                    [8, 8, 80, 20],
+                    [8, 40, 100, 20],
+                    [8, 40, 30, 20],
+                ],
+                "text": [-1, -1, -1, 5, -1, 14],
+                "styles": [[6, 7], [6, 7], [6, 7], [10, 7], [10, 8], [10, 8]],
+                "paintOrders": [0, 1, 2, 4, 5, 3],
+                "stackingContexts": {"index": [0]},
+            },
+            "textBoxes": {
+                "layoutIndex": [3, 3, 5],
+                "bounds": [[8, 8, 40, 20], [48, 8, 40, 20], [8, 40, 30, 20]],
+                "start": [0, 6, 0],
+                "length": [5, 5, 3],
+            },
+        }
+    ],
+}
+
+
+class TestColumnarSnapshot:
+    def test_decodes_columns(self):
+        snapshot = decode_snapshot(SNAPSHOT, ["display", "visibility"])
+        document = snapshot.documents[0]
+        assert document.url == "https://example.com/"
+        assert document.node_count == 7 and document.layout_count == 6
+        assert document.name(3) == "P" and document.value(4) == "hello world"
+        assert document.attributes(3) == {"id": "x"} and document.attributes(2) == {}
+        assert document.bounds(3) == (8.0, 8.0, 784.0, 20.0) and document.bounds(0) is None
+        assert document.style(5, "visibility") == "hidden"
+        assert 3 in document.clickable
+        with pytest.raises(ClientError):
+            document.style(5, "color")
+
+    def test_queries(self):
+        document = decode_snapshot(SNAPSHOT, ["display", "visibility"]).documents[0]
+        assert document.nodes_in_rect(0, 30, 50, 50) == [1, 2]
+        assert document.nodes_in_rect(0, 30, 50, 50, visible=False) == [1, 2, 5, 6]
+        assert document.nodes_with_style("display", "inline") == [4, 5, 6]
+        assert document.nodes_with_style("display", "flex") == []
+        assert document.text_by_paint_order() == [(6, "bye"), (4, "hello"), (4, "world")]
+
+
+@pytest.mark.usefixtures("chrome")
+class TestColumnarSnapshotPage:
+    @pytest.mark.asyncio
+    async def test_capture_snapshot(self, client: Client):
+        await client.Runtime.evaluate(
+            "document.body.innerHTML = '<p>shown</p><p style=\"visibility: hidden\">gone</p>'"
+        )
+        snapshot = await capture_snapshot(client, ["display", "visibility"])
+        document = snapshot.documents[0]
+        hidden = document.nodes_with_style("visibility", "hidden")
+        assert [document.name(node) for node in hidden if document.node_type[node] == 1] == ["P"]
+        texts = [text for _, text in document.text_by_paint_order()]
+        assert "shown" in texts
@@ -0,0 +1,91 @@
+import pytest
+
+from cripy import Client, FetchInterceptor, InterceptRule
+from cripy.fetch_interceptor import glob_to_regex
+
+
+@pytest.fixture
+def interceptor() -> FetchInterceptor:
+    interceptor = FetchInterceptor(None)
+    interceptor.block("*.png", resource_types=["Image"])
+    interceptor.fulfill("https://api.example.com/v1/*", '{"ok": true}')
+    interceptor.modify_headers("https://example.com/*", {"X-Test": "1"}, methods=["get"])
+    interceptor.block(r"tracker\d+", regex=True)
+    return interceptor
+
+
+class TestRuleMatching:
+    def test_glob_translation(self):
+        assert glob_to_regex(r"https://a.com/?x*\*") == r"https://a\.com/.x.*\*"
+
+    @pytest.mark.parametrize(
+        "url,resource_type,method,expected",
+        [
+            ("https://a.com/x.png", "Image", "GET", 0),
+            ("https://a.com/x.png", "Script", "GET", None),
+            ("https://api.example.com/v1/users", "XHR", "POST", 1),
+            ("https://example.com/index.html", "Document", "GET", 2),
+            ("https://example.com/tracker12", "Script", "POST", 3),
+            ("https://other.com/", "Document", "GET", None),
+        ],
+    )
+    def test_first_applicable_rule_wins(self, interceptor, url, resource_type, method, expected):
+        rule = interceptor.match(url, resource_type, method)
+        assert rule is (interceptor.rules[expected] if expected is not None else None)
+
+    @pytest.mark.parametrize(
+        "url,expected",
+        [
+            ("https://aa.com/", 1),
+            ("https://ab.com/", None),
+            ("https://ab.com/b.png", 0),
+            ("https://xx.net/", 2),
+        ],
+    )
+    def test_regex_rules_with_groups_keep_their_backreferences(self, url, expected):
+        interceptor = FetchInterceptor(None)
+        interceptor.block("*.png")
+        interceptor.block(r"https://(a)\1\.com/", regex=True)
+        interceptor.block(r"https://(?P<c>x)(?P=c)\.net/", regex=True)
+        rule = interceptor.match(url, "Document", "GET")
+        assert rule is (interceptor.rules[expected] if expected is not None else None)
+
+    def test_request_patterns(self, interceptor: FetchInterceptor):
+        assert interceptor.request_patterns() == [{"urlPattern": "*"}]
+        interceptor.remove_rule(interceptor.rules[-1])
+        assert interceptor.request_patterns() == [
+            {"urlPattern": "*.png", "resourceType": "Image"},
+            {"urlPattern": "https://api.example.com/v1/*"},
+            {"urlPattern": "https://example.com/*"},
+        ]
+
+    def test_modify_headers_command(self):
+        rule = InterceptRule("*", "modify_headers", headers={"cookie": None, "X-Test": "1"})
+        event = {"requestId": "1", "request": {"headers": {"Cookie": "a=b", "Accept": "*/*"}}}
+        assert rule.command(event) == (
+            "Fetch.continueRequest",
+            {"requestId": "1", "headers": [{"name": "Accept", "value": "*/*"}, {"name": "X-Test", "value": "1"}]},
+        )
+
+
+@pytest.mark.usefixtures("chrome")
+class TestFetchInterceptor:
+    @pytest.mark.asyncio
+    async def test_fulfills_and_blocks_requests(self, client: Client):
+        interceptor = FetchInterceptor(client)
+        interceptor.fulfill(
+            "*/cripy.txt", "intercepted", headers={"Content-Type": "text/plain", "Access-Control-Allow-Origin": "*"}
+        )
+        interceptor.block("*/blocked.txt")
+        await interceptor.enable()
+        result = await client.Runtime.evaluate(
+            """Promise.all([
+                fetch('https://example.com/cripy.txt').then(r => r.text()),
+                fetch('https://example.com/blocked.txt').then(() => 'loaded', () => 'blocked'),
+            ])""",
+            awaitPromise=True,
+            returnByValue=True,
+        )
+        await interceptor.disable()
+        assert result["result"]["value"] == ["intercepted", "blocked"]
+        assert [rule.hits for rule in interceptor.rules] == [1, 1]
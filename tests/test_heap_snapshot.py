@@ -0,0 +1,170 @@
+import gzip
+import threading
+from pathlib import Path
+
+import pytest
+
+from cripy import Client, HeapSnapshot, HeapSnapshotDiff, capture_heap_snapshot, load_heap_snapshot
+from cripy import heap_snapshot
+from cripy.heap_snapshot import NO_DOMINATOR
+from .helpers import EventSource, write_heap_snapshot
+
+GRAPH = [
+    ("synthetic", "", 1, 0, [("element", 1, 1), ("element", 2, 2)]),
+    ("object", "Window", 3, 10, [("property", "cache", 3)]),
+    ("object", "Registry", 5, 20, [("property", "cache", 3), ("weak", "ref", 4)]),
+    ("object", "Map", 7, 30, [("property", "value", 4)]),
+    ("string", "hello", 9, 40, []),
+    ("object", "Window", 11, 5, []),
+]
+
+# the second Window (11) and the string (9) are freed, a Listener array retaining a Closure is added
+GRAPH_AFTER = [
+    ("synthetic", "", 1, 0, [("element", 1, 1), ("element", 2, 2)]),
+    ("object", "Window", 3, 10, [("property", "cache", 3), ("property", "listeners", 4)]),
+    ("object", "Registry", 5, 20, [("property", "cache", 3)]),
+    ("object", "Map", 7, 30, []),
+    ("array", "", 13, 16, [("element", 0, 5), ("element", 1, 6)]),
+    ("closure", "onLoad", 15, 32, [("internal", "context", 7)]),
+    ("closure", "onLoad", 17, 32, []),
+    ("object", "Context", 19, 8, []),
+]
+
+# the Map, retained by the Registry before, is only retained by a new array retaining a new Closure after
+GRAPH_MOVED_BEFORE = [
+    ("synthetic", "", 1, 0, [("element", 1, 1), ("element", 2, 2)]),
+    ("object", "Window", 3, 10, []),
+    ("object", "Registry", 5, 20, [("property", "cache", 3)]),
+    ("object", "Map", 7, 30, []),
+]
+
+GRAPH_MOVED_AFTER = [
+    ("synthetic", "", 1, 0, [("element", 1, 1), ("element", 2, 2)]),
+    ("object", "Window", 3, 10, [("property", "listeners", 4)]),
+    ("object", "Registry", 5, 20, []),
+    ("object", "Map", 7, 30, [("property", "value", 5)]),
+    ("array", "", 13, 16, [("element", 0, 3)]),
+    ("closure", "onLoad", 15, 32, []),
+]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def snapshot(request, tmp_path: Path, monkeypatch) -> HeapSnapshot:
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(heap_snapshot, "np", None)
+    path = tmp_path / "test.heapsnapshot"
+    write_heap_snapshot(str(path), GRAPH)
+    return load_heap_snapshot(str(path), read_size=16)
+
+
+class TestHeapSnapshotModel:
+    def test_loads_tables_into_arrays(self, snapshot: HeapSnapshot):
+        assert snapshot.node_count == 6
+        assert snapshot.edge_count == 6
+        assert list(snapshot.column("id")) == [1, 3, 5, 7, 9, 11]
+        assert snapshot.node_name(3) == "Map"
+        assert snapshot.node_index(9) == 4
+        assert list(snapshot.edges_of(2)) == [("property", "cache", 3), ("weak", "ref", 4)]
+
+    def test_skips_nested_allocation_trace_tree(self, tmp_path: Path):
+        path = tmp_path / "traced.heapsnapshot"
+        # id, function info index, count, size, children of each trace node
+        trace_tree = [1, 0, 2, 64, [2, 1, 1, 32, [], 3, 2, 1, 16, [4, 0, 1, 8, []]]]
+        write_heap_snapshot(str(path), GRAPH, trace_tree=trace_tree)
+        loaded = load_heap_snapshot(str(path), read_size=16)
+        assert loaded.node_count == 6 and loaded.edge_count == 6
+        assert loaded.node_name(3) == "Map"
+
+    def test_class_histogram(self, snapshot: HeapSnapshot):
+        histogram = snapshot.class_histogram()
+        assert histogram["Window"].count == 2
+        assert histogram["Window"].self_size == 15
+        assert histogram["(string)"].count == 1
+
+    def test_dominators_and_retained_sizes_ignore_weak_edges(self, snapshot: HeapSnapshot):
+        assert list(snapshot.dominators()) == [0, 0, 0, 0, 3, NO_DOMINATOR]
+        assert snapshot.retained_size(3) == 70
+        assert snapshot.retained_size(0) == 100
+        assert snapshot.largest(1) == [(3, 70)]
+
+    def test_retaining_paths_are_shortest_and_ignore_weak_edges(self, snapshot: HeapSnapshot):
+        assert snapshot.retaining_path(4) == [(3, 5), (1, 2), (0, 0)]
+        assert snapshot.retaining_path(5) == []
+        assert list(snapshot.retainers_of(3)) == [(1, 2), (2, 3)]
+
+
+class TestHeapSnapshotDiff:
+    def test_diff_by_id_and_class(self, snapshot: HeapSnapshot, tmp_path: Path):
+        path = tmp_path / "after.heapsnapshot"
+        write_heap_snapshot(str(path), GRAPH_AFTER)
+        diff = HeapSnapshotDiff(snapshot, load_heap_snapshot(str(path)))
+        assert list(diff.added) == [4, 5, 6, 7]
+        assert list(diff.removed) == [4, 5]
+        by_class = diff.by_class()
+        assert by_class["(closure)"].count_delta == 2
+        assert by_class["(closure)"].size_delta == 64
+        assert by_class["Window"].count_delta == -1
+        assert by_class["(string)"].size_delta == -40
+
+    def test_retained_growth_grouped_by_retaining_path(self, snapshot: HeapSnapshot, tmp_path: Path):
+        path = tmp_path / "after.heapsnapshot"
+        write_heap_snapshot(str(path), GRAPH_AFTER)
+        groups = HeapSnapshotDiff(snapshot, load_heap_snapshot(str(path))).retained_growth()
+        assert len(groups) == 1
+        assert groups[0].class_name == "(array)"
+        assert groups[0].path == ("Window.listeners", "(synthetic)[1]")
+        assert groups[0].count == 1
+        assert groups[0].retained_size == 88
+
+    def test_retained_growth_counts_nodes_dominated_through_old_nodes_once(self, tmp_path: Path):
+        before_path = tmp_path / "before.heapsnapshot"
+        after_path = tmp_path / "after.heapsnapshot"
+        write_heap_snapshot(str(before_path), GRAPH_MOVED_BEFORE)
+        write_heap_snapshot(str(after_path), GRAPH_MOVED_AFTER)
+        diff = HeapSnapshotDiff(load_heap_snapshot(str(before_path)), load_heap_snapshot(str(after_path)))
+        assert list(diff.added) == [4, 5]
+        groups = diff.retained_growth()
+        assert [(group.class_name, group.count, group.retained_size) for group in groups] == [("(array)", 1, 78)]
+
+
+class TestCaptureHeapSnapshotWriter:
+    @pytest.mark.asyncio
+    async def test_chunks_are_written_in_order_off_the_event_loop(self, tmp_path: Path, monkeypatch):
+        chunks = ['{"snapshot":', '{"meta":{}}', ',"nodes":[],"edges":[],"strings":[]}']
+
+        def handler(method, params):
+            if method == "HeapProfiler.takeHeapSnapshot":
+                for chunk in chunks:
+                    source.emit("HeapProfiler.addHeapSnapshotChunk", {"chunk": chunk})
+            return {}
+
+        writers = set()
+        write_chunk = heap_snapshot._write_chunk
+
+        def record_writer(out, chunk, errors):
+            writers.add(threading.get_ident())
+            write_chunk(out, chunk, errors)
+
+        monkeypatch.setattr(heap_snapshot, "_write_chunk", record_writer)
+        source = EventSource(handler)
+        path = tmp_path / "page.heapsnapshot.gz"
+        assert await capture_heap_snapshot(source, str(path), compress=True) == str(path)
+        with gzip.open(str(path), "rt") as fp:
+            assert fp.read() == "".join(chunks)
+        assert writers and threading.get_ident() not in writers
+        assert source.listeners("HeapProfiler.addHeapSnapshotChunk") == []
+
+
+@pytest.mark.usefixtures("chrome")
+class TestCaptureHeapSnapshot:
+    @pytest.mark.asyncio
+    async def test_capture_streams_snapshot_to_disk(self, client: Client, tmp_path: Path):
+        path = tmp_path / "page.heapsnapshot.gz"
+        await client.HeapProfiler.enable()
+        assert await capture_heap_snapshot(client, str(path), collect_garbage=True, compress=True) == str(path)
+        snapshot = load_heap_snapshot(str(path))
+        assert snapshot.node_count > 0
+        assert "Window" in snapshot.class_histogram()
+        await client.HeapProfiler.disable()
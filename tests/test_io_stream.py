@@ -0,0 +1,33 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from cripy import Client, IOStream
+
+
+async def trace_stream_handle(client: Client) -> str:
+    await client.Tracing.start(transferMode="ReturnAsStream", categories="devtools.timeline")
+    await client.Runtime.evaluate("document.body.innerHTML = '<p>hi</p>'")
+    complete = client.Tracing.tracingComplete()
+    await client.Tracing.end()
+    return (await complete)["stream"]
+
+
+@pytest.mark.usefixtures("chrome")
+class TestIOStream:
+    @pytest.mark.asyncio
+    async def test_read_all_returns_the_entire_stream(self, client: Client):
+        stream = IOStream(client, await trace_stream_handle(client), read_size=4096)
+        trace = json.loads(await stream.read_all())
+        assert "traceEvents" in trace
+        assert stream.bytes_read > 0
+        assert stream.closed
+
+    @pytest.mark.asyncio
+    async def test_to_file_writes_the_stream_chunk_by_chunk(self, client: Client, tmp_path: Path):
+        stream = IOStream(client, await trace_stream_handle(client), read_size=1024, max_inflight=2)
+        path = tmp_path / "trace.json"
+        written = await stream.to_file(str(path))
+        assert written == path.stat().st_size == stream.bytes_read
+        assert "traceEvents" in json.loads(path.read_text())
@@ -0,0 +1,94 @@
+import time
+from asyncio import get_event_loop, sleep
+from json import dumps, loads
+from typing import Dict
+
+import pytest
+
+from cripy import Client, LoopLagMonitor, MessageDecoder
+from cripy.message_decoder import decode_message, decode_sliced
+
+
+def large_message(count: int) -> Dict:
+    # shaped like a DOMSnapshot.captureSnapshot response: long arrays of numbers, strings and small objects
+    nodes = {
+        "parentIndex": list(range(-1, count - 1)),
+        "attributes": [[index % 7, index % 11] for index in range(count)],
+        "bounds": [[index * 0.5, 8.0, 100.25, 20.0] for index in range(count)],
+    }
+    documents = [{"nodes": nodes, "layout": [{"index": index, "text": None} for index in range(count)]}]
+    return {"id": 1, "result": {"documents": documents, "strings": [f"s{index}, \\\"]" for index in range(count)]}}
+
+
+class TestMessageDecoder:
+    def test_decodes_nested_target_messages(self):
+        inner = dumps({"id": 1, "result": {"value": 2}})
+        msg = decode_message(
+            dumps({"method": "Target.receivedMessageFromTarget", "params": {"sessionId": "s", "message": inner}})
+        )
+        assert msg["params"]["message"] == {"id": 1, "result": {"value": 2}}
+
+    def test_sliced_decoding_matches_json_loads(self):
+        message = dumps(large_message(200))
+        for slice_size in (1, 64, 1 << 16):
+            assert decode_sliced(message, slice_size) == loads(message)
+        with pytest.raises(ValueError):
+            decode_sliced('{"id": 1, "result": [1, 2', 4)
+
+    @pytest.mark.asyncio
+    async def test_offloaded_decoding_lowers_loop_lag(self):
+        loop = get_event_loop()
+        expected = large_message(40000)
+        message = dumps(expected)
+        decoder = MessageDecoder(threshold=1 << 10)
+        assert decoder.offloads(message) and not decoder.offloads(dumps({"id": 1, "result": {}}))
+
+        async def max_lag(decode) -> float:
+            monitor = LoopLagMonitor(loop, interval=0.002)
+            monitor.start()
+            await sleep(0.02)
+            decoded = await decode()
+            await sleep(0.02)
+            monitor.stop()
+            assert decoded == expected
+            return monitor.max_lag
+
+        async def inline():
+            return loads(message)
+
+        inline_lag = await max_lag(inline)
+        offloaded_lag = await max_lag(lambda: decoder.decode(message, loop))
+        assert offloaded_lag < inline_lag / 2
+        stats = decoder.stats
+        assert (stats["inline"], stats["threaded"], stats["threaded_bytes"]) == (1, 1, len(message))
+
+    @pytest.mark.asyncio
+    async def test_loop_lag_monitor(self):
+        monitor = LoopLagMonitor(get_event_loop(), interval=0.005)
+        monitor.start()
+        await sleep(0.02)
+        time.sleep(0.05)
+        await sleep(0.02)
+        monitor.stop()
+        assert monitor.samples > 0
+        assert monitor.max_lag >= 0.03
+
+
+@pytest.mark.usefixtures("chrome")
+class TestOffloadedDecoding:
+    @pytest.mark.asyncio
+    async def test_large_messages_are_decoded_off_loop_in_order(self, client: Client):
+        decoder = client.enable_offloaded_decoding(threshold=1 << 10)
+        await client.Page.enable()
+        results = await client.send_many(
+            [
+                ("Runtime.evaluate", {"expression": "'a'.repeat(4096)"}),
+                ("Runtime.evaluate", {"expression": "1 + 1"}),
+                ("Page.captureScreenshot", {}),
+            ]
+        )
+        assert len(results[0]["result"]["value"]) == 4096
+        assert results[1]["result"]["value"] == 2
+        assert results[2]["data"]
+        assert decoder.stats["threaded"] >= 2 and decoder.stats["inline"] >= 1
+        client.disable_offloaded_decoding()
@@ -0,0 +1,77 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+from cripy import Client, NetworkLedger, RequestRecord, ResponseReplayer, ResponseStore
+from .helpers import EventSource
+
+
+def request_will_be_sent(request_id: str, url: str, timestamp: float, redirect: Optional[Dict] = None) -> Dict:
+    event = {"requestId": request_id, "request": {"url": url, "method": "GET"}, "timestamp": timestamp}
+    if redirect is not None:
+        event["redirectResponse"] = redirect
+    return event
+
+
+class TestNetworkLedger:
+    @pytest.mark.asyncio
+    async def test_folds_events_into_records_and_exports_batches(self):
+        source = EventSource()
+        batches: List[List[RequestRecord]] = []
+        ledger = NetworkLedger(source, max_completed=2, exporter=batches.append, batch_size=2)
+        await ledger.enable()
+        source.emit("Network.requestWillBeSent", request_will_be_sent("1", "http://a.com/", 1.0))
+        source.emit("Network.requestWillBeSent", request_will_be_sent("1", "https://a.com/", 1.5, {"status": 301}))
+        response = {"status": 200, "mimeType": "text/html"}
+        source.emit("Network.responseReceived", {"requestId": "1", "response": response})
+        source.emit("Network.dataReceived", {"requestId": "1", "dataLength": 10})
+        source.emit("Network.dataReceived", {"requestId": "1", "dataLength": 20})
+        source.emit("Network.loadingFinished", {"requestId": "1", "timestamp": 2.0, "encodedDataLength": 15})
+        source.emit("Network.requestWillBeSent", request_will_be_sent("2", "https://a.com/x.js", 2.5))
+        assert ledger.get("2").url == "https://a.com/x.js"
+        source.emit("Network.loadingFailed", {"requestId": "2", "timestamp": 3.0, "canceled": True})
+        assert [len(batch) for batch in batches] == [2]
+        redirect, final = batches[0]
+        assert (redirect.status, redirect.duration, final.redirects) == (301, 0.5, 1)
+        assert (final.status, final.mime_type, final.data_length) == (200, "text/html", 30)
+        assert final.encoded_data_length == 15
+        await ledger.disable()
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert batches[1][0].error == "canceled"
+
+    @pytest.mark.asyncio
+    async def test_evicts_oldest_records_without_exporter(self):
+        source = EventSource()
+        ledger = NetworkLedger(source, max_completed=2, max_active=2)
+        await ledger.enable()
+        for request_id in "abc":
+            source.emit("Network.requestWillBeSent", request_will_be_sent(request_id, "https://a.com/", 1.0))
+        assert (ledger.active, ledger.evicted) == (2, 1)
+        for request_id in "bc":
+            source.emit("Network.loadingFinished", {"requestId": request_id, "timestamp": 2.0})
+        source.emit("Network.requestWillBeSent", request_will_be_sent("d", "https://a.com/", 1.0))
+        source.emit("Network.loadingFinished", {"requestId": "d", "timestamp": 2.0})
+        assert [record.request_id for record in ledger.drain()] == ["c", "d"]
+        assert ledger.evicted == 2
+
+
+@pytest.mark.usefixtures("chrome")
+class TestNetworkLedgerSession:
+    @pytest.mark.asyncio
+    async def test_records_page_requests(self, client: Client, tmp_path: Path):
+        with ResponseStore(str(tmp_path)) as store:
+            headers = [{"name": "Content-Type", "value": "text/html"}]
+            store.put("GET", "https://example.com/", 200, headers, b"<p>hi</p>")
+            replayer = ResponseReplayer(client, store)
+            ledger = NetworkLedger(client)
+            await replayer.enable()
+            await ledger.enable()
+            loaded = client.Page.loadEventFired()
+            await client.Page.enable()
+            await client.Page.navigate("https://example.com/")
+            await loaded
+            await ledger.disable()
+            await replayer.disable()
+        records = ledger.drain()
+        assert [(record.url, record.status) for record in records][:1] == [("https://example.com/", 200)]
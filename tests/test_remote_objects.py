@@ -0,0 +1,105 @@
+import gc
+from asyncio import sleep
+from itertools import count
+from typing import Dict, Optional
+
+import pytest
+
+from cripy import Client, ClientError, HandlePool
+from .helpers import EventSource
+
+
+def make_runtime():
+    ids = count(1)
+
+    def handler(method: str, params: Optional[Dict]) -> Dict:
+        if method == "Runtime.evaluate" and params["expression"].startswith("throw"):
+            return {
+                "result": {"type": "object", "subtype": "error", "objectId": f"obj-{next(ids)}"},
+                "exceptionDetails": {"text": "Uncaught", "exception": {"description": "Error: boom"}},
+            }
+        if method in ("Runtime.evaluate", "Runtime.callFunctionOn"):
+            return {"result": {"type": "object", "objectId": f"obj-{next(ids)}"}}
+        if method == "DOM.resolveNode":
+            return {"object": {"type": "object", "subtype": "node", "objectId": f"node-{params['backendNodeId']}"}}
+        return {}
+
+    return handler
+
+
+class TestHandlePool:
+    @pytest.mark.asyncio
+    async def test_groups_are_released_in_bulk(self):
+        source = EventSource(make_runtime())
+        pool = HandlePool(source)
+        async with pool.group() as group:
+            window = await group.evaluate("window")
+            document = await group.call_function_on("function() { return this.document }", window)
+            node = await group.resolve_node(backend_node_id=5)
+            assert group.outstanding == 3 and pool.outstanding == 3
+        assert group.released and not document.alive and node.object_id == "node-5" and pool.outstanding == 0
+        assert source.sent[-1] == ("Runtime.releaseObjectGroup", {"objectGroup": group.name})
+        assert all(params["objectGroup"] == group.name for _, params in source.sent)
+
+        other = pool.group()
+        await other.evaluate("document")
+        await pool.group().evaluate("document.body")
+        await pool.release_all()
+        assert pool.released_groups == 3 and pool.groups == []
+        assert [method for method, _ in source.sent].count("Runtime.releaseObjectGroup") == 3
+
+    @pytest.mark.asyncio
+    async def test_collected_handles_are_released_in_a_batch(self):
+        source = EventSource(make_runtime())
+        pool = HandlePool(source)
+        group = pool.group("scope")
+        handles = [await group.evaluate("{}") for _ in range(3)]
+        kept = handles[0]
+        del handles
+        gc.collect()
+        await sleep(0)
+        await sleep(0)
+        assert group.outstanding == 1 and kept.alive
+        released = [params["objectId"] for method, params in source.sent if method == "Runtime.releaseObject"]
+        assert sorted(released) == ["obj-2", "obj-3"] and pool.released_objects == 2
+        await group.release()
+
+    @pytest.mark.asyncio
+    async def test_released_groups_and_thrown_exceptions_raise(self):
+        source = EventSource(make_runtime())
+        pool = HandlePool(source)
+        group = pool.group()
+        with pytest.raises(ClientError, match="Error: boom"):
+            await group.evaluate("throw new Error('boom')")
+        await sleep(0)
+        await sleep(0)
+        assert group.outstanding == 0 and ("Runtime.releaseObject", {"objectId": "obj-1"}) in source.sent
+
+        pending = source.loop.create_task(group.evaluate("window"))
+        await sleep(0)
+        await group.release()
+        with pytest.raises(ClientError):
+            await pending
+        await sleep(0)
+        await sleep(0)
+        assert ("Runtime.releaseObject", {"objectId": "obj-2"}) in source.sent
+
+        sent = len(source.sent)
+        with pytest.raises(ClientError):
+            await group.evaluate("window")
+        with pytest.raises(ClientError):
+            await group.resolve_node(backend_node_id=5)
+        assert len(source.sent) == sent
+
+
+@pytest.mark.usefixtures("chrome")
+class TestHandlePoolPage:
+    @pytest.mark.asyncio
+    async def test_released_group_objects_are_gone(self, client: Client):
+        pool = HandlePool(client)
+        async with pool.group() as group:
+            handle = await group.evaluate("({answer: 42})")
+            result = await group.call_function_on("function() { return this.answer }", handle, returnByValue=True)
+            assert result.value == 42
+        with pytest.raises(Exception):
+            await client.Runtime.getProperties(objectId=handle.object_id)
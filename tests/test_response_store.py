@@ -0,0 +1,87 @@
+import asyncio
+from base64 import b64encode
+from pathlib import Path
+
+import pytest
+
+from cripy import Client, ResponseRecorder, ResponseReplayer, ResponseStore
+from .helpers import EventSource
+
+HEADERS = [{"name": "Content-Type", "value": "text/html"}]
+
+
+class TestResponseStore:
+    def test_put_and_get_survive_reopening(self, tmp_path: Path):
+        with ResponseStore(str(tmp_path)) as store:
+            for i in range(1500):
+                store.put("get", f"https://example.com/{i}", 200, HEADERS, str(i % 3).encode())
+            store.put("GET", "https://example.com/7", 404, [], b"missing")
+        with ResponseStore(str(tmp_path)) as store:
+            assert len(store) == 1500
+            assert ("GET", "https://example.com/1499") in store
+            assert store.get("POST", "https://example.com/1") is None
+            response = store.get("GET", "https://example.com/7")
+            assert response.status == 404
+            assert store.body(response) == b"missing"
+            assert store.body(store.get("GET", "https://example.com/4")) == b"1"
+        # bodies are content-addressed
+        assert len(list((tmp_path / "bodies").glob("*/*"))) == 4
+
+    @pytest.mark.asyncio
+    async def test_async_operations_run_in_order_in_the_io_thread(self, tmp_path: Path):
+        with ResponseStore(str(tmp_path)) as store:
+            puts = [store.put_async("GET", f"https://example.com/{i}", 200, HEADERS, b"x" * i) for i in range(5)]
+            responses = await asyncio.gather(*puts)
+            assert [response.size for response in responses] == list(range(5))
+            response = await store.get_async("GET", "https://example.com/3")
+            assert await store.body_async(response) == b"xxx"
+            assert await store.get_async("GET", "https://example.com/9") is None
+
+
+class TestRecordAndReplayEvents:
+    @pytest.mark.asyncio
+    async def test_records_then_replays_paused_requests(self, tmp_path: Path):
+        body = b64encode(b"recorded").decode("ascii")
+        source = EventSource(lambda method, params: {"body": body, "base64Encoded": True})
+        request = {"method": "GET", "url": "https://example.com/"}
+        with ResponseStore(str(tmp_path)) as store:
+            recorder = ResponseRecorder(source, store)
+            await recorder.enable()
+            source.emit("Fetch.requestPaused", {"requestId": "1", "request": request, "responseStatusCode": 200})
+            while not recorder.recorded:
+                await asyncio.sleep(0.01)
+            await recorder.disable()
+            replayer = ResponseReplayer(source, store)
+            await replayer.enable()
+            source.emit("Fetch.requestPaused", {"requestId": "2", "request": request})
+            source.emit("Fetch.requestPaused", {"requestId": "3", "request": {"url": "https://example.org/"}})
+            while replayer.replayed + replayer.misses < 2:
+                await asyncio.sleep(0.01)
+        await asyncio.sleep(0)
+        answers = {
+            params["requestId"]: (method, params) for method, params in source.sent if params and "requestId" in params
+        }
+        assert answers["1"][0] == "Fetch.continueRequest"
+        assert answers["2"] == (
+            "Fetch.fulfillRequest",
+            {"requestId": "2", "responseCode": 200, "responseHeaders": [], "body": body},
+        )
+        assert answers["3"][0] == "Fetch.failRequest"
+
+
+@pytest.mark.usefixtures("chrome")
+class TestRecordAndReplay:
+    @pytest.mark.asyncio
+    async def test_replays_recorded_responses(self, client: Client, tmp_path: Path):
+        fetch_text = "fetch('https://example.com/').then(r => r.text(), () => 'failed')"
+        with ResponseStore(str(tmp_path)) as store:
+            cors = [{"name": "Access-Control-Allow-Origin", "value": "*"}]
+            store.put("GET", "https://example.com/", 200, HEADERS + cors, b"offline")
+            replayer = ResponseReplayer(client, store)
+            await replayer.enable()
+            replayed = await client.Runtime.evaluate(fetch_text, awaitPromise=True)
+            missed = await client.Runtime.evaluate(fetch_text.replace(".com/", ".org/"), awaitPromise=True)
+            await replayer.disable()
+        assert replayed["result"]["value"] == "offline"
+        assert missed["result"]["value"] == "failed"
+        assert (replayer.replayed, replayer.misses) == (1, 1)
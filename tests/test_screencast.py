@@ -0,0 +1,117 @@
+import asyncio
+from base64 import b64encode
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+
+from cripy import Client, ScreencastPipeline
+from .helpers import EventSource
+
+PNG_MAGIC = b"\x89PNG"
+
+
+class HeldExecutor(Executor):
+    """Holds the submitted decodings until they are run, in the order chosen by the test"""
+
+    def __init__(self) -> None:
+        self.held: List[Tuple[Future, Callable, Tuple[Any, ...]]] = []
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        future = Future()
+        self.held.append((future, fn, args))
+        return future
+
+    async def run(self, *indexes: int) -> None:
+        for index in indexes:
+            future, fn, args = self.held[index]
+            future.set_result(fn(*args))
+        # the outcome is copied to the asyncio future, then its done callbacks run
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+
+def frame_event(data: bytes, session_id: int) -> Dict:
+    return {"data": b64encode(data).decode(), "metadata": {}, "sessionId": session_id}
+
+
+async def started(executor: HeldExecutor, **kwargs: Any) -> Tuple[EventSource, ScreencastPipeline]:
+    source = EventSource()
+    pipeline = ScreencastPipeline(source, executor=executor, **kwargs)
+    await pipeline.start()
+    return source, pipeline
+
+
+class TestScreencastPipelineEvents:
+    @pytest.mark.asyncio
+    async def test_frames_are_acked_at_once_and_stale_frames_dropped(self):
+        executor = HeldExecutor()
+        source, pipeline = await started(executor)
+        source.emit("Page.screencastFrame", frame_event(b"first", 1))
+        source.emit("Page.screencastFrame", frame_event(b"second", 2))
+        acks = [params for method, params in source.sent if method == "Page.screencastFrameAck"]
+        assert acks == [{"sessionId": 1}, {"sessionId": 2}] and pipeline.received == 2
+        await executor.run(1, 0)
+        assert pipeline.dropped == 1 and pipeline.buffered == 1
+        await pipeline.stop()
+        assert [(frame.number, frame.data) async for frame in pipeline] == [(1, b"second")]
+
+    @pytest.mark.asyncio
+    async def test_duplicate_frames_are_suppressed(self):
+        executor = HeldExecutor()
+        source, pipeline = await started(executor, dedupe=True)
+        for session_id, data in enumerate([b"same", b"same", b"other", b"other"]):
+            source.emit("Page.screencastFrame", frame_event(data, session_id))
+        await executor.run(0, 1, 2, 3)
+        assert pipeline.duplicates == 2 and pipeline.dropped == 0
+        await pipeline.stop()
+        assert [frame.data async for frame in pipeline] == [b"same", b"other"]
+
+    @pytest.mark.asyncio
+    async def test_full_buffer_drops_the_oldest_frames(self):
+        executor = HeldExecutor()
+        source, pipeline = await started(executor, buffer_size=2)
+        for session_id in range(3):
+            source.emit("Page.screencastFrame", frame_event(b"frame %d" % session_id, session_id))
+        await executor.run(0, 1, 2)
+        assert pipeline.dropped == 1 and pipeline.buffered == 2
+        await pipeline.stop()
+        assert [frame.number async for frame in pipeline] == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_frames_wake_the_waiting_consumer(self):
+        executor = HeldExecutor()
+        source, pipeline = await started(executor)
+        consumed = []
+
+        async def consume() -> None:
+            async for frame in pipeline:
+                consumed.append(frame.data)
+
+        consumer = asyncio.get_event_loop().create_task(consume())
+        await asyncio.sleep(0)
+        source.emit("Page.screencastFrame", frame_event(b"frame", 1))
+        await executor.run(0)
+        assert consumed == [b"frame"] and not consumer.done()
+        await pipeline.stop()
+        await asyncio.wait_for(consumer, 1)
+        assert source.sent[-1] == ("Page.stopScreencast", None)
+
+
+@pytest.mark.usefixtures("chrome")
+class TestScreencastPipeline:
+    @pytest.mark.asyncio
+    async def test_frames_are_acked_decoded_and_buffered(self, client: Client):
+        pipeline = ScreencastPipeline(client, format="png", buffer_size=2, dedupe=True)
+        await pipeline.start()
+        for color in ("red", "green", "blue"):
+            await client.Runtime.evaluate(f"document.body.style.background = '{color}'")
+        frame = await asyncio.wait_for(pipeline.frames().__anext__(), 10)
+        assert frame.data.startswith(PNG_MAGIC)
+        assert frame.digest is not None
+        await pipeline.stop()
+        assert not pipeline.running
+        assert pipeline.buffered <= 2
+        async for frame in pipeline:
+            assert frame.data.startswith(PNG_MAGIC)
+        assert pipeline.buffered == 0
@@ -0,0 +1,102 @@
+from asyncio import CancelledError, Event, get_event_loop, sleep, wait_for
+from typing import Dict, Optional
+
+import pytest
+
+from cripy import Client, ProtocolError, ScriptRegistry
+from .helpers import EventSource
+
+
+class Runtime:
+    def __init__(self) -> None:
+        self.scripts: Dict[str, str] = {}
+
+    def __call__(self, method: str, params: Optional[Dict]) -> Dict:
+        if method == "Runtime.compileScript":
+            if "syntax error" in params["expression"]:
+                return {"exceptionDetails": {"text": "SyntaxError"}}
+            script_id = str(len(self.scripts) + 1)
+            self.scripts[script_id] = params["expression"]
+            return {"scriptId": script_id}
+        if method == "Runtime.runScript":
+            if params["scriptId"] not in self.scripts:
+                raise ProtocolError("No script with given id")
+            return {"result": {"type": "string", "value": self.scripts[params["scriptId"]]}}
+        if method == "Runtime.evaluate":
+            return {"result": {"type": "string", "value": params["expression"]}}
+        return {}
+
+
+class TestScriptRegistry:
+    @pytest.mark.asyncio
+    async def test_compiles_once_per_context(self):
+        runtime = Runtime()
+        source = EventSource(runtime)
+        registry = ScriptRegistry(source)
+        await registry.enable()
+        for _ in range(3):
+            assert (await registry.run("document.title", 1))["result"]["value"] == "document.title"
+        await registry.run("document.title", 2)
+        assert registry.compiled == 2 and registry.hits == 2
+        assert [method for method, _ in source.sent].count("Runtime.compileScript") == 2
+
+        source.emit("Runtime.executionContextDestroyed", {"executionContextId": 1})
+        assert registry.script_id("document.title", 1) is None
+        assert registry.script_id("document.title", 2) is not None
+        source.emit("Runtime.executionContextsCleared")
+        assert len(registry) == 0
+
+        result = await registry.run("syntax error", 1)
+        assert result == {"exceptionDetails": {"text": "SyntaxError"}}
+        registry.disable()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_the_compiled_script_is_gone(self):
+        runtime = Runtime()
+        source = EventSource(runtime)
+        registry = ScriptRegistry(source)
+        await registry.run("1 + 1", 3)
+        runtime.scripts.clear()
+        result = await registry.run("1 + 1", 3, return_by_value=True)
+        assert result["result"]["value"] == "1 + 1"
+        assert source.sent[-1] == ("Runtime.evaluate", {"contextId": 3, "returnByValue": True, "expression": "1 + 1"})
+        assert registry.fallbacks == 1 and registry.script_id("1 + 1", 3) is None
+
+    @pytest.mark.asyncio
+    async def test_cancelling_the_first_caller_does_not_strand_the_others(self):
+        runtime = Runtime()
+        compiling = Event()
+
+        async def handler(method: str, params: Optional[Dict]) -> Dict:
+            if method == "Runtime.compileScript":
+                await compiling.wait()
+            return runtime(method, params)
+
+        source = EventSource(handler)
+        registry = ScriptRegistry(source)
+        loop = get_event_loop()
+        first = loop.create_task(registry.run("1 + 1", 3))
+        await sleep(0)
+        second = loop.create_task(registry.run("1 + 1", 3))
+        await sleep(0)
+        first.cancel()
+        with pytest.raises(CancelledError):
+            await first
+        compiling.set()
+        assert (await wait_for(second, 1))["result"]["value"] == "1 + 1"
+        assert registry.compiled == 1 and registry.script_id("1 + 1", 3) == "1"
+        assert [method for method, _ in source.sent].count("Runtime.compileScript") == 1
+
+
+@pytest.mark.usefixtures("chrome")
+class TestScriptRegistryPage:
+    @pytest.mark.asyncio
+    async def test_runs_compiled_scripts(self, client: Client):
+        registry = ScriptRegistry(client)
+        await registry.enable()
+        script = "document.querySelectorAll('*').length"
+        first = await registry.run(script, return_by_value=True)
+        second = await registry.run(script, return_by_value=True)
+        assert first["result"]["value"] == second["result"]["value"] > 0
+        assert registry.compiled == 1 and registry.hits == 1
+        registry.disable()
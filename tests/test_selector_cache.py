@@ -0,0 +1,64 @@
+from typing import Dict, Optional
+
+import pytest
+
+from cripy import Client, DOMMirror, SelectorCache
+from .helpers import EventSource
+from .test_dom_mirror import DOCUMENT, node
+
+
+def answer(method: str, params: Optional[Dict]) -> Dict:
+    if method == "DOM.getDocument":
+        return {"root": DOCUMENT}
+    if method == "DOM.querySelector":
+        return {"nodeId": 4}
+    if method == "DOM.querySelectorAll":
+        return {"nodeIds": [4, 6]}
+    return {}
+
+
+class TestSelectorCache:
+    @pytest.mark.asyncio
+    async def test_results_invalidated_by_mutations_of_the_affected_subtree(self):
+        source = EventSource(answer)
+        mirror = DOMMirror(source)
+        await mirror.load()
+        cache = SelectorCache(mirror, maxsize=3)
+        assert await cache.query_selector(3, "p") == 4
+        assert await cache.query_selector_all(3, "p, ul") == [4, 6]
+        assert await cache.query_selector(6, "li") == 4
+        assert await cache.query_selector(3, "p") == 4
+        assert (cache.hits, cache.misses, len(cache)) == (1, 3, 3)
+
+        # ul (6) is not related to p (4), body (3) is its parent
+        source.emit("DOM.attributeModified", {"nodeId": 4, "name": "class", "value": "x"})
+        assert len(cache) == 1
+        await cache.query_selector(3, "p")
+        # a child inserted into body (3) affects queries rooted at its descendant ul (6)
+        source.emit("DOM.childNodeInserted", {"parentNodeId": 3, "previousNodeId": 6, "node": node(7, "DIV", [])})
+        assert len(cache) == 0
+        assert cache.invalidations == 4
+
+        await cache.query_selector(6, "li")
+        source.emit("DOM.documentUpdated", {})
+        assert len(cache) == 0
+        cache.close()
+        await cache.query_selector(3, "p")
+        assert cache.misses == 1
+
+
+@pytest.mark.usefixtures("chrome")
+class TestSelectorCachePage:
+    @pytest.mark.asyncio
+    async def test_cache_follows_the_page(self, client: Client):
+        await client.Runtime.evaluate("document.body.innerHTML = '<ul><li>a</li></ul>'")
+        mirror = DOMMirror(client)
+        document = await mirror.load()
+        cache = SelectorCache(mirror)
+        assert len(await cache.query_selector_all(document.node_id, "li")) == 1
+        assert len(await cache.query_selector_all(document.node_id, "li")) == 1
+        await client.Runtime.evaluate("document.querySelector('ul').appendChild(document.createElement('li'))")
+        assert len(await cache.query_selector_all(document.node_id, "li")) == 2
+        assert (cache.hits, cache.misses) == (1, 2)
+        cache.close()
+        mirror.close()
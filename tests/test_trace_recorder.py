@@ -0,0 +1,81 @@
+import gzip
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from cripy import Client, TraceRecorder, iter_trace_events, summarize_trace
+from .helpers import EventSource
+
+EVENTS = [
+    {"pid": 1, "tid": 2, "ph": "M", "name": "thread_name", "args": {"name": "CrRendererMain"}},
+    {"pid": 1, "tid": 2, "ph": "X", "cat": "devtools.timeline", "name": "Layout", "dur": 10},
+    {"pid": 1, "tid": 3, "ph": "X", "cat": "v8,devtools.timeline", "name": "Compile", "dur": 5},
+]
+
+
+class TestTraceParsing:
+    def test_parses_json_object_format_incrementally(self, tmp_path: Path):
+        path = tmp_path / "trace.json"
+        path.write_text(json.dumps({"traceEvents": EVENTS, "metadata": {"a": [1, 2]}}))
+        assert list(iter_trace_events(str(path), read_size=8)) == EVENTS
+
+    def test_parses_gzipped_json_array_format(self, tmp_path: Path):
+        path = tmp_path / "trace.json.gz"
+        with gzip.open(str(path), "wt") as out:
+            json.dump(EVENTS, out, indent=2)
+        assert list(iter_trace_events(str(path), read_size=5)) == EVENTS
+
+    def test_summarize_aggregates_per_category_and_thread(self, tmp_path: Path):
+        path = tmp_path / "trace.json"
+        path.write_text(json.dumps(EVENTS))
+        summary = summarize_trace(str(path))
+        assert summary.event_count == 3
+        assert summary.categories["devtools.timeline"].count == 2
+        assert summary.categories["devtools.timeline"].duration == 15
+        assert summary.categories["v8"].count == 1
+        assert summary.threads[(1, 3)].duration == 5
+        assert summary.thread_names[(1, 2)] == "CrRendererMain"
+
+
+class TestTraceRecorderWriter:
+    @pytest.mark.asyncio
+    async def test_report_events_are_written_in_order_off_the_event_loop(self, tmp_path: Path, monkeypatch):
+        def handler(method, params):
+            if method == "Tracing.end":
+                source.emit("Tracing.tracingComplete", {})
+            return {}
+
+        writers = set()
+        write_events = TraceRecorder._write_events
+
+        def record_writer(recorder, values, first):
+            writers.add(threading.get_ident())
+            write_events(recorder, values, first)
+
+        monkeypatch.setattr(TraceRecorder, "_write_events", record_writer)
+        source = EventSource(handler)
+        path = tmp_path / "trace.json.gz"
+        recorder = TraceRecorder(source, str(path))
+        await recorder.start()
+        for event in EVENTS:
+            source.emit("Tracing.dataCollected", {"value": [event]})
+        await recorder.stop()
+        assert list(iter_trace_events(str(path))) == EVENTS
+        assert recorder.events_written == 3
+        assert writers and threading.get_ident() not in writers
+
+
+@pytest.mark.usefixtures("chrome")
+class TestTraceRecorder:
+    @pytest.mark.parametrize("transfer_mode", ["ReportEvents", "ReturnAsStream"])
+    @pytest.mark.asyncio
+    async def test_records_trace_to_compressed_file(self, client: Client, tmp_path: Path, transfer_mode: str):
+        path = tmp_path / "trace.json.gz"
+        recorder = TraceRecorder(client, str(path), transfer_mode=transfer_mode)
+        await recorder.start(categories="devtools.timeline")
+        await client.Runtime.evaluate("document.body.innerHTML = '<p>hi</p>'")
+        assert await recorder.stop() == str(path)
+        assert not recorder.recording
+        assert summarize_trace(str(path)).event_count > 0
@@ -0,0 +1,131 @@
+import gzip
+import io
+import threading
+from asyncio import sleep
+from base64 import b64encode
+from pathlib import Path
+
+import pytest
+
+from cripy import Client, ResponseReplayer, ResponseStore, WARCArchiver, WARCWriter
+from .helpers import EventSource
+
+
+def read_records(path: str):
+    records = []
+    for record in gzip.open(path).read().split(b"WARC/1.1\r\n")[1:]:
+        head, _, block = record.partition(b"\r\n\r\n")
+        fields = dict(line.split(": ", 1) for line in head.decode("utf-8").split("\r\n"))
+        records.append((fields, block[: int(fields["Content-Length"])]))
+    return records
+
+
+class TestWARCWriter:
+    def test_writes_gzip_member_per_record_and_rotates(self, tmp_path: Path):
+        with WARCWriter(str(tmp_path), max_size=64) as writer:
+            body = b"<html>" + b"a" * 10000 + b"</html>"
+            response_id = writer.write_response(
+                "https://example.com/?q=1",
+                200,
+                "OK",
+                {"Content-Type": "text/html", "Content-Encoding": "gzip"},
+                io.BytesIO(body),
+                len(body),
+            )
+            writer.write_request("https://example.com/?q=1", "GET", {"Accept": "*/*"}, concurrent_to=response_id)
+        assert len(writer.paths) == 2
+        info, response = read_records(writer.paths[0])
+        assert info[0]["WARC-Type"] == "warcinfo"
+        assert response[0]["WARC-Record-ID"] == response_id
+        assert response[1] == (
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: 10013\r\n\r\n" + body
+        )
+        request = read_records(writer.paths[1])[1]
+        assert request[0]["WARC-Concurrent-To"] == response_id
+        assert request[1] == b"GET /?q=1 HTTP/1.1\r\nHost: example.com\r\nAccept: */*\r\n\r\n"
+
+
+class TestWARCArchiverEvents:
+    @pytest.mark.asyncio
+    async def test_records_are_written_off_the_event_loop(self, tmp_path: Path, monkeypatch):
+        writers = set()
+        archive = WARCArchiver._archive
+
+        def record_writer(archiver, exchange, body):
+            writers.add(threading.get_ident())
+            archive(archiver, exchange, body)
+
+        monkeypatch.setattr(WARCArchiver, "_archive", record_writer)
+        source = EventSource(lambda method, params: {"body": b64encode(b"<p>hi</p>").decode(), "base64Encoded": True})
+        with WARCWriter(str(tmp_path)) as writer:
+            archiver = WARCArchiver(source, writer)
+            await archiver.enable()
+            redirect = {"status": 301, "statusText": "Moved", "headers": {"Location": "https://example.com/"}}
+            source.emit("Network.requestWillBeSent", {"requestId": "1", "request": {"url": "http://example.com/"}})
+            source.emit(
+                "Network.requestWillBeSent",
+                {"requestId": "1", "request": {"url": "https://example.com/"}, "redirectResponse": redirect},
+            )
+            source.emit("Network.responseReceived", {"requestId": "1", "response": {"status": 200, "headers": {}}})
+            source.emit("Network.loadingFinished", {"requestId": "1"})
+            await archiver.disable()
+        assert archiver.archived == 2
+        assert writers and threading.get_ident() not in writers
+        records = read_records(writer.paths[0])
+        assert [fields.get("WARC-Target-URI") for fields, _ in records] == [
+            None,
+            "http://example.com/",
+            "http://example.com/",
+            "https://example.com/",
+            "https://example.com/",
+        ]
+        assert records[3][1].endswith(b"\r\n\r\n<p>hi</p>")
+
+    @pytest.mark.asyncio
+    async def test_bodies_waiting_to_be_written_count_against_max_concurrency(self, tmp_path: Path, monkeypatch):
+        writing = threading.Event()
+        archive = WARCArchiver._archive
+
+        def slow_writer(archiver, exchange, body):
+            writing.wait(5)
+            archive(archiver, exchange, body)
+
+        monkeypatch.setattr(WARCArchiver, "_archive", slow_writer)
+        source = EventSource(lambda method, params: {"body": "<p>hi</p>"})
+        with WARCWriter(str(tmp_path)) as writer:
+            archiver = WARCArchiver(source, writer, max_concurrency=2)
+            await archiver.enable()
+            for request_id in map(str, range(6)):
+                source.emit("Network.requestWillBeSent", {"requestId": request_id, "request": {"url": "https://a/"}})
+                source.emit("Network.responseReceived", {"requestId": request_id, "response": {"status": 200}})
+                source.emit("Network.loadingFinished", {"requestId": request_id})
+            for _ in range(10):
+                await sleep(0)
+            fetched = [method for method, _ in source.sent].count("Network.getResponseBody")
+            writing.set()
+            await archiver.disable()
+        assert fetched == 2 and archiver.archived == 6
+
+
+@pytest.mark.usefixtures("chrome")
+class TestWARCArchiver:
+    @pytest.mark.asyncio
+    async def test_archives_page_exchanges(self, client: Client, tmp_path: Path):
+        # the page is served from a response store so that no network access is needed
+        with ResponseStore(str(tmp_path / "store")) as store, WARCWriter(str(tmp_path / "warc")) as writer:
+            headers = [{"name": "Content-Type", "value": "text/html"}]
+            store.put("GET", "https://example.com/", 200, headers, b"<p>hi</p>")
+            replayer = ResponseReplayer(client, store)
+            archiver = WARCArchiver(client, writer, max_concurrency=2)
+            await replayer.enable()
+            await archiver.enable()
+            loaded = client.Page.loadEventFired()
+            await client.Page.enable()
+            await client.Page.navigate("https://example.com/")
+            await loaded
+            await archiver.disable()
+            await replayer.disable()
+        records = read_records(writer.paths[0])
+        assert archiver.archived == 1
+        assert [fields["WARC-Type"] for fields, _ in records] == ["warcinfo", "response", "request"]
+        assert records[1][1].endswith(b"\r\n\r\n<p>hi</p>")